@@ -1,12 +1,19 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
-from src.agent.graph import graph
+from agent.graph import graph
+from agent.blob_store import get_blob_store
+from agent.metrics import get_metrics
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import asyncio
 import json
+import logging
+import uuid
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 app.add_middleware(
@@ -17,10 +24,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def thread_config(thread_id: Optional[str]) -> dict:
+    """Return the run config; a new thread_id is generated if none is given."""
+    return {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+
+
+def graph_input(arxiv_paper_url: str, resume: bool):
+    """Return the graph input; ``None`` resumes the thread from its last checkpoint, e.g. after a crash."""
+    return None if resume else {"arxiv_paper_url": arxiv_paper_url}
+
+
 @app.post("/")
-def run_graph(arxiv_paper_url: str):
+def run_graph(arxiv_paper_url: str, thread_id: Optional[str] = None, resume: bool = False):
+    """Run the conversation on a paper and return the final state."""
+    config = thread_config(thread_id)
     try:
-        result = graph.invoke({"arxiv_paper_url": arxiv_paper_url})
+        with get_metrics().track_run(config["configurable"]["thread_id"]):
+            result = graph.invoke(graph_input(arxiv_paper_url, resume), config)
+        # The state only holds a blob reference; callers still get the paper text
+        if result.get("arxiv_paper_ref"):
+            result = {**result, "arxiv_paper": get_blob_store().get(result["arxiv_paper_ref"])}
         # Convert the result to a JSON-serializable format
         if hasattr(result, 'dict'):  # If it's a Pydantic model
             result = result.dict()
@@ -32,20 +55,43 @@ def run_graph(arxiv_paper_url: str):
 
 
 @app.get("/stream")
-async def run_graph_stream(arxiv_paper_url: str):
-    print("arxiv_paper_url as query param", arxiv_paper_url)
+async def run_graph_stream(arxiv_paper_url: str, thread_id: Optional[str] = None, resume: bool = False):
+    """Run the conversation on a paper, streaming messages as server-sent events."""
+    logger.info("arxiv_paper_url as query param %s", arxiv_paper_url)
+    config = thread_config(thread_id)
+    run_id = config["configurable"]["thread_id"]
     async def event_generator():
-        async for msg, metadata in graph.astream({"arxiv_paper_url": arxiv_paper_url}, stream_mode="messages"):
-            try:
-                # print(metadata)
-                # Only stream serializable part of step
-                yield f"data: {json.dumps({"content": msg.content, "langgraph_node": metadata.get("langgraph_node")})}\n\n"
-
-            except TypeError as e:
-                # Optional: log the error and skip
-                print("Serialization error:", e)
-                continue
-            await asyncio.sleep(0.1)
+        # The thread_id lets the client fetch this run's spans from /runs/{thread_id}/spans
+        yield f"event: run\ndata: {json.dumps({'thread_id': run_id})}\n\n"
+        with get_metrics().track_run(run_id):
+            async for mode, chunk in graph.astream(graph_input(arxiv_paper_url, resume), config, stream_mode=["messages", "custom"]):
+                if mode == "custom":
+                    # A question or answer parsed while the model is still writing the rest
+                    yield f"event: item\ndata: {json.dumps(chunk)}\n\n"
+                    continue
+                msg, metadata = chunk
+                try:
+                    # print(metadata)
+                    # Only stream serializable part of step
+                    yield f"data: {json.dumps({'content': msg.content, 'langgraph_node': metadata.get('langgraph_node')})}\n\n"
+
+                except TypeError as e:
+                    # Optional: log the error and skip
+                    logger.warning("Serialization error: %s", e)
+                    continue
+                await asyncio.sleep(0.1)
         yield "event: done\ndata: stream complete\n\n"
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@app.get("/metrics")
+def metrics():
+    """Return every metric in the Prometheus text exposition format."""
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/runs/{thread_id}/spans")
+def run_spans(thread_id: str):
+    """Return the node and model call timings of a recent run, oldest first."""
+    return {"thread_id": thread_id, "spans": get_metrics().spans.get(thread_id)}
@@ -3,6 +3,11 @@
 This module defines a custom graph.
 """
 
-from agent.graph import graph
+from dotenv import load_dotenv
+
+# Every submodule reads its settings from the environment when imported.
+load_dotenv()
+
+from agent.graph import graph  # noqa: E402
 
 __all__ = ["graph"]
\ No newline at end of file
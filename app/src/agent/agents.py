@@ -1,34 +1,78 @@
-from locale import strcoll
-import os
+"""The student, teacher and observer nodes and the state they share.
+
+Every node has a sync and an async version; the async ones run blocking work
+such as blob reads and prompt building in a worker thread.
+"""
+
+import asyncio
+import logging
 import operator
-from dotenv import load_dotenv
-from pydantic.v1 import ConfigDict
-load_dotenv()
-from typing import Any, Dict, List, TypedDict, Annotated
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+import os
+import re
+import time
+import uuid
+from locale import strcoll
+from typing import Annotated, Any, Callable, Dict, List, Mapping, Tuple, TypedDict
+
+import google.generativeai as genai
 from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate,
+)
 from langchain_core.runnables import RunnableConfig
-
-from langgraph.prebuilt import create_react_agent
+from langgraph.config import get_stream_writer
 from langgraph.graph.message import add_messages
-import google.generativeai as genai
-from agent.create_chain import create_cached_chain, create_agent_chain_with_tools, create_agent_chain
-from agent.prompts import STUDENT_AGENT_PROMPT, TEACHER_AGENT_PROMPT, OBSERVER_AGENT_PROMPT
-from agent.tools import arxiv_tools, graphiti_create_entities, graphiti_add_observations, parse_pdf_from_url, extract_pdf_from_url
-import re
-import json
+from langgraph.prebuilt import create_react_agent
+from langgraph.types import Send
+from pydantic.v1 import ConfigDict
+
+from agent.arxiv_id import paper_key
+from agent.blob_store import get_blob_store
+from agent.chain_registry import (
+    drop_chain,
+    get_chain,
+    register_cached_chain,
+    register_chain,
+)
+from agent.configuration import get_configuration
+from agent.context_cache import CONTEXT_CACHE_MODEL, get_context_cache_registry
+from agent.insights import insights_for, merge_insights, parse_directives
+from agent.metrics import get_metrics, run_id
+from agent.model_stats import get_model_stats, usage
+from agent.prompts import STUDENT_AGENT_PROMPT, TEACHER_AGENT_PROMPT
+from agent.rate_limiter import RATE_LIMIT_OUTPUT_TOKENS, get_rate_limiter
+from agent.retrieval import get_paper_index
+from agent.stream_parser import (
+    JsonItemParser,
+    XmlItemParser,
+    parse_json_items,
+    parse_xml_items,
+)
+from agent.tools import (
+    aextract_pdf_from_url,
+    arxiv_tools,
+    extract_pdf_from_url,
+    graphiti_add_observations,
+    graphiti_create_entities,
+    parse_pdf_from_url,
+)
 
+logger = logging.getLogger(__name__)
 
-gemini_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash-exp",
-    temperature=0.1,
+# Upper bound for the observer's rolling summary when it has to be rebuilt
+# from raw history because the model left it out.
+OBSERVER_SUMMARY_MAX_CHARS = int(os.getenv("OBSERVER_SUMMARY_MAX_CHARS", "4000"))
+_SUMMARY = re.compile(r"<Summary>(.*?)</Summary>", re.DOTALL)
 
-    model_kwargs={
-        "max_output_tokens": 1500
-    }
-)
+
+def teacher_answers_reducer(current: List[Dict[str, Any]], update: Any) -> List[Dict[str, Any]]:
+    """Collect fan-out answers; ``None`` clears them once merged."""
+    if update is None:
+        return []
+    return (current or []) + list(update)
 
 # --- Agent Definitions ---
 
@@ -36,60 +80,300 @@ class AgentState(TypedDict):
     """
     Represents the state of the agent graph.
     """
-    messages: list[Any]
+    # add_messages appends what a node returns, so nodes return only their
+    # new message instead of a copy of the whole history.
+    messages: Annotated[list[Any], add_messages]
     arxiv_paper_url: str
-    arxiv_paper: str
+    paper_key: str
+    # Reference into agent.blob_store; read the text with paper_text(state).
+    arxiv_paper_ref: str
     questions_list: List[str]
     current_turn: int = 0
-    observer_insights: List[str]
+    # Directives parsed from the observer's responses, see agent.insights.
+    observer_insights: List[Dict[str, Any]]
+    # The observer's rolling summary of the conversation up to observer_cursor,
+    # the index of the first message it has not seen yet.
+    observer_summary: str
+    observer_cursor: int
     final_summary: List[Dict[str, Any]]
     turn_annotations: List[Dict[str, Any]]
-    student_chain: Any
-    teacher_chain: Any
-    observer_chain: Any
+    # References into agent.chain_registry; the chains live outside the state.
+    student_chain: str
+    teacher_chain: str
+    observer_chain: str
+    # Answers of the parallel teacher branches, until teacher_merge joins them.
+    teacher_answers: Annotated[List[Dict[str, Any]], teacher_answers_reducer]
+    # Set when the student and teacher chains read the paper from Gemini
+    # context caching; the cleanup node releases the cached content.
+    context_cache_run: str
     error: Any
 
 
 
-def init_node(state: AgentState, config: RunnableConfig):
+def latest_questions(state: AgentState) -> str:
+    """Return the questions the student asked last, as sent in its message."""
+    for message in reversed(state.get("messages", [])):
+        if message.name == "Student":
+            return str(message.content)
+    questions_list = state.get("questions_list", [])
+    return str(questions_list[-1]) if questions_list else ""
 
-    arxiv_paper_url = state.get("arxiv_paper_url")
-    arxiv_paper = extract_pdf_from_url(arxiv_paper_url)
-    
-    
+
+def paper_text(state: Mapping[str, Any]) -> str:
+    """Hydrate the paper text from the blob store."""
+    return get_blob_store().get(state["arxiv_paper_ref"])
+
+
+def teacher_paper_context(state: Mapping[str, Any], questions: str, config: RunnableConfig) -> str:
+    """Return the part of the paper the teacher should see for ``questions``.
+
+    In "retrieval" mode this is the top-k BM25 chunks for the questions,
+    otherwise the whole paper.
+    """
+    configuration = get_configuration(config)
+    if state.get("context_cache_run"):
+        # The teacher chain already holds the whole paper in cached content.
+        return ""
+    if configuration["teacher_context"] != "retrieval":
+        return paper_text(state)
+    # The index is usually built already; the text is only read if it is not.
+    index = get_paper_index(
+        state.get("paper_key"), lambda: paper_text(state), configuration["retrieval_chunk_chars"], state.get("arxiv_paper_ref")
+    )
+    return index.context(questions, configuration["retrieval_top_k"])
+
+
+def _cached_chains(key: str, arxiv_paper: str, scope: str) -> Dict[str, Any]:
+    """Upload the paper to Gemini context caching for the student and teacher.
+
+    Returns the cached chains and the run token, or an empty dict when the
+    caching API is unavailable so the run falls back to sending the paper text.
+    """
+    registry = get_context_cache_registry()
+    run_id = uuid.uuid4().hex
     try:
-        student_chain = create_agent_chain(gemini_llm, STUDENT_AGENT_PROMPT)
-        teacher_chain = create_agent_chain(gemini_llm, TEACHER_AGENT_PROMPT)
-        observer_chain = create_agent_chain(gemini_llm, OBSERVER_AGENT_PROMPT)
+        # The chains must call the model the content was cached for.
+        model = CONTEXT_CACHE_MODEL
+        student_cache = registry.acquire(key, arxiv_paper, STUDENT_AGENT_PROMPT, run_id, scope, model)
+        teacher_cache = registry.acquire(key, arxiv_paper, TEACHER_AGENT_PROMPT, run_id, scope, model)
+        return {
+            "context_cache_run": run_id,
+            "student_chain": register_cached_chain(student_cache, model),
+            "teacher_chain": register_cached_chain(teacher_cache, model),
+        }
+    except Exception as e:
+        logger.warning("Context caching unavailable, sending the paper text instead: %s", e)
+        registry.release(run_id)
+        return {}
+
+
+def _init_update(arxiv_paper_url: str, arxiv_paper: str, config: RunnableConfig) -> Dict[str, Any]:
+    configuration = get_configuration(config)
+    key = paper_key(arxiv_paper_url)
+    ref = get_blob_store().put(arxiv_paper)
+    cached = {}
+    if configuration["context_cache"] != "off":
+        cached = _cached_chains(key, arxiv_paper, configuration["context_cache"])
+    if not cached and configuration["teacher_context"] == "retrieval":
+        # Chunk and index the paper once; every teacher turn reuses the index.
+        get_paper_index(key, arxiv_paper, configuration["retrieval_chunk_chars"], ref)
+
+    try:
+        student_chain = register_chain("student", configuration["student_model"])
+        teacher_chain = register_chain("teacher", configuration["teacher_model"])
+        observer_chain = register_chain("observer", configuration["observer_model"])
     except Exception as e:
         return {
             "error": str(e)
         }
 
     return {
-        "arxiv_paper": arxiv_paper,
+        "paper_key": key,
+        "arxiv_paper_ref": ref,
         "current_turn": 0,
         "student_chain": student_chain,
         "teacher_chain": teacher_chain,
         "observer_chain": observer_chain,
+        **cached,
         }
 
-    
-    
 
-def student_node(state: AgentState, config: RunnableConfig):
+def init_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Download the paper and set up the chains for the run."""
+    arxiv_paper_url = state.get("arxiv_paper_url")
+    arxiv_paper = extract_pdf_from_url(arxiv_paper_url)
+    return _init_update(arxiv_paper_url, arxiv_paper, config)
+
+
+async def ainit_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Async version of ``init_node``."""
+    arxiv_paper_url = state.get("arxiv_paper_url")
+    arxiv_paper = await aextract_pdf_from_url(arxiv_paper_url)
+    # Uploading to context caching, indexing and writing the blob all block.
+    return await asyncio.to_thread(_init_update, arxiv_paper_url, arxiv_paper, config)
+
+
+def cleanup_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Release the run's cached paper content before the graph ends."""
+    context_cache_run = state.get("context_cache_run")
+    if context_cache_run:
+        get_context_cache_registry().release(context_cache_run)
+        drop_chain(state["student_chain"])
+        drop_chain(state["teacher_chain"])
+    return {}
+
+
+async def acleanup_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Async version of ``cleanup_node``; deleting cached content is a blocking API call."""
+    return await asyncio.to_thread(cleanup_node, state, config)
+
+
+def _item_writer(parser: Any) -> Callable[[List[Any]], None]:
+    """Send each item ``parser`` completes to the graph's custom stream."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Called outside a graph run, e.g. a node under test.
+        writer = None
+    count = [0]
+
+    def write(items: List[Any]) -> None:
+        for item in items:
+            if writer:
+                writer({"item": parser.name, "index": count[0], "value": item})
+            count[0] += 1
+
+    return write
+
+
+def role_chain(state: Mapping[str, Any], role: str, config: RunnableConfig) -> str:
+    """Return the chain reference for ``role``: the one set up at init, or the routing policy's pick."""
+    ref: str = state[f"{role}_chain"]
+    configuration = get_configuration(config)
+    if configuration["model_routing"] != "latency" or ref.startswith("cached:"):
+        return ref
+    model = get_model_stats().route(role, configuration["routing_models"], configuration["latency_target_ms"])
+    return register_chain(role, model)
+
+
+class _Call:
+    """One streamed chain call, recorded in ``agent.model_stats`` and ``agent.metrics``.
+
+    The call first waits for its turn in ``agent.rate_limiter``, reserving
+    the prompt's estimated tokens and ``RATE_LIMIT_OUTPUT_TOKENS``; the
+    reservation is settled against the actual usage when it finishes.
+    """
+
+    def __init__(self, role: str, state: Mapping[str, Any], prompt: str, config: RunnableConfig, parser: Any):
+        self.role = role
+        self.chain_ref = role_chain(state, role, config)
+        self.model = self.chain_ref.split(":")[1]
+        # Runs queue for the rate limiter, and keep their spans, under their thread.
+        self.run_id = run_id(config)
+        self.reserved = len(prompt) // 4 + RATE_LIMIT_OUTPUT_TOKENS
+        self.prompt = prompt
+        self.parser = parser
+        self.write = _item_writer(parser) if parser else None
+        self.content = ""
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.created = time.perf_counter()
+
+    def start(self) -> Any:
+        """Return the chain; latency is measured from here, after any rate-limit wait."""
+        self.start_time = time.perf_counter()
+        self.started_at = time.time()
+        return get_chain(self.chain_ref)
+
+    def add(self, chunk: Any) -> None:
+        self.content += chunk.content
+        tokens_in, tokens_out = usage(chunk)
+        self.tokens_in += tokens_in
+        self.tokens_out += tokens_out
+        if self.write:
+            self.write(self.parser.feed(chunk.content))
+
+    def finish(self) -> str:
+        if self.write:
+            self.write(self.parser.close())
+        if not (self.tokens_in or self.tokens_out):
+            # The model reported no usage; estimate about four characters a token.
+            self.tokens_in, self.tokens_out = len(self.prompt) // 4, len(self.content) // 4
+        get_rate_limiter().settle(self.model, self.reserved, self.tokens_in + self.tokens_out)
+        seconds = time.perf_counter() - self.start_time
+        get_model_stats().record(self.role, self.model, seconds, self.tokens_in, self.tokens_out)
+        get_metrics().record_llm_call(
+            self.run_id, self.role, self.model, self.started_at, self.start_time - self.created, seconds,
+            self.tokens_in, self.tokens_out,
+        )
+        return self.content
+
+    def fail(self, error: BaseException) -> None:
+        """Record the error and hand the whole reservation back to the rate limiter."""
+        get_rate_limiter().settle(self.model, self.reserved, 0)
+        get_metrics().record_llm_error(self.run_id, self.role, self.model, self.started_at, time.perf_counter() - self.start_time, error)
+
+
+def _call_chain(role: str, state: Mapping[str, Any], prompt: str, config: RunnableConfig, parser: Any = None) -> str:
+    """Stream the response of ``role``'s chain to ``prompt`` and return its text.
+
+    With a parser from ``agent.stream_parser``, each question or answer is
+    written to the graph's "custom" stream as soon as it is complete. The
+    call's latency and tokens are recorded under ``role`` in ``agent.model_stats``.
+    """
+    call = _Call(role, state, prompt, config, parser)
+    get_rate_limiter().acquire(call.model, call.reserved, call.run_id)
+    try:
+        chain = call.start()
+        for chunk in chain.stream({"input": prompt}):
+            call.add(chunk)
+    except BaseException as e:
+        call.fail(e)
+        raise
+    return call.finish()
+
+
+async def _acall_chain(role: str, state: Mapping[str, Any], prompt: str, config: RunnableConfig, parser: Any = None) -> str:
+    """Async ``_call_chain``: awaits the model instead of holding a worker thread."""
+    call = _Call(role, state, prompt, config, parser)
+    await get_rate_limiter().aacquire(call.model, call.reserved, call.run_id)
+    try:
+        chain = call.start()
+        async for chunk in chain.astream({"input": prompt}):
+            call.add(chunk)
+    except BaseException as e:
+        call.fail(e)
+        raise
+    return call.finish()
+
+
+def student_parser(state: AgentState) -> Any:
+    """Return the student's parser: a JSON array opens the run, ``<Question>`` elements follow."""
+    if state.get("current_turn", 0) == 0:
+        return JsonItemParser("question")
+    return XmlItemParser("Question")
+
+
+def teacher_parser() -> XmlItemParser:
+    """Return the teacher's parser, which emits each ``<ResponseItem>``."""
+    return XmlItemParser("ResponseItem", "response")
+
+
+def student_prompt(state: AgentState) -> str:
+    """Build the student prompt: six opening questions on turn 0, three follow-ups after."""
     messages = state.get("messages", [])
     current_turn = state.get("current_turn",0)
-    observer_insights = state.get("observer_insights", [])
-    questions_list = state.get("questions_list", [])
-    student_chain = state.get("student_chain")
-    arxiv_paper = state.get("arxiv_paper")
-    print(f"Student: Current turn: {current_turn}")
-
-    input_message = ""
+    student_insights = insights_for(state.get("observer_insights", []), "Student")
 
     if current_turn == 0:
 
+        if state.get("context_cache_run"):
+            paper_content = "The paper is provided in the cached context."
+        else:
+            paper_content = f"""#Paper Content Text#
+                {paper_text(state)}
+                #End Paper Content Text#"""
+
         prompt = f"""You are question generator for arxiv paper. Generate 6 questions for this paper which content text is below.
                 Your questions are responded from experts. You use paper abstract to generate questions.
                 Your generated questions cover main points of paper. 
@@ -153,29 +437,9 @@ def student_node(state: AgentState, config: RunnableConfig):
                 
 
 
-                #Paper Content Text#
-                {arxiv_paper}
-                #End Paper Content Text#
+                {paper_content}
                 """
-        first_questions_response = student_chain.invoke({"input": prompt})
-
-        cleaned = re.sub(r'^```json\s*', '', first_questions_response.content, flags=re.IGNORECASE)  # Remove ```json at the start
-        cleaned = re.sub(r'```$', '', cleaned)  # Remove ``` at the end
-        cleaned = cleaned.strip()
-
-        questions_list = json.loads(cleaned)
-
-        question_string_template = f"""<Questions>
-        {"\n".join([f"<Question>{question['prompt']}</Question>" for question in questions_list])}
-        </Questions>"""
-
-        print("question_string_template", question_string_template)
-
-        return {
-        "messages": messages + [HumanMessage(content=question_string_template, name="Student")],
-        "current_turn": current_turn + 1,
-        "questions_list": questions_list
-        }
+        return prompt
 
 
     else:
@@ -196,39 +460,86 @@ def student_node(state: AgentState, config: RunnableConfig):
         #End Teacher Response#
         """
 
-        if observer_insights:
+        if student_insights:
             observer_insights_template = f""" Follow these observer insights when generating questions:
             #Observer Insights#
-            {"\n\n".join(observer_insights)}
+            {student_insights}
             #End Observer Insights#
             """
             input_template = observer_insights_template + question_generator_template
         else:
             input_template = question_generator_template
 
-        try:
-            question_generator_response = student_chain.invoke({"input": input_template})
-        except Exception as e:
-            return {
-                "error": str(e)
-            }
-        print("question_generator_response", question_generator_response)
-        
-        # This function now returns the input dictionary for the student_agent
+        return input_template
+
+
+def student_update(state: AgentState, content: str) -> Dict[str, Any]:
+    """Turn the student's response into its message and the next turn."""
+    current_turn = state.get("current_turn",0)
+    questions_list = state.get("questions_list", [])
+
+    if current_turn == 0:
+        # Fences, chatter and a truncated last question are skipped by the parser.
+        questions = [item for item in parse_json_items(content) if item.get("prompt")]
+        if not questions:
+            raise ValueError(f"No questions in the student's response: {content[:200]!r}")
+
+        question_items = "\n".join([f"<Question>{question['prompt']}</Question>" for question in questions])
+        question_string_template = f"""<Questions>
+        {question_items}
+        </Questions>"""
+
+        logger.debug("question_string_template %s", question_string_template)
+
         return {
-            "messages": messages + [AIMessage(content=question_generator_response.content, name="Student")],
-            "current_turn": current_turn + 1,
-            "questions_list": questions_list + [question_generator_response.content] # Keep as list of one string for now, user can clarify if individual questions are needed
+        "messages": [HumanMessage(content=question_string_template, name="Student")],
+        "current_turn": current_turn + 1,
+        "questions_list": questions
         }
 
-def teacher_node(state: AgentState, config: RunnableConfig):
-    current_turn = state.get("current_turn", 0) 
-    observer_insights = state.get("observer_insights", [])
-    last_questions = state.get("questions_list", [])[-1]
-    arxiv_paper = state.get("arxiv_paper")
-    teacher_chain = state.get("teacher_chain")
-    messages = state.get("messages", [])
-    input_message = ""
+    logger.debug("question_generator_response %s", content)
+    return {
+        "messages": [AIMessage(content=content, name="Student")],
+        "current_turn": current_turn + 1,
+        "questions_list": questions_list + [content] # Keep as list of one string for now, user can clarify if individual questions are needed
+    }
+
+
+def student_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Ask the opening questions, or follow-ups on the teacher's last answer."""
+    current_turn = state.get("current_turn",0)
+    logger.info("Student: Current turn: %s", current_turn)
+    try:
+        content = _call_chain("student", state, student_prompt(state), config, student_parser(state))
+    except Exception as e:
+        if current_turn == 0:
+            raise
+        return {
+            "error": str(e)
+        }
+    return student_update(state, content)
+
+
+async def astudent_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Async version of ``student_node``."""
+    current_turn = state.get("current_turn",0)
+    logger.info("Student: Current turn: %s", current_turn)
+    try:
+        # Reading the paper back from the blob store blocks.
+        prompt = await asyncio.to_thread(student_prompt, state)
+        content = await _acall_chain("student", state, prompt, config, student_parser(state))
+    except Exception as e:
+        if current_turn == 0:
+            raise
+        return {
+            "error": str(e)
+        }
+    return student_update(state, content)
+
+def teacher_input(state: Mapping[str, Any], questions: str, config: RunnableConfig) -> str:
+    """Build the teacher prompt for ``questions``."""
+    teacher_insights = insights_for(state.get("observer_insights", []), "Teacher")
+    paper_context = teacher_paper_context(state, questions, config)
 
     # Combine observer insights into the input if available
 
@@ -256,48 +567,152 @@ def teacher_node(state: AgentState, config: RunnableConfig):
 
 
     #Questions#
-    {last_questions}
+    {questions}
     #End Questions#
 
 
     #Arxiv Paper#
-    {arxiv_paper}
+    {paper_context or "The paper is provided in the cached context."}
     #End Arxiv Paper#
     """
 
-    if observer_insights:
+    if teacher_insights:
         observer_insights_template = f""" Follow these observer insights when answering questions:
         #Observer Insights#
-        {"\n\n".join(observer_insights)}
+        {teacher_insights}
         #End Observer Insights#
         """
 
-        input_template = observer_insights_template + input_message
-    else:
-        input_template = input_message
+        return observer_insights_template + input_message
+    return input_message
+
+
+def teacher_update(state: AgentState, content: str) -> Dict[str, Any]:
+    """Turn the teacher's response into its message and the next turn."""
+    return {
+        "messages": [AIMessage(content=content, name="Teacher")],
+        "current_turn": state.get("current_turn", 0) + 1,
+    }
+
 
+def teacher_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Answer the student's latest questions in one call."""
+    input_template = teacher_input(state, latest_questions(state), config)
     try:
-        teacher_response = teacher_chain.invoke({"input": input_template})
+        content = _call_chain("teacher", state, input_template, config, teacher_parser())
     except Exception as e:
         return {
             "error": str(e)
         }
+    return teacher_update(state, content)
+
+
+async def ateacher_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Async version of ``teacher_node``."""
+    # Reading the paper or rebuilding an evicted retrieval index blocks.
+    input_template = await asyncio.to_thread(teacher_input, state, latest_questions(state), config)
+    try:
+        content = await _acall_chain("teacher", state, input_template, config, teacher_parser())
+    except Exception as e:
+        return {
+            "error": str(e)
+        }
+    return teacher_update(state, content)
+
+
+# State keys a fan-out branch needs to build its teacher prompt.
+_TEACHER_BRANCH_KEYS = ("arxiv_paper_ref", "paper_key", "teacher_chain", "observer_insights", "context_cache_run")
+
+
+def teacher_sends(state: AgentState, config: RunnableConfig) -> List[Send]:
+    """Split the student's questions into ``teacher_concurrency`` batches, one ``Send`` each.
+
+    With at least as many branches as questions every question is answered
+    on its own, so the turn takes about as long as the slowest answer.
+    """
+    last_questions = latest_questions(state)
+    questions = parse_xml_items(last_questions, "Question") or [last_questions]
+    concurrency = max(1, get_configuration(config)["teacher_concurrency"])
+    branch = {key: value for key, value in state.items() if key in _TEACHER_BRANCH_KEYS}
+    size, extra = divmod(len(questions), min(concurrency, len(questions)))
+    batches, start = [], 0
+    for i in range(min(concurrency, len(questions))):
+        end = start + size + (1 if i < extra else 0)
+        batches.append(questions[start:end])
+        start = end
+    return [
+        Send("teacher_answer", {**branch, "teacher_batch": i, "teacher_questions": batch})
+        for i, batch in enumerate(batches)
+    ]
+
+
+def teacher_branch_input(branch: Dict[str, Any], config: RunnableConfig) -> str:
+    """Build the teacher prompt for a fan-out branch's batch of questions."""
+    questions = "\n".join(f"<Question>{question}</Question>" for question in branch["teacher_questions"])
+    return teacher_input(branch, f"<Questions>\n{questions}\n</Questions>", config)
+
+
+def teacher_answer_node(branch: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+    """Answer one batch of questions in a fan-out branch."""
+    answer = {"batch": branch["teacher_batch"], "questions": branch["teacher_questions"]}
+    try:
+        answer["content"] = _call_chain("teacher", branch, teacher_branch_input(branch, config), config, teacher_parser())
+    except Exception as e:
+        # Branches run in the same step, so errors are reported through the merge node.
+        answer["error"] = str(e)
+    return {"teacher_answers": [answer]}
+
+
+async def ateacher_answer_node(branch: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+    """Async version of ``teacher_answer_node``."""
+    answer = {"batch": branch["teacher_batch"], "questions": branch["teacher_questions"]}
+    try:
+        prompt = await asyncio.to_thread(teacher_branch_input, branch, config)
+        answer["content"] = await _acall_chain("teacher", branch, prompt, config, teacher_parser())
+    except Exception as e:
+        answer["error"] = str(e)
+    return {"teacher_answers": [answer]}
+
 
-    # This function now returns the input dictionary for the teacher_agent
+def merge_teacher_answers(answers: List[Dict[str, Any]]) -> str:
+    """Join branch answers into one ``<Responses>`` document, in question order.
+
+    A batch whose branch failed gets a ``<ResponseItem>`` whose response is
+    the error, so the other batches' answers still reach the student.
+    """
+    items = []
+    for answer in sorted(answers, key=lambda answer: answer["batch"]):
+        if "error" in answer:
+            question = " ".join(answer["questions"])
+            items.append(f"<ResponseItem>\n<Question>{question}</Question>\n<Response>Not answered: {answer['error']}</Response>\n</ResponseItem>")
+            continue
+        found = parse_xml_items(answer["content"], "ResponseItem")
+        if found:
+            items.extend(f"<ResponseItem>\n{item}\n</ResponseItem>" for item in found)
+        else:
+            # The model skipped the XML; keep its answer under the batch's questions.
+            question = " ".join(answer["questions"])
+            items.append(f"<ResponseItem>\n<Question>{question}</Question>\n<Response>{answer['content'].strip()}</Response>\n</ResponseItem>")
+    return "<Responses>\n" + "\n".join(items) + "\n</Responses>"
+
+
+def teacher_merge_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Join the fan-out answers into one teacher message and end the turn."""
+    answers = state.get("teacher_answers", [])
+    errors = [answer["error"] for answer in answers if "error" in answer]
+    if answers and len(errors) == len(answers):
+        # Nothing was answered; end the run as a single teacher call would.
+        return {"error": "; ".join(errors), "teacher_answers": None}
     return {
-        "messages": messages + [AIMessage(content=teacher_response.content, name="Teacher") ],
-        "current_turn": current_turn + 1,
+        "messages": [AIMessage(content=merge_teacher_answers(answers), name="Teacher")],
+        "current_turn": state.get("current_turn", 0) + 1,
+        "teacher_answers": None,
     }
 
-def observer_node(state: AgentState, config: RunnableConfig):
-    messages = state.get("messages", [])
-    current_turn = state.get("current_turn")
-    observer_insights = state.get("observer_insights", [])
-    observer_chain = state.get("observer_chain")
-
-    
 
-    conversation_history_template = f"\n\n".join([f"""
+def conversation_history(messages: List[Any], start: int) -> str:
+    """Render ``messages[start:]`` for the observer, numbered by message index."""
+    return "\n\n".join([f"""
     <Response>
     <Turn>{turn}</Turn>
     <Responder>{message.name}</Responder>
@@ -305,14 +720,64 @@ def observer_node(state: AgentState, config: RunnableConfig):
     {message.content}
     </ResponseContent>
     </Response>
-    """ for turn, message in enumerate(messages[1:])])
+    """ for turn, message in enumerate(messages[start:], start)])
+
+
+def split_observer_response(content: str, previous_summary: str, new_history: str) -> Tuple[str, str]:
+    """Split the observer's response into its rolling summary and its instructions.
+
+    If the model left out the ``<Summary>`` block the new history is appended
+    to the previous summary instead, keeping only the last
+    ``OBSERVER_SUMMARY_MAX_CHARS`` characters.
+    """
+    match = _SUMMARY.search(content)
+    if match:
+        return match.group(1).strip(), _SUMMARY.sub("", content).strip()
+    summary = f"{previous_summary}\n{new_history}".strip()
+    return summary[-OBSERVER_SUMMARY_MAX_CHARS:], content
+
+
+def observer_prompt(state: AgentState, config: RunnableConfig) -> Tuple[str, str, str]:
+    """Build the observer prompt.
+
+    Returns:
+        The prompt, the summary it was built on and the rendered new history,
+        which ``observer_update`` falls back on if the model drops the summary.
+    """
+    messages = state.get("messages", [])
+    current_turn = state.get("current_turn")
+    observer_summary = state.get("observer_summary", "")
+    # The first message is the student's opening question list.
+    observer_cursor = state.get("observer_cursor", 1)
+    configuration = get_configuration(config)
+
+    # Only the messages since the last intervention are sent, on top of the
+    # rolling summary, unless this is the last intervention and a full pass
+    # was asked for.
+    last_intervention = current_turn + configuration["k_interval"] > configuration["n_loops"]
+    if last_intervention and configuration["observer_full_history_final"]:
+        history_start = 1
+        observer_summary = ""
+        summary_template = ""
+    else:
+        history_start = observer_cursor
+        summary_template = f"""
+    #Conversation Summary#
+    {observer_summary or "No earlier conversation."}
+    #End Conversation Summary#
+    """
+    conversation_history_template = conversation_history(messages, history_start)
     observer_input = f"""
     Review the conversation history and provide instructions to guide the student and teacher to discuss cached arxiv paper arxiv_paper_cache .
     Give instructions for student to generate better questions. 
     Give instructions for teacher to when answering questions to follow instructions.
+    Also update the conversation summary with the new conversations. The summary covers the whole conversation so far in at most 200 words.
 
-    Give only instructions do not include any other text. Response format should be xml format like that:
+    Give only the summary and instructions do not include any other text. Response format should be xml format like that:
 
+    <Summary>
+        Updated conversation summary
+    </Summary>
     <Instructions>
     <Instruction>
         <Student>
@@ -324,21 +789,50 @@ def observer_node(state: AgentState, config: RunnableConfig):
     </Instruction>
     </Instructions>
     
-    
+    {summary_template}
     #Conversations#
     {conversation_history_template}
     #End Conversations#
     """
+    return observer_input, observer_summary, conversation_history_template
+
+
+def observer_update(state: AgentState, content: str, observer_summary: str, new_history: str) -> Dict[str, Any]:
+    """Turn the observer's response into its message, directives and rolling summary."""
+    messages = state.get("messages", [])
+    current_turn = state.get("current_turn")
+    observer_insights = state.get("observer_insights", [])
+    observer_summary, instructions = split_observer_response(content, observer_summary, new_history)
+
+    return {
+        "messages": [AIMessage(content=instructions, name="Observer")],
+        "current_turn": current_turn + 1,
+        "observer_insights": merge_insights(observer_insights, parse_directives(instructions), current_turn),
+        "observer_summary": observer_summary,
+        # Skip past the observer's own message on the next intervention.
+        "observer_cursor": len(messages) + 1,
+    }
+
+
+def observer_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Review the conversation so far and give the student and teacher directives."""
+    observer_input, observer_summary, new_history = observer_prompt(state, config)
     try:
-        observer_response = observer_chain.invoke({"input": observer_input})
+        content = _call_chain("observer", state, observer_input, config)
     except Exception as e:
         return {
             "error": str(e)
         }
+    return observer_update(state, content, observer_summary, new_history)
 
 
-    return {
-        "messages": messages + [AIMessage(content=observer_response.content, name="Observer")],
-        "current_turn": current_turn + 1,
-        "observer_insights": observer_insights + [observer_response.content],
-    }
+async def aobserver_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """Async version of ``observer_node``."""
+    observer_input, observer_summary, new_history = observer_prompt(state, config)
+    try:
+        content = await _acall_chain("observer", state, observer_input, config)
+    except Exception as e:
+        return {
+            "error": str(e)
+        }
+    return observer_update(state, content, observer_summary, new_history)
@@ -0,0 +1,109 @@
+"""Canonical keys for papers.
+
+Users send the same arXiv paper as ``/abs/``, ``/pdf/`` or ``.pdf`` URLs,
+with or without a version suffix and from mirror hosts. ``paper_key`` maps
+all of these to one ``arxiv:<id>[v<version>]`` key so every cache that is
+keyed on papers shares its hits across URL variants. Non-arXiv URLs fall
+back to a normalized form of the URL.
+"""
+
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+# arxiv.org and its subdomains (www, export, lanl, country mirrors) are matched by suffix.
+ARXIV_HOSTS = ("arxiv.org", "xxx.lanl.gov")
+
+_ID_PATTERN = re.compile(
+    r"""
+    (?P<id>
+        \d{4}\.\d{4,5}                              # new style: 2401.12345
+        | [a-z][a-z\-]*(?:\.[A-Z]{2})?/\d{7}        # old style: hep-th/9901001, math.GT/0309136
+    )
+    (?:v(?P<version>\d+))?
+    (?:\.pdf)?$
+    """,
+    re.VERBOSE,
+)
+_PATH_PREFIX = re.compile(r"^/(?:abs|pdf|html|format|ps|src)/")
+
+
+class ArxivId(NamedTuple):
+    """An arXiv identifier with an optional version."""
+
+    id: str
+    version: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        """Cache key, e.g. ``arxiv:2401.12345v2``."""
+        return f"arxiv:{self.id}{self._suffix}"
+
+    @property
+    def pdf_url(self) -> str:
+        """Canonical PDF URL on arxiv.org."""
+        return f"https://arxiv.org/pdf/{self.id}{self._suffix}"
+
+    @property
+    def _suffix(self) -> str:
+        return f"v{self.version}" if self.version is not None else ""
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings share a key.
+
+    Lowercases the scheme and host, upgrades ``http`` to ``https``, drops the
+    fragment and any trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    if scheme == "http":
+        scheme = "https"
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, parts.netloc.lower(), path, parts.query, ""))
+
+
+def _is_arxiv_host(host: str) -> bool:
+    host = host.lower().split(":")[0]
+    return any(host == known or host.endswith("." + known) for known in ARXIV_HOSTS)
+
+
+def parse_arxiv_id(value: str) -> Optional[ArxivId]:
+    """Parse an arXiv URL or identifier (``arXiv:2401.12345v2``) into an ``ArxivId``.
+
+    Returns:
+        The identifier, or ``None`` if ``value`` is not an arXiv reference.
+    """
+    value = value.strip()
+    if "://" in value:
+        parts = urlsplit(value)
+        if not _is_arxiv_host(parts.netloc):
+            return None
+        candidate = _PATH_PREFIX.sub("", parts.path.rstrip("/"))
+    else:
+        candidate = re.sub(r"^arxiv:", "", value, flags=re.IGNORECASE)
+    match = _ID_PATTERN.match(candidate)
+    if match is None:
+        return None
+    version = match.group("version")
+    return ArxivId(match.group("id"), int(version) if version else None)
+
+
+def paper_key(url: str) -> str:
+    """Return the canonical cache key for a paper URL."""
+    arxiv_id = parse_arxiv_id(url)
+    if arxiv_id is not None:
+        return arxiv_id.key
+    return normalize_url(url)
+
+
+def canonical_pdf_url(url: str) -> str:
+    """Return the URL to download the paper PDF from.
+
+    arXiv references of any form resolve to the arxiv.org PDF URL, so an
+    ``/abs/`` page link downloads the PDF rather than the HTML page.
+    """
+    arxiv_id = parse_arxiv_id(url)
+    if arxiv_id is not None:
+        return arxiv_id.pdf_url
+    return url
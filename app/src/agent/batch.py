@@ -0,0 +1,275 @@
+"""Discuss many papers with bounded concurrency.
+
+``run_batch`` runs the compiled graph over a list of paper URLs, at most
+``concurrency`` runs at a time on one event loop, or split across
+``processes`` worker processes that each run their own loop. The workers
+share the paper cache and the checkpoint database; both are safe for
+concurrent processes, and workers commit every checkpoint so none holds the
+database's write lock across steps. Every paper
+runs in its own thread, ``batch-<paper key>``, so with a durable
+checkpointer an interrupted batch picks each unfinished paper up from its
+last checkpoint.
+
+Results are appended to a JSONL file as each paper finishes, one line per
+paper, under an exclusive ``flock`` so worker processes never interleave
+lines. A run that raises, e.g. on a locked checkpoint database, is written
+as a "failed" result like any other failure. On restart, papers already written with status "ok" are skipped and
+failed ones are retried from scratch in a new thread, ``batch-<paper
+key>-<attempt>``. Papers are told apart by their key, so abs, pdf and
+bare-id URLs of one paper run once::
+
+    python -m agent.batch papers.txt --output results.jsonl --concurrency 8
+    python -m agent.batch papers.txt --output results.jsonl --processes 4 --config '{"n_loops": 6}'
+
+The returned report has the throughput in papers per hour and the latency of
+each node, e.g. ``{"papers": 120, "ok": 118, "failed": 2, "papers_per_hour":
+310.4, "nodes": {"teacher": {"count": 480, "p50_ms": ..., "p95_ms": ...}}}``.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from agent.arxiv_id import paper_key
+from agent.metrics import get_metrics
+from agent.model_stats import percentile
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+def thread_id(url: str, attempt: int = 0) -> str:
+    """Return the checkpoint thread of a paper, stable across restarts until a run fails."""
+    return f"batch-{paper_key(url)}" + (f"-{attempt}" if attempt else "")
+
+
+def read_results(output: str) -> Tuple[Set[str], Counter[str]]:
+    """Return the keys of papers already written to ``output`` with status "ok", and failures per key."""
+    done: Set[str] = set()
+    failures: Counter[str] = Counter()
+    if not os.path.exists(output):
+        return done, failures
+    with open(output) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut off by a crash; the paper runs again.
+                continue
+            if result.get("status") == "ok":
+                done.add(paper_key(result["url"]))
+            else:
+                failures[paper_key(result["url"])] += 1
+    return done, failures
+
+
+def _pending(urls: Iterable[str], done: Set[str]) -> List[str]:
+    """Return the first URL of each paper in ``urls`` whose key is not in ``done``."""
+    pending: Dict[str, str] = {}
+    for url in urls:
+        pending.setdefault(paper_key(url), url)
+    return [url for key, url in pending.items() if key not in done]
+
+
+def _result(url: str, thread: str, values: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    error = values.get("error")
+    return {
+        "url": url,
+        "thread_id": thread,
+        "status": "failed" if error else "ok",
+        "seconds": round(seconds, 3),
+        "error": error,
+        "turns": values.get("current_turn", 0),
+        "messages": [{"name": message.name, "content": message.content} for message in values.get("messages", [])],
+        "observer_summary": values.get("observer_summary", ""),
+    }
+
+
+async def _run_paper(
+    graph: Any, url: str, attempt: int, configurable: Dict[str, Any], node_ms: Dict[str, List[float]]
+) -> Dict[str, Any]:
+    thread = thread_id(url, attempt)
+    config = {"configurable": {**configurable, "thread_id": thread}, "recursion_limit": 1000}
+    start = time.perf_counter()
+    graph_input: Optional[Dict[str, Any]] = {"arxiv_paper_url": url}
+    if graph.checkpointer is not None:
+        snapshot = await graph.aget_state(config)
+        if snapshot.values:
+            if not snapshot.next:
+                # Finished before the result was written.
+                return _result(url, thread, snapshot.values, time.perf_counter() - start)
+            logger.info("Batch: resuming %s from its last checkpoint", url)
+            graph_input = None
+
+    values: Dict[str, Any] = {}
+    started: Dict[str, float] = {}
+    try:
+        with get_metrics().track_run(thread):
+            async for mode, chunk in graph.astream(graph_input, config, stream_mode=["tasks", "values"]):
+                if mode == "values":
+                    values = chunk
+                elif "result" in chunk or "error" in chunk:
+                    if chunk["id"] in started:
+                        node_ms.setdefault(chunk["name"], []).append((time.perf_counter() - started.pop(chunk["id"])) * 1000)
+                else:
+                    started[chunk["id"]] = time.perf_counter()
+    except Exception as e:
+        values = {**values, "error": str(e)}
+    return _result(url, thread, values, time.perf_counter() - start)
+
+
+async def arun_batch(
+    urls: Iterable[str],
+    output: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    configurable: Optional[Dict[str, Any]] = None,
+    graph: Any = None,
+) -> Dict[str, Any]:
+    """Run the graph over ``urls`` with at most ``concurrency`` runs at a time.
+
+    Args:
+        urls: Paper URLs; repeats of a paper and papers already finished in ``output`` are skipped.
+        output: JSONL file the results are appended to as they finish.
+        concurrency: Maximum number of runs in flight.
+        configurable: Graph configuration shared by every run, see ``agent.configuration``.
+        graph: Compiled graph to run, ``agent.graph.graph`` by default.
+
+    Returns:
+        The batch report, see ``report``.
+    """
+    if graph is None:
+        from agent.graph import graph
+    done, failures = read_results(output)
+    pending = _pending(urls, done)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    node_ms: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {"ok": 0, "failed": 0}
+    start = time.perf_counter()
+
+    with open(output, "a") as f:
+
+        async def run(url: str) -> None:
+            started = time.perf_counter()
+            attempt = failures[paper_key(url)]
+            try:
+                async with semaphore:
+                    result = await _run_paper(graph, url, attempt, configurable or {}, node_ms)
+            except Exception as e:
+                # Failures outside the graph run itself, e.g. reading its checkpoint.
+                result = _result(url, thread_id(url, attempt), {"error": str(e)}, time.perf_counter() - started)
+            statuses[result["status"]] += 1
+            _append(f, result)
+            logger.info("Batch: %s %s in %.1fs", result["status"], url, result["seconds"])
+
+        await asyncio.gather(*(run(url) for url in pending))
+
+    return report(statuses, node_ms, time.perf_counter() - start, skipped=len(done))
+
+
+def _append(f: Any, result: Dict[str, Any]) -> None:
+    """Append one result line; the lock keeps lines from other processes whole."""
+    fcntl.flock(f, fcntl.LOCK_EX)
+    try:
+        f.write(json.dumps(result) + "\n")
+        f.flush()
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _run_in_process(urls: List[str], output: str, concurrency: int, configurable: Dict[str, Any]) -> Dict[str, Any]:
+    from agent.checkpoint import SqliteCheckpointSaver
+    from agent.graph import graph
+
+    if isinstance(graph.checkpointer, SqliteCheckpointSaver):
+        # A batched transaction would hold the write lock against the other workers.
+        graph.checkpointer.batch_size = 1
+    result = asyncio.run(arun_batch(urls, output, concurrency, configurable, graph))
+    # The parent merges raw samples; percentiles of percentiles would be wrong.
+    samples: Dict[str, Any] = result["samples"]
+    return samples
+
+
+def run_batch(
+    urls: Iterable[str],
+    output: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    processes: int = 0,
+    configurable: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Run a batch, in this process or split across ``processes`` worker processes.
+
+    Each worker runs ``arun_batch`` on its share of the papers with
+    ``concurrency`` runs at a time and appends to the same ``output``.
+    """
+    if processes <= 0:
+        return asyncio.run(arun_batch(urls, output, concurrency, configurable))
+    done, _ = read_results(output)
+    pending = _pending(urls, done)
+    shares = [pending[i::processes] for i in range(processes)]
+    start = time.perf_counter()
+    statuses: Dict[str, int] = {"ok": 0, "failed": 0}
+    node_ms: Dict[str, List[float]] = {}
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_run_in_process, share, output, concurrency, configurable or {}) for share in shares if share]
+        for future in futures:
+            samples = future.result()
+            for status, count in samples["statuses"].items():
+                statuses[status] += count
+            for node, latencies in samples["node_ms"].items():
+                node_ms.setdefault(node, []).extend(latencies)
+    return report(statuses, node_ms, time.perf_counter() - start, skipped=len(done))
+
+
+def report(statuses: Dict[str, int], node_ms: Dict[str, List[float]], seconds: float, skipped: int = 0) -> Dict[str, Any]:
+    """Summarize a batch: counts, papers per hour and latency per node."""
+    papers = sum(statuses.values())
+    return {
+        "papers": papers,
+        "ok": statuses["ok"],
+        "failed": statuses["failed"],
+        "skipped": skipped,
+        "seconds": round(seconds, 3),
+        "papers_per_hour": round(papers / seconds * 3600, 1) if seconds else 0.0,
+        "nodes": {
+            node: {
+                "count": len(latencies),
+                "p50_ms": round(percentile(latencies, 0.5), 1),
+                "p95_ms": round(percentile(latencies, 0.95), 1),
+            }
+            for node, latencies in sorted(node_ms.items())
+        },
+        "samples": {"statuses": statuses, "node_ms": node_ms},
+    }
+
+
+def main() -> None:
+    """Run the batch described by the command line and print its summary as JSON."""
+    parser = argparse.ArgumentParser(description="Discuss many arXiv papers with bounded concurrency.")
+    parser.add_argument("urls", help="file with one paper URL per line")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results, appended as papers finish")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="runs in flight per process")
+    parser.add_argument("--processes", type=int, default=0, help="worker processes; 0 runs in this process")
+    parser.add_argument("--config", default="{}", help="JSON graph configuration, e.g. '{\"n_loops\": 6}'")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with open(args.urls) as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    result = run_batch(urls, args.output, args.concurrency, args.processes, json.loads(args.config))
+    result.pop("samples")
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Content-addressed store for large immutable state values.
+
+The paper markdown is hundreds of KB and never changes during a run.
+Keeping it in ``AgentState`` meant every checkpointer wrote it with the
+thread, and every state snapshot carried it around. It is now interned here
+once, under the SHA-256 of its content, and the state only holds the
+reference::
+
+    "sha256:3b1f..."
+
+Nodes hydrate a reference with ``get`` only when they actually read the
+text. Recently read values are kept in a small in-process LRU, so the
+teacher does not reread the file every turn.
+
+Values are stored zstd-compressed in ``<cache_dir>/<aa>/<digest>.zst``. The
+same paper interned by many runs or threads is stored once.
+
+Blobs are evicted least-recently-used first once they add up to more than
+``max_bytes``, and any blob unused for ``max_age`` seconds is removed.
+Recency is tracked through the file modification time, touched on every put
+and read (at most once a minute for values served from memory). A thread
+whose blob was evicted can no longer be resumed from its checkpoints: the
+next node that reads the paper fails with ``KeyError``.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import zstandard
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", ".blob_store")
+BLOB_CACHE_ITEMS = int(os.getenv("BLOB_CACHE_ITEMS", "8"))
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+BLOB_STORE_MAX_AGE = float(os.getenv("BLOB_STORE_MAX_AGE", str(30 * 24 * 60 * 60)))
+# Values served from memory touch their file at most this often.
+_TOUCH_INTERVAL = 60.0
+
+REF_PREFIX = "sha256:"
+
+
+def is_ref(value: object) -> bool:
+    """Whether ``value`` is a blob reference."""
+    return isinstance(value, str) and value.startswith(REF_PREFIX) and len(value) == len(REF_PREFIX) + 64
+
+
+class BlobStore:
+    """Content-addressed, zstd-compressed text store with an LRU of hydrated values."""
+
+    def __init__(
+        self,
+        root: str = BLOB_STORE_DIR,
+        cache_items: int = BLOB_CACHE_ITEMS,
+        max_bytes: int = BLOB_STORE_MAX_BYTES,
+        max_age: float = BLOB_STORE_MAX_AGE,
+    ) -> None:
+        """Store blobs under ``root``, evicting the least recently used past ``max_bytes`` or ``max_age``."""
+        self.root = Path(root)
+        self.cache_items = cache_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.puts = 0
+        self.dedup_hits = 0
+        self.reads = 0
+        self.cache_hits = 0
+        self.evictions = 0
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.zst"
+
+    def _remember(self, ref: str, text: str) -> None:
+        with self._lock:
+            self._cache[ref] = text
+            self._cache.move_to_end(ref)
+            while len(self._cache) > self.cache_items:
+                self._cache.popitem(last=False)
+
+    def put(self, text: str) -> str:
+        """Intern ``text`` and return its reference."""
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        ref = REF_PREFIX + digest
+        path = self._path(digest)
+        self.puts += 1
+        if path.exists():
+            self.dedup_hits += 1
+            self._touch(ref, path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file and rename so readers never see a partial blob.
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(zstandard.ZstdCompressor(level=3).compress(data))
+            os.replace(tmp, path)
+            self.evict(keep=path)
+        self._remember(ref, text)
+        return ref
+
+    def get(self, ref: str) -> str:
+        """Return the text for a reference, reading it from disk on a cache miss.
+
+        Raises:
+            KeyError: If the blob is not in the store.
+        """
+        with self._lock:
+            text = self._cache.get(ref)
+            if text is not None:
+                self._cache.move_to_end(ref)
+                self.cache_hits += 1
+                touch = time.time() - self._touched.get(ref, 0.0) > _TOUCH_INTERVAL
+            else:
+                touch = False
+        path = self._path(ref[len(REF_PREFIX):])
+        if text is not None:
+            if touch:
+                self._touch(ref, path)
+            return text
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            raise KeyError(f"Blob {ref} is not in {self.root}") from None
+        text = zstandard.ZstdDecompressor().decompress(data).decode()
+        self._touch(ref, path)
+        self.reads += 1
+        self._remember(ref, text)
+        return text
+
+    def _touch(self, ref: str, path: Path) -> None:
+        """Mark a blob as recently used for eviction."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted meanwhile; the in-memory copy is still valid.
+            pass
+        with self._lock:
+            self._touched[ref] = time.time()
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Remove blobs unused for ``max_age``, then the least recently used over ``max_bytes``.
+
+        ``keep`` is never removed, e.g. the blob that was just written.
+        """
+        with self._evict_lock:
+            now = time.time()
+            entries = []
+            total = 0
+            for path in self.root.glob("*/*.zst"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            for mtime, size, path in sorted(entries, key=lambda entry: entry[0]):
+                if total <= self.max_bytes and now - mtime <= self.max_age:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+                with self._lock:
+                    self._touched.pop(REF_PREFIX + path.stem, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters for interned, hydrated and evicted values."""
+        return {
+            "puts": self.puts,
+            "dedup_hits": self.dedup_hits,
+            "reads": self.reads,
+            "cache_hits": self.cache_hits,
+            "evictions": self.evictions,
+        }
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store."""
+    global _store
+    if _store is None:
+        _store = BlobStore()
+    return _store
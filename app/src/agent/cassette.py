@@ -0,0 +1,282 @@
+"""Record and replay model calls and paper downloads.
+
+A cassette captures every chain call the nodes make (keyed by model and a
+hash of the prompt) and every paper fetched by the initial node, so the
+graph can later run without network access or API keys:
+
+    with use_cassette("run.cassette", "record"):
+        graph.invoke({"arxiv_paper_url": url}, config)    # live, and recorded
+
+    with use_cassette("run.cassette", "replay", latency="recorded"):
+        graph.invoke({"arxiv_paper_url": url}, config)    # offline
+
+The file is zstd-compressed JSON. Prompts are stored as hashes, and each
+paper text is stored once however many URLs point at it. Recordings are
+kept in memory and written once, when the ``use_cassette`` block exits
+(or at interpreter exit for a cassette installed from the environment).
+
+On replay, a prompt the cassette has not seen is answered with a synthetic
+response in the format the prompt asks for, and an unknown URL gets the
+``PDF_TEXT`` fixture. This lets a cassette drive runs with other settings,
+e.g. more turns. With ``strict=True`` both raise ``KeyError`` instead.
+Replayed calls take no time by default. ``latency`` makes them wait a fixed
+number of seconds, or ``"recorded"`` makes them wait as long as the live
+call did.
+
+Setting ``LLM_CASSETTE`` (and ``LLM_CASSETTE_MODE``, "replay" by default)
+installs a cassette when ``agent.graph`` is imported.
+"""
+
+import asyncio
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import zstandard
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent.stream_parser import parse_xml_items
+
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "")
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "replay")
+LLM_CASSETTE_LATENCY = os.getenv("LLM_CASSETTE_LATENCY", "0")
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()[:32]
+
+
+def synthesize(prompt: str) -> str:
+    """Return a well-formed response to one of the agents' prompts, for calls missing from a cassette."""
+    if "Generate 6 questions" in prompt:
+        return json.dumps([
+            {"title": f"Question {i}", "prompt": f"What does section {i} of the paper contribute?", "category": "method"}
+            for i in range(1, 7)
+        ])
+    if "Generate 3 questions" in prompt:
+        return "<Questions>\n" + "\n".join(
+            f"<Question>How does the method handle case {i}?</Question>" for i in range(1, 4)
+        ) + "\n</Questions>"
+    if "Respond to the questions" in prompt:
+        questions = parse_xml_items(prompt.split("#Questions#")[-1], "Question") or ["Question"]
+        return "<Responses>\n" + "\n".join(
+            f"<ResponseItem>\n<Question>{question}</Question>\n<Response>The paper addresses this in its method section.</Response>\n</ResponseItem>"
+            for question in questions
+        ) + "\n</Responses>"
+    return (
+        "<Summary>The student and teacher discussed the paper's method.</Summary>\n"
+        "<Instructions><Instruction><Student>Ask about the evaluation.</Student>"
+        "<Teacher>Cite the relevant sections.</Teacher></Instruction></Instructions>"
+    )
+
+
+class Cassette:
+    """Recorded model calls and paper texts, loaded from and saved to ``path``."""
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        latency: Union[float, str] = 0.0,
+        strict: bool = False,
+    ) -> None:
+        """Open the cassette at ``path``; replaying requires the file, recording extends it if it exists."""
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.strict = strict
+        # Prompt key -> the responses recorded for it, in order.
+        self.calls: Dict[str, List[Dict[str, Any]]] = {}
+        self.papers: Dict[str, str] = {}
+        self.texts: Dict[str, str] = {}
+        self.synthesized = 0
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == "replay" or os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        """Read the recordings from ``path``."""
+        with open(self.path, "rb") as f:
+            data = json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+        self.calls, self.papers, self.texts = data["calls"], data["papers"], data["texts"]
+
+    def save(self) -> None:
+        """Write the recordings to ``path`` atomically."""
+        with self._lock:
+            data = json.dumps({"calls": self.calls, "papers": self.papers, "texts": self.texts}).encode()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=10).compress(data))
+        os.replace(tmp, self.path)
+
+    def _record_call(self, key: str, message: Any, seconds: float) -> None:
+        with self._lock:
+            self.calls.setdefault(key, []).append({
+                "content": message.content,
+                "usage": dict(getattr(message, "usage_metadata", None) or {}),
+                "seconds": round(seconds, 3),
+            })
+
+    def _replay_call(self, key: str, prompt: str) -> Dict[str, Any]:
+        with self._lock:
+            responses = self.calls.get(key)
+            if responses:
+                # A prompt seen more than once is answered in recorded order, then with its last answer.
+                index = self._cursor.get(key, 0)
+                self._cursor[key] = index + 1
+                return responses[min(index, len(responses) - 1)]
+        if self.strict:
+            raise KeyError(f"Prompt {key} is not in cassette {self.path}")
+        self.synthesized += 1
+        return {"content": synthesize(prompt), "usage": {}, "seconds": 0.0}
+
+    def _delay(self, response: Dict[str, Any]) -> float:
+        if self.latency == "recorded":
+            return float(response["seconds"])
+        return float(self.latency)
+
+    @staticmethod
+    def _message(response: Dict[str, Any]) -> AIMessage:
+        return AIMessage(content=response["content"], usage_metadata=response["usage"] or None)
+
+    def llm_factory(self, live_factory: Optional[Callable[..., Any]] = None) -> Callable[..., Any]:
+        """Return an LLM factory for ``agent.chain_registry.set_llm_factory``.
+
+        In record mode calls go to models built by ``live_factory`` and are
+        recorded; in replay mode they are answered from the cassette.
+        """
+
+        def factory(model: str, cached_content: Optional[str] = None) -> Any:
+            live = None
+            if self.mode == "record":
+                if live_factory is None:
+                    raise ValueError("Recording a cassette needs a live_factory")
+                live = live_factory(model, cached_content=cached_content)
+
+            def call(prompt_value: Any) -> AIMessage:
+                prompt = prompt_value.to_string()
+                key = _digest(model, prompt)
+                if live is not None:
+                    start = time.perf_counter()
+                    message: AIMessage = live.invoke(prompt_value)
+                    self._record_call(key, message, time.perf_counter() - start)
+                    return message
+                response = self._replay_call(key, prompt)
+                time.sleep(self._delay(response))
+                return self._message(response)
+
+            async def acall(prompt_value: Any) -> AIMessage:
+                prompt = prompt_value.to_string()
+                key = _digest(model, prompt)
+                if live is not None:
+                    start = time.perf_counter()
+                    message: AIMessage = await live.ainvoke(prompt_value)
+                    self._record_call(key, message, time.perf_counter() - start)
+                    return message
+                response = self._replay_call(key, prompt)
+                await asyncio.sleep(self._delay(response))
+                return self._message(response)
+
+            return RunnableLambda(call, afunc=acall, name=f"cassette:{model}")
+
+        return factory
+
+    def _record_paper(self, url: str, text: str) -> None:
+        digest = _digest(text)
+        with self._lock:
+            self.texts[digest] = text
+            self.papers[url] = digest
+
+    def _replay_paper(self, url: str) -> str:
+        digest = self.papers.get(url)
+        if digest is not None:
+            return self.texts[digest]
+        if self.strict:
+            raise KeyError(f"Paper {url} is not in cassette {self.path}")
+        from agent.pdf import PDF_TEXT
+
+        return PDF_TEXT
+
+    def fetcher(self, live_fetch: Callable[[str], str]) -> Callable[[str], str]:
+        """Wrap ``extract_pdf_from_url``: record its results, or replay them."""
+
+        def fetch(url: str) -> str:
+            if self.mode == "replay":
+                return self._replay_paper(url)
+            text = live_fetch(url)
+            self._record_paper(url, text)
+            return text
+
+        return fetch
+
+    def afetcher(self, live_fetch: Callable[[str], Any]) -> Callable[[str], Any]:
+        """Wrap ``aextract_pdf_from_url``: record its results, or replay them."""
+
+        async def fetch(url: str) -> str:
+            if self.mode == "replay":
+                return self._replay_paper(url)
+            text: str = await live_fetch(url)
+            self._record_paper(url, text)
+            return text
+
+        return fetch
+
+
+@contextlib.contextmanager
+def use_cassette(
+    path: str,
+    mode: str = "replay",
+    latency: Union[float, str] = 0.0,
+    strict: bool = False,
+    live_factory: Optional[Callable[..., Any]] = None,
+) -> Iterator[Cassette]:
+    """Route the nodes' model calls and paper fetches through a cassette for the block.
+
+    Recording calls models built by ``live_factory``, Gemini by default, and
+    saves the cassette when the block exits, even if it raised.
+    """
+    from agent import agents
+    from agent.chain_registry import default_llm_factory, set_llm_factory
+
+    cassette = Cassette(path, mode, latency, strict)
+    fetch, afetch = getattr(agents, "extract_pdf_from_url"), getattr(agents, "aextract_pdf_from_url")
+    set_llm_factory(cassette.llm_factory(live_factory or default_llm_factory))
+    # The nodes call the fetchers through the agents module, so they are swapped there.
+    setattr(agents, "extract_pdf_from_url", cassette.fetcher(fetch))
+    setattr(agents, "aextract_pdf_from_url", cassette.afetcher(afetch))
+    try:
+        yield cassette
+    finally:
+        setattr(agents, "extract_pdf_from_url", fetch)
+        setattr(agents, "aextract_pdf_from_url", afetch)
+        set_llm_factory(None)
+        if mode == "record":
+            cassette.save()
+
+
+_installed: Optional[contextlib.AbstractContextManager[Cassette]] = None
+
+
+def install_from_env() -> Optional[Cassette]:
+    """Install the cassette named by ``LLM_CASSETTE`` for the rest of the process, if set."""
+    global _installed
+    if not LLM_CASSETTE or _installed is not None:
+        return None
+    latency = LLM_CASSETTE_LATENCY if LLM_CASSETTE_LATENCY == "recorded" else float(LLM_CASSETTE_LATENCY)
+    # Keep the context manager referenced: collecting it would uninstall the cassette.
+    _installed = use_cassette(LLM_CASSETTE, LLM_CASSETTE_MODE, latency)
+    cassette = _installed.__enter__()
+    # Exiting uninstalls the cassette and saves what was recorded.
+    atexit.register(_installed.__exit__, None, None, None)
+    return cassette
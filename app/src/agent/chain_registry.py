@@ -0,0 +1,132 @@
+"""Process-wide registry of LLM clients and compiled agent chains.
+
+``init_node`` used to build the student, teacher and observer chains on
+every run and keep the runnables in graph state, which made the state
+unpicklable. Chains are now built once per process, keyed by role, model
+and a hash of the system prompt, and the state only carries the string
+reference returned by ``register_chain``/``register_cached_chain``.
+
+References are self-describing, so ``get_chain`` rebuilds a chain that is
+not registered yet, e.g. when a checkpointed run resumes in a new process::
+
+    "teacher:gemini-2.0-flash-exp:1f2e3d4c5b6a7980"   # role chain
+    "cached:gemini-2.0-flash:cachedContents/abc123"   # context-cached chain
+
+``set_llm_factory`` swaps the LLM constructor, which is how tests run the
+graph against fake models.
+"""
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from agent.context_cache import CONTEXT_CACHE_MODEL
+from agent.create_chain import create_agent_chain, create_cached_content_chain
+from agent.prompts import (
+    OBSERVER_AGENT_PROMPT,
+    STUDENT_AGENT_PROMPT,
+    TEACHER_AGENT_PROMPT,
+)
+
+DEFAULT_MODEL = "gemini-2.0-flash-exp"
+
+ROLE_PROMPTS = {
+    "student": STUDENT_AGENT_PROMPT,
+    "teacher": TEACHER_AGENT_PROMPT,
+    "observer": OBSERVER_AGENT_PROMPT,
+}
+
+
+def default_llm_factory(model: str, cached_content: Optional[str] = None) -> Any:
+    """Build the Gemini chat model, optionally bound to cached content."""
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=0.1,
+        cached_content=cached_content,
+        model_kwargs={
+            "max_output_tokens": 1500
+        }
+    )
+
+
+_llm_factory: Callable[..., Any] = default_llm_factory
+_llms: Dict[str, Any] = {}
+_chains: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def set_llm_factory(factory: Optional[Callable[..., Any]] = None) -> None:
+    """Use ``factory(model, cached_content=None)`` to build LLMs and drop everything built so far.
+
+    Passing ``None`` restores ``default_llm_factory``.
+    """
+    global _llm_factory
+    with _lock:
+        _llm_factory = factory or default_llm_factory
+        _llms.clear()
+        _chains.clear()
+
+
+def get_llm(model: str = DEFAULT_MODEL) -> Any:
+    """Return the shared LLM client for ``model``."""
+    with _lock:
+        llm = _llms.get(model)
+        if llm is None:
+            llm = _llms[model] = _llm_factory(model)
+        return llm
+
+
+def prompt_hash(system_prompt: str) -> str:
+    """Return the short digest of a system prompt used in chain references."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+
+
+def register_chain(role: str, model: str = DEFAULT_MODEL) -> str:
+    """Build the chain for ``role`` once and return its reference."""
+    ref = f"{role}:{model}:{prompt_hash(ROLE_PROMPTS[role])}"
+    get_chain(ref)
+    return ref
+
+
+def register_cached_chain(cached_content_name: str, model: str = CONTEXT_CACHE_MODEL) -> str:
+    """Build a chain over Gemini cached content once and return its reference.
+
+    ``model`` must be the model the content was cached for; Gemini rejects
+    calls to any other.
+    """
+    ref = f"cached:{model}:{cached_content_name}"
+    get_chain(ref)
+    return ref
+
+
+def _build(ref: str) -> Any:
+    kind, model, detail = ref.split(":", 2)
+    if kind == "cached":
+        return create_cached_content_chain(_llm_factory(model, cached_content=detail))
+    if kind not in ROLE_PROMPTS or prompt_hash(ROLE_PROMPTS[kind]) != detail:
+        raise KeyError(f"Unknown chain reference {ref!r}; the {kind} prompt may have changed since it was stored")
+    return create_agent_chain(get_llm(model), ROLE_PROMPTS[kind])
+
+
+def get_chain(ref: str) -> Any:
+    """Return the chain for a reference, building it on first use."""
+    with _lock:
+        chain = _chains.get(ref)
+    if chain is not None:
+        return chain
+    chain = _build(ref)
+    with _lock:
+        return _chains.setdefault(ref, chain)
+
+
+def drop_chain(ref: str) -> None:
+    """Forget a chain, e.g. one over cached content that has been deleted."""
+    with _lock:
+        _chains.pop(ref, None)
+
+
+def stats() -> Dict[str, int]:
+    """Return the number of registered LLM clients and chains."""
+    return {"llms": len(_llms), "chains": len(_chains)}
@@ -1,10 +1,414 @@
-from typing import Any, Dict, Optional, cast
-from langgraph.checkpoint.base import Checkpoint, CheckpointTuple
+"""Checkpoint savers for the agent graph.
+
+``SqliteCheckpointSaver`` is the durable saver the graph is compiled with, so
+a run can resume after a crash or restart from its ``thread_id``. The
+database runs in WAL mode. Each ``put``/``put_writes`` is one
+``executemany`` transaction, and ``batch_size`` groups several of them per
+commit.
+
+Like ``InMemorySaver`` it stores channel values as blobs keyed by channel
+version, so a checkpoint only writes the channels that changed in its
+superstep. Values are serialized with msgpack (LangGraph's
+``JsonPlusSerializer``) and compressed with zstd by ``ZstdSerializer``.
+
+``BoundedMemorySaver`` is the in-memory alternative for the dev server and
+tests (``CHECKPOINTER=memory``). It caps resident bytes and checkpoints per
+thread, evicting least-recently-used threads and optionally spilling them
+to disk.
+"""
+
+import asyncio
+import hashlib
+import os
+import pickle
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import zstandard
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# "sqlite" for the durable saver, "memory" for BoundedMemorySaver (dev server, tests).
+CHECKPOINTER = os.getenv("CHECKPOINTER", "sqlite")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", ".checkpoints.sqlite")
+CHECKPOINT_BATCH_SIZE = int(os.getenv("CHECKPOINT_BATCH_SIZE", "1"))
+# Seconds to wait for another process holding the database's write lock.
+CHECKPOINT_BUSY_TIMEOUT = float(os.getenv("CHECKPOINT_BUSY_TIMEOUT", "30"))
+# Payloads smaller than this are stored uncompressed.
+ZSTD_MIN_BYTES = 256
+ZSTD_LEVEL = 3
+
+MEMORY_SAVER_MAX_BYTES = int(os.getenv("MEMORY_SAVER_MAX_BYTES", str(256 * 1024 * 1024)))
+MEMORY_SAVER_MAX_CHECKPOINTS = int(os.getenv("MEMORY_SAVER_MAX_CHECKPOINTS", "64"))
+MEMORY_SAVER_SPILL_DIR = os.getenv("MEMORY_SAVER_SPILL_DIR") or None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    blob BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class ZstdSerializer(SerializerProtocol):
+    """Wrap a typed serializer and zstd-compress payloads above ``min_bytes``."""
+
+    def __init__(
+        self,
+        serde: Optional[SerializerProtocol] = None,
+        min_bytes: int = ZSTD_MIN_BYTES,
+        level: int = ZSTD_LEVEL,
+    ) -> None:
+        """Wrap ``serde``, ``JsonPlusSerializer`` by default."""
+        self.serde = serde or JsonPlusSerializer()
+        self.min_bytes = min_bytes
+        self.level = level
+        self._local = threading.local()
+
+    def _codecs(self) -> Tuple[zstandard.ZstdCompressor, zstandard.ZstdDecompressor]:
+        # zstd contexts are not thread safe; keep one pair per thread.
+        if not hasattr(self._local, "codecs"):
+            self._local.codecs = (zstandard.ZstdCompressor(level=self.level), zstandard.ZstdDecompressor())
+        codecs: Tuple[zstandard.ZstdCompressor, zstandard.ZstdDecompressor] = self._local.codecs
+        return codecs
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        """Serialize ``obj``, compressing the payload if it is large enough."""
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) < self.min_bytes:
+            return type_, data
+        return f"{type_}+zstd", self._codecs()[0].compress(data)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        """Deserialize a payload written by ``dumps_typed``."""
+        type_, payload = data
+        if type_.endswith("+zstd"):
+            type_, payload = type_[: -len("+zstd")], self._codecs()[1].decompress(payload)
+        return self.serde.loads_typed((type_, payload))
+
+    def dumps(self, obj: Any) -> bytes:
+        """Serialize ``obj`` to bytes, with its type name in front of the payload."""
+        type_, payload = self.dumps_typed(obj)
+        return type_.encode() + b"\x00" + payload
+
+    def loads(self, data: bytes) -> Any:
+        """Deserialize bytes written by ``dumps``."""
+        type_, _, payload = data.partition(b"\x00")
+        return self.loads_typed((type_.decode(), payload))
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """Durable checkpoint saver on SQLite.
+
+    Args:
+        path: Database file. ``":memory:"`` keeps it in process.
+        batch_size: Number of ``put``/``put_writes`` calls per commit. Values
+            above 1 trade durability of the last few steps for fewer fsyncs.
+        serde: Serializer; defaults to msgpack with zstd compression.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_DB,
+        batch_size: int = CHECKPOINT_BATCH_SIZE,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        """Create the saver; the database is opened on first use."""
+        super().__init__(serde=serde or ZstdSerializer())
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending = 0
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The database connection, created with its schema on first use."""
+        # Opened lazily so importing the graph does not touch the disk.
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=CHECKPOINT_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, statements: List[Tuple[str, List[Tuple[Any, ...]]]]) -> None:
+        with self._lock:
+            conn = self.conn
+            if not conn.in_transaction:
+                # Take the write lock up front: a deferred transaction that
+                # has to upgrade fails at once when another process writes.
+                conn.execute("BEGIN IMMEDIATE")
+            for sql, rows in statements:
+                conn.executemany(sql, rows)
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Commit any batched writes."""
+        with self._lock:
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.execute("COMMIT")
+            self._pending = 0
+
+    def close(self) -> None:
+        """Commit batched writes and close the database."""
+        with self._lock:
+            self.flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        if not versions:
+            return {}
+        clauses = " OR ".join("(channel = ? AND version = ?)" for _ in versions)
+        params = [value for item in versions.items() for value in (item[0], str(item[1]))]
+        rows = self.conn.execute(
+            f"SELECT channel, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND ({clauses})",
+            [thread_id, checkpoint_ns, *params],
+        ).fetchall()
+        return {channel: self.serde.loads_typed((type_, blob)) for channel, type_, blob in rows if type_ != "empty"}
+
+    def _tuple(self, row: Tuple[Any, ...]) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        checkpoint_: Checkpoint = self.serde.loads_typed((type_, checkpoint))
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, blob FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint_,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint_["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, blob))) for task_id, channel, t, blob in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return the checkpoint ``config`` names, or the thread's latest one."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params: List[Any] = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self.conn.execute(query, params).fetchone()
+            return self._tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List the checkpoints matching the arguments, newest first."""
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT * FROM checkpoints {where} ORDER BY checkpoint_id DESC", params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                yield self._tuple(row)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint and the channel values that changed with it."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version), *(
+                self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            ))
+            for channel, version in new_versions.items()
+        ]
+        type_, payload = self.serde.dumps_typed(c)
+        metadata_type, metadata_payload = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        self._write([
+            ("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs),
+            (
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(
+                    thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    type_, payload, metadata_type, metadata_payload,
+                )],
+            ),
+        ])
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store the intermediate writes of a task."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) overwrite; regular writes are idempotent.
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = [
+            (
+                thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+                *self.serde.dumps_typed(value), task_path,
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        self._write([(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)])
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint, blob and write of a thread."""
+        self._write([
+            (f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,)])
+            for table in ("checkpoints", "blobs", "writes")
+        ])
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Async version of ``get_tuple``."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Async version of ``list``."""
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Async version of ``put``."""
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Async version of ``put_writes``."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Async version of ``delete_thread``."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Return a version above ``current`` that sorts as a string."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
 
 class CustomMemorySaver(MemorySaver):
     """Custom memory saver that handles non-picklable objects."""
-    
+
     async def aput(
         self,
         config: Dict[str, Any],
@@ -13,7 +417,7 @@ class CustomMemorySaver(MemorySaver):
     ) -> Dict:
         # Create a shallow copy of the checkpoint
         checkpoint_dict = checkpoint.copy()
-        
+
         # Handle the state specifically
         if "state" in checkpoint_dict and "messages" in checkpoint_dict["state"]:
             # Create a new messages list without non-picklable objects
@@ -24,12 +428,222 @@ class CustomMemorySaver(MemorySaver):
                 # Remove any attributes that might contain non-picklable objects
                 msg_dict.pop("additional_kwargs", None)
                 new_messages.append(msg_dict)
-            
+
             # Update the checkpoint with the cleaned messages
             checkpoint_dict["state"]["messages"] = new_messages
-        
+
         # Call the parent's aput with the cleaned checkpoint
         return await super().aput(config, checkpoint_dict, metadata)
 
-def get_checkpoint_saver():
-    return CustomMemorySaver()
+class BoundedMemorySaver(MemorySaver):
+    """In-memory saver with caps on total bytes and on checkpoints per thread.
+
+    Sizes are the serialized payloads the saver holds. When a thread has
+    more than ``max_checkpoints_per_thread`` checkpoints, its oldest
+    checkpoints are dropped, along with their writes and any channel blobs
+    no remaining checkpoint uses. When the total exceeds ``max_bytes``,
+    least-recently-used threads are evicted. With ``spill_dir`` set, an
+    evicted thread is pickled to disk and reloaded the next time it is
+    read, instead of being lost.
+
+    Args:
+        max_bytes: Cap on the serialized bytes held in memory.
+        max_checkpoints_per_thread: Checkpoints kept per thread and namespace.
+        spill_dir: Directory evicted threads are spilled to, if any.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MEMORY_SAVER_MAX_BYTES,
+        max_checkpoints_per_thread: int = MEMORY_SAVER_MAX_CHECKPOINTS,
+        spill_dir: Optional[str] = MEMORY_SAVER_SPILL_DIR,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        """Create the saver; threads are only spilled when ``spill_dir`` is set."""
+        super().__init__(serde=serde)
+        self.max_bytes = max_bytes
+        # The latest checkpoint and its parent are always kept.
+        self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.evictions = 0
+        self.spills = 0
+        self.reloads = 0
+        self.trimmed_checkpoints = 0
+        self._bytes: OrderedDict[str, int] = OrderedDict()
+        self._versions: Dict[Tuple[str, str, str], ChannelVersions] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def resident_bytes(self) -> int:
+        """Approximate size of the checkpoints held in memory."""
+        return sum(self._bytes.values())
+
+    def _spill_path(self, thread_id: str) -> Path:
+        # Only called once the caller has checked that spilling is enabled.
+        assert self.spill_dir is not None
+        return self.spill_dir / f"{hashlib.sha256(thread_id.encode()).hexdigest()}.pkl"
+
+    def _touch(self, thread_id: str, delta: int = 0) -> None:
+        self._bytes[thread_id] = self._bytes.get(thread_id, 0) + delta
+        self._bytes.move_to_end(thread_id)
+
+    def _ensure_loaded(self, thread_id: str) -> None:
+        if thread_id in self._bytes or self.spill_dir is None:
+            return
+        path = self._spill_path(thread_id)
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            spilled = pickle.load(f)
+        path.unlink()
+        self.storage[thread_id].update(spilled["storage"])
+        self.writes.update(spilled["writes"])
+        self.blobs.update(spilled["blobs"])
+        self._versions.update(spilled["versions"])
+        self._bytes[thread_id] = spilled["bytes"]
+        self.reloads += 1
+
+    def _thread_items(self, thread_id: str) -> Dict[str, Any]:
+        return {
+            "storage": dict(self.storage.get(thread_id, {})),
+            "writes": {key: value for key, value in self.writes.items() if key[0] == thread_id},
+            "blobs": {key: value for key, value in self.blobs.items() if key[0] == thread_id},
+            "versions": {key: value for key, value in self._versions.items() if key[0] == thread_id},
+            "bytes": self._bytes.get(thread_id, 0),
+        }
+
+    def _forget(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        for key in [key for key in self._versions if key[0] == thread_id]:
+            del self._versions[key]
+        self._bytes.pop(thread_id, None)
+
+    def _evict(self, keep: str) -> None:
+        while self.resident_bytes > self.max_bytes:
+            victim = next((thread_id for thread_id in self._bytes if thread_id != keep), None)
+            if victim is None:
+                return
+            if self.spill_dir is not None:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                with open(self._spill_path(victim), "wb") as f:
+                    pickle.dump(self._thread_items(victim), f, protocol=pickle.HIGHEST_PROTOCOL)
+                self.spills += 1
+            self._forget(victim)
+            self.evictions += 1
+
+    def _trim(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints_per_thread:
+            return
+        freed = 0
+        for checkpoint_id in sorted(checkpoints)[: len(checkpoints) - self.max_checkpoints_per_thread]:
+            checkpoint, metadata, _ = checkpoints.pop(checkpoint_id)
+            freed += len(checkpoint[1]) + len(metadata[1])
+            writes = self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), {})
+            freed += sum(len(write[2][1]) for write in writes.values())
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self.trimmed_checkpoints += 1
+        used = {
+            (channel, version)
+            for key, versions in self._versions.items()
+            if key[:2] == (thread_id, checkpoint_ns)
+            for channel, version in versions.items()
+        }
+        for key in [key for key in self.blobs if key[:2] == (thread_id, checkpoint_ns) and key[2:] not in used]:
+            freed += len(self.blobs.pop(key)[1])
+        self._touch(thread_id, -freed)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return a checkpoint, reloading its thread if it was spilled."""
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            self._ensure_loaded(thread_id)
+            if thread_id in self._bytes:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, reloading the thread if it was spilled."""
+        with self._lock:
+            if config:
+                self._ensure_loaded(config["configurable"]["thread_id"])
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+        yield from items
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint, then trim the thread and evict past ``max_bytes``."""
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+            self._ensure_loaded(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+            stored, stored_metadata, _ = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            added = len(stored[1]) + len(stored_metadata[1]) + sum(
+                len(self.blobs[(thread_id, checkpoint_ns, channel, version)][1])
+                for channel, version in new_versions.items()
+            )
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._touch(thread_id, added)
+            self._trim(thread_id, checkpoint_ns)
+            self._evict(keep=thread_id)
+            return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store the writes of a task, then evict past ``max_bytes``."""
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            self._ensure_loaded(thread_id)
+            key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+
+            def size() -> int:
+                return sum(len(write[2][1]) for write in self.writes.get(key, {}).values())
+
+            before = size()
+            super().put_writes(config, writes, task_id, task_path)
+            self._touch(thread_id, size() - before)
+            self._evict(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete a thread, in memory and spilled."""
+        with self._lock:
+            self._forget(thread_id)
+            if self.spill_dir is not None:
+                self._spill_path(thread_id).unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Return resident size and eviction counters."""
+        with self._lock:
+            return {
+                "resident_bytes": self.resident_bytes,
+                "threads": len(self._bytes),
+                "evictions": self.evictions,
+                "spills": self.spills,
+                "reloads": self.reloads,
+                "trimmed_checkpoints": self.trimmed_checkpoints,
+            }
+
+
+def get_checkpoint_saver() -> BaseCheckpointSaver[Any]:
+    """Return the saver the graph is compiled with, chosen by ``CHECKPOINTER``."""
+    if CHECKPOINTER == "memory":
+        return BoundedMemorySaver()
+    return SqliteCheckpointSaver()
@@ -0,0 +1,71 @@
+"""Configurable parameters for the agent graph.
+
+Set these under ``configurable`` when creating assistants OR when invoking
+the graph; anything left unset falls back to ``DEFAULTS``.
+"""
+
+from typing import Any, Dict, List, Optional, TypedDict
+
+from langchain_core.runnables import RunnableConfig
+
+
+class Configuration(TypedDict, total=False):
+    """Configurable parameters for the agent.
+
+    Set these when creating assistants OR when invoking the graph.
+    """
+    pdf_url: str
+    # Conversation length in turns, and the observer runs every k_interval turns.
+    n_loops: int
+    k_interval: int
+    # Give the observer the whole conversation instead of its rolling summary
+    # on its last intervention of the run.
+    observer_full_history_final: bool
+    # "retrieval" sends the teacher only the paper chunks relevant to the
+    # current questions; "full" sends the whole paper on every turn.
+    teacher_context: str
+    retrieval_top_k: int
+    retrieval_chunk_chars: int
+    # Answer the student's questions in parallel branches, split into at most
+    # teacher_concurrency batches, instead of in one teacher call.
+    teacher_fanout: bool
+    teacher_concurrency: int
+    # "run" uploads the paper to Gemini context caching once per run, "paper"
+    # once per paper across runs; "off" sends the paper text in the prompts.
+    context_cache: str
+    # Model per role. Asking questions and guiding the conversation are
+    # lighter work than answering, so they can run on a cheaper model.
+    student_model: str
+    teacher_model: str
+    observer_model: str
+    # "latency" sends every call to the cheapest of routing_models whose p95
+    # latency for the role is within latency_target_ms, see agent.model_stats;
+    # "off" uses the role's model.
+    model_routing: str
+    routing_models: List[str]
+    latency_target_ms: float
+
+
+DEFAULTS: Configuration = {
+    "n_loops": 8,
+    "k_interval": 3,
+    "observer_full_history_final": False,
+    "teacher_context": "retrieval",
+    "retrieval_top_k": 6,
+    "retrieval_chunk_chars": 1500,
+    "teacher_fanout": False,
+    "teacher_concurrency": 6,
+    "context_cache": "off",
+    "student_model": "gemini-2.0-flash-exp",
+    "teacher_model": "gemini-2.0-flash-exp",
+    "observer_model": "gemini-2.0-flash-exp",
+    "model_routing": "off",
+    "routing_models": ["gemini-2.0-flash-lite", "gemini-2.0-flash"],
+    "latency_target_ms": 5000,
+}
+
+
+def get_configuration(config: Optional[RunnableConfig]) -> Dict[str, Any]:
+    """Return ``DEFAULTS`` overridden by the ``configurable`` values of ``config``."""
+    configurable = (config or {}).get("configurable") or {}
+    return {**DEFAULTS, **{key: value for key, value in configurable.items() if key in Configuration.__annotations__}}
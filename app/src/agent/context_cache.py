@@ -0,0 +1,259 @@
+"""Gemini context caching for the paper.
+
+Without caching every student and teacher call resends the raw paper text.
+``ContextCacheRegistry`` uploads the paper once as a Gemini
+``CachedContent`` per (paper, model, system prompt) and hands the cache name
+to the chains, which then only send the turn-specific prompt.
+
+Two scopes are supported:
+
+* ``"run"``: the cached content is deleted as soon as the last run that
+  uses it releases it, which the graph does in its final ``cleanup`` node.
+* ``"paper"``: the cached content outlives the run and is reused by later
+  runs on the same paper. Its TTL is refreshed when a run picks it up close
+  to expiry, and expired or least-recently-used entries are evicted.
+
+Every entry carries a server-side TTL too, so a run that dies before its
+cleanup node never leaks cached content for longer than the TTL.
+
+The backend is pluggable; ``GenaiCachingBackend`` talks to the real API and
+tests use an in-memory fake with the same three methods.
+"""
+
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Protocol, Set, Tuple
+
+CONTEXT_CACHE_MODEL = os.getenv("CONTEXT_CACHE_MODEL", "gemini-2.0-flash")
+CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+# Refresh the TTL when a run picks up an entry with less time left than this.
+CONTEXT_CACHE_REFRESH_MARGIN = float(os.getenv("CONTEXT_CACHE_REFRESH_MARGIN", "600"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "16"))
+
+logger = logging.getLogger(__name__)
+
+
+class CachingBackend(Protocol):
+    """The subset of the Gemini caching API the registry needs."""
+
+    def create(self, model: str, system_instruction: str, text: str, ttl: float) -> str:
+        """Create cached content and return its name."""
+
+    def update_ttl(self, name: str, ttl: float) -> None:
+        """Extend the lifetime of cached content."""
+
+    def delete(self, name: str) -> None:
+        """Delete cached content."""
+
+
+class GenaiCachingBackend:
+    """``CachingBackend`` over ``google.generativeai.caching.CachedContent``."""
+
+    def __init__(self) -> None:
+        """Configure the client with ``GOOGLE_API_KEY``."""
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))  # type: ignore[attr-defined]
+        self._cached_content = genai.caching.CachedContent
+
+    def create(self, model: str, system_instruction: str, text: str, ttl: float) -> str:
+        """Upload the paper as cached content and return its name."""
+        cached_content = self._cached_content.create(
+            model=f"models/{model}",
+            display_name="arxiv_paper_cache",
+            system_instruction=system_instruction,
+            contents=[{
+                "role": "user",
+                "parts": [{"text": f"Analyze this arXiv paper:\n\n{text}"}]
+            }],
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        return cached_content.name
+
+    def update_ttl(self, name: str, ttl: float) -> None:
+        """Extend the lifetime of cached content."""
+        self._cached_content.get(name).update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, name: str) -> None:
+        """Delete cached content."""
+        self._cached_content.get(name).delete()
+
+
+class _Entry(NamedTuple):
+    name: str
+    expires_at: float
+    last_used: float
+    scope: str
+    runs: Set[str]
+
+
+class ContextCacheRegistry:
+    """Process-wide registry of cached paper contexts with TTL refresh and eviction."""
+
+    def __init__(
+        self,
+        backend: Optional[CachingBackend] = None,
+        ttl: float = CONTEXT_CACHE_TTL,
+        refresh_margin: float = CONTEXT_CACHE_REFRESH_MARGIN,
+        max_entries: int = CONTEXT_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Create a registry; the Gemini backend is built on first use unless ``backend`` is given."""
+        self._backend = backend
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self.clock = clock
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.deleted = 0
+        self._entries: Dict[Tuple[str, str, str], _Entry] = {}
+        # Uploads in flight per key, and keys whose TTL is being refreshed.
+        self._pending: Dict[Tuple[str, str, str], Future[str]] = {}
+        self._refreshing: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> CachingBackend:
+        """The caching backend, created on first use."""
+        if self._backend is None:
+            self._backend = GenaiCachingBackend()
+        return self._backend
+
+    def acquire(
+        self,
+        paper_key: str,
+        text: str,
+        system_prompt: str,
+        run_id: str,
+        scope: str = "run",
+        model: str = CONTEXT_CACHE_MODEL,
+    ) -> str:
+        """Return the cached content name for a paper, creating it if needed.
+
+        The entry is referenced by ``run_id`` until ``release(run_id)``.
+        Uploads and TTL refreshes run outside the registry lock, so runs on
+        other papers never wait behind them; concurrent runs on the same
+        paper wait for the one upload already in flight.
+        """
+        key = (paper_key, model, hashlib.sha256(system_prompt.encode()).hexdigest())
+        while True:
+            with self._lock:
+                now = self.clock()
+                stale = self._evict(now)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    refresh = entry.expires_at - now < self.refresh_margin and key not in self._refreshing
+                    if refresh:
+                        self._refreshing.add(key)
+                    self.reused += 1
+                    self._entries[key] = entry._replace(last_used=now, runs=entry.runs | {run_id})
+                    break
+                pending = self._pending.get(key)
+                if pending is None:
+                    upload: Future[str] = Future()
+                    self._pending[key] = upload
+                    break
+            self._delete_names(stale)
+            # Another run is uploading this paper; use its entry once published.
+            pending.result()
+
+        self._delete_names(stale)
+        if entry is not None:
+            if refresh:
+                self._refresh(key, entry.name)
+            return entry.name
+
+        try:
+            name = self.backend.create(model, system_prompt, text, self.ttl)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            upload.set_exception(e)
+            raise
+        with self._lock:
+            self.created += 1
+            self._entries[key] = _Entry(name, now + self.ttl, self.clock(), scope, {run_id})
+            del self._pending[key]
+        upload.set_result(name)
+        return name
+
+    def _refresh(self, key: Tuple[str, str, str], name: str) -> None:
+        try:
+            self.backend.update_ttl(name, self.ttl)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.name == name:
+                self._entries[key] = entry._replace(expires_at=self.clock() + self.ttl)
+                self.refreshed += 1
+
+    def release(self, run_id: str) -> None:
+        """Drop ``run_id``'s references; delete run-scoped entries nobody uses."""
+        with self._lock:
+            unused = []
+            for key, entry in list(self._entries.items()):
+                if run_id not in entry.runs:
+                    continue
+                runs = entry.runs - {run_id}
+                if not runs and entry.scope == "run":
+                    unused.append(self._forget(key))
+                else:
+                    self._entries[key] = entry._replace(runs=runs)
+        self._delete_names(unused)
+
+    def _forget(self, key: Tuple[str, str, str]) -> str:
+        self.deleted += 1
+        return self._entries.pop(key).name
+
+    def _delete_names(self, names: List[str]) -> None:
+        """Delete cached content on the server; called without the lock held."""
+        for name in names:
+            try:
+                self.backend.delete(name)
+            except Exception as e:
+                # The server-side TTL removes it eventually anyway.
+                logger.warning("Context cache delete failed for %s: %s", name, e)
+
+    def _evict(self, now: float) -> List[str]:
+        """Forget expired entries and pick idle ones over the limit; return the names to delete."""
+        for key, entry in list(self._entries.items()):
+            if entry.expires_at <= now:
+                # Already gone on the server; just forget it.
+                del self._entries[key]
+        idle = sorted(
+            (entry.last_used, key) for key, entry in self._entries.items() if not entry.runs
+        )
+        names = []
+        while len(self._entries) >= self.max_entries and idle:
+            names.append(self._forget(idle.pop(0)[1]))
+        return names
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and the number of live entries."""
+        return {
+            "entries": len(self._entries),
+            "created": self.created,
+            "reused": self.reused,
+            "refreshed": self.refreshed,
+            "deleted": self.deleted,
+        }
+
+
+_registry: Optional[ContextCacheRegistry] = None
+
+
+def get_context_cache_registry() -> ContextCacheRegistry:
+    """Return the process-wide context cache registry."""
+    global _registry
+    if _registry is None:
+        _registry = ContextCacheRegistry()
+    return _registry
@@ -1,7 +1,9 @@
 import google.generativeai as genai
 import os
+from typing import Any
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from langchain_core.runnables import Runnable
 from langchain.agents import create_tool_calling_agent
 from langchain.agents import AgentExecutor
 
@@ -64,6 +66,24 @@ def create_cached_chain(pdf_text: str, system_prompt: str):
         return None, None
 
 
+def create_cached_content_chain(llm: Runnable[Any, Any]) -> Runnable[Any, Any]:
+    """Create a chain that answers against already cached content.
+
+    The system instruction and paper live in the cached content, so the
+    prompt only carries the turn input.
+
+    Args:
+        llm: Chat model bound to the cached content
+
+    Returns:
+        The chain
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ("human", "{input}")
+    ])
+    return prompt | llm
+
+
 def create_agent_chain_with_tools(llm, system_prompt: str, tools_list=None):
     # Create the prompt template
     prompt = ChatPromptTemplate.from_messages([
@@ -0,0 +1,363 @@
+"""Pooled HTTP fetching for paper downloads.
+
+Two entry points share the same limits:
+
+* ``fetch_bytes`` uses a process-wide ``requests.Session`` with keep-alive,
+  a timeout and retries, for the synchronous tools.
+* ``AsyncFetcher`` wraps a shared ``httpx.AsyncClient`` with a per-host
+  concurrency limit, timeouts, chunked streaming and retries with
+  exponential backoff, so async nodes can ``await`` downloads without
+  blocking the event loop.
+
+Both also offer ``fetch_conditional``, which keeps ETag/Last-Modified
+validators next to a downloaded file, revalidates it with a conditional GET
+and resumes interrupted downloads with HTTP Range requests.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "32"))
+FETCH_PER_HOST_LIMIT = int(os.getenv("FETCH_PER_HOST_LIMIT", "4"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+FETCH_BACKOFF = float(os.getenv("FETCH_BACKOFF", "0.5"))
+FETCH_CHUNK_SIZE = 64 * 1024
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide ``requests.Session`` used by the sync tools."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=FETCH_RETRIES,
+                backoff_factor=FETCH_BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=("GET", "HEAD"),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=FETCH_MAX_CONNECTIONS,
+                pool_maxsize=FETCH_MAX_CONNECTIONS,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def fetch_bytes(url: str, timeout: float = FETCH_TIMEOUT) -> bytes:
+    """Download ``url`` through the shared session and return the body."""
+    response = get_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def validators_path(path: Path) -> Path:
+    """Return the file holding the HTTP validators stored next to ``path``."""
+    return path.with_name(path.name + ".meta.json")
+
+
+def read_validators(path: Path) -> Dict[str, Any]:
+    """Return the validators stored next to ``path``, or an empty dict."""
+    try:
+        with open(validators_path(path), encoding="utf-8") as f:
+            meta: Dict[str, Any] = json.load(f)
+            return meta
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_validators(path: Path, meta: Dict[str, Any]) -> None:
+    meta_path = validators_path(path)
+    tmp_path = meta_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _response_validators(headers: Mapping[str, str]) -> Dict[str, Optional[str]]:
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
+
+def _conditional_headers(target: Path, part_path: Path, meta: Dict[str, Any]) -> Tuple[Dict[str, str], int]:
+    """Build revalidation and resume headers; return them with the resume offset."""
+    headers = {}
+    if target.exists():
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    partial = meta.get("partial") or {}
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    if offset and (partial.get("etag") or partial.get("last_modified")):
+        headers["Range"] = f"bytes={offset}-"
+        # If-Range makes the server send the full body if the file changed meanwhile.
+        headers["If-Range"] = partial.get("etag") or partial["last_modified"]
+    else:
+        offset = 0
+    return headers, offset
+
+
+def _body_mode(status_code: int, headers: Mapping[str, str], offset: int, part_path: Path) -> str:
+    """Return the file mode for the body: append for a matching 206, else rewrite."""
+    if status_code != 206:
+        return "wb"
+    match = re.match(r"bytes (\d+)-", headers.get("Content-Range", ""))
+    if offset and match and int(match.group(1)) == offset:
+        return "ab"
+    # A range we did not ask for cannot be stitched onto the part file.
+    part_path.unlink(missing_ok=True)
+    raise ValueError(f"Unexpected Content-Range {headers.get('Content-Range')!r} for offset {offset}")
+
+
+def _not_modified(target: Path, part_path: Path, meta: Dict[str, Any]) -> bool:
+    part_path.unlink(missing_ok=True)
+    meta.pop("partial", None)
+    meta["checked_at"] = time.time()
+    _write_validators(target, meta)
+    return False
+
+
+def _start_body(target: Path, meta: Dict[str, Any], headers: Mapping[str, str]) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Persist the new validators before the body so an interrupted download can resume.
+    meta["partial"] = _response_validators(headers)
+    _write_validators(target, meta)
+
+
+def _complete(target: Path, part_path: Path, meta: Dict[str, Any]) -> bool:
+    os.replace(part_path, target)
+    partial = meta.pop("partial", None) or {}
+    meta.update(partial)
+    meta["checked_at"] = time.time()
+    _write_validators(target, meta)
+    return True
+
+
+def fetch_conditional(url: str, path: str, timeout: float = FETCH_TIMEOUT) -> bool:
+    """Download ``url`` to ``path`` unless the stored copy is still current.
+
+    Sends ``If-None-Match``/``If-Modified-Since`` when ``path`` already exists
+    and resumes an interrupted download from ``path + ".part"`` with a
+    ``Range`` request. Validators are kept in ``path + ".meta.json"``.
+
+    Returns:
+        ``True`` if ``path`` was (re)written, ``False`` on a 304.
+    """
+    target = Path(path)
+    part_path = target.with_name(target.name + ".part")
+    for attempt in range(FETCH_RETRIES + 1):
+        meta = read_validators(target)
+        headers, offset = _conditional_headers(target, part_path, meta)
+        try:
+            with get_session().get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    return _not_modified(target, part_path, meta)
+                response.raise_for_status()
+                _start_body(target, meta, response.headers)
+                with open(part_path, _body_mode(response.status_code, response.headers, offset, part_path)) as f:
+                    for chunk in response.iter_content(chunk_size=FETCH_CHUNK_SIZE):
+                        f.write(chunk)
+            return _complete(target, part_path, meta)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            # Whatever reached the .part file is kept and resumed on the next attempt.
+            if attempt >= FETCH_RETRIES:
+                raise
+            time.sleep(_backoff_delay(attempt, FETCH_BACKOFF))
+    raise RuntimeError(f"Retries exhausted for {url}")
+
+
+def _backoff_delay(attempt: int, base: float, response: Optional[httpx.Response] = None) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+    # Full jitter keeps concurrent retries against one host from synchronizing.
+    return random.uniform(0, base * (2 ** attempt))
+
+
+class AsyncFetcher:
+    """Async downloader with a shared connection pool and per-host limits.
+
+    Clients and semaphores are bound to an event loop, so one set is kept per
+    running loop; the common case of a single server loop shares one pool.
+    """
+
+    def __init__(
+        self,
+        timeout: float = FETCH_TIMEOUT,
+        max_connections: int = FETCH_MAX_CONNECTIONS,
+        per_host_limit: int = FETCH_PER_HOST_LIMIT,
+        retries: int = FETCH_RETRIES,
+        backoff: float = FETCH_BACKOFF,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        """Configure the limits; ``transport`` replaces the network in tests."""
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self.retried = 0
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._host_limits: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            self._forget_closed_loops()
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                transport=self.transport,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._clients[loop] = client
+        return client
+
+    def _forget_closed_loops(self) -> None:
+        for stale_loop in [loop for loop in self._clients if loop.is_closed()]:
+            del self._clients[stale_loop]
+        for key in [key for key in self._host_limits if key[0].is_closed()]:
+            del self._host_limits[key]
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        key = (asyncio.get_running_loop(), urlsplit(url).netloc)
+        semaphore = self._host_limits.get(key)
+        if semaphore is None:
+            semaphore = self._host_limits[key] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    async def _stream(
+        self,
+        url: str,
+        sink: Callable[[bytes], Any],
+        reset: Callable[[], Any],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        """GET ``url`` with retries, passing each body chunk to ``sink``.
+
+        ``reset`` is called before every attempt so a retry never appends to
+        the partial body of a failed one.
+        """
+        client = self._client()
+        async with self._host_limit(url):
+            for attempt in range(self.retries + 1):
+                reset()
+                try:
+                    async with client.stream("GET", url, headers=headers) as response:
+                        if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                            self.retried += 1
+                            await asyncio.sleep(_backoff_delay(attempt, self.backoff, response))
+                            continue
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(FETCH_CHUNK_SIZE):
+                            sink(chunk)
+                        return response
+                except httpx.TransportError:  # includes timeouts
+                    if attempt >= self.retries:
+                        raise
+                    self.retried += 1
+                    await asyncio.sleep(_backoff_delay(attempt, self.backoff))
+        raise RuntimeError(f"Retries exhausted for {url}")
+
+    async def fetch_bytes(self, url: str) -> bytes:
+        """Download ``url`` and return the body."""
+        chunks: List[bytes] = []
+        await self._stream(url, chunks.append, chunks.clear)
+        return b"".join(chunks)
+
+    async def fetch_to_file(self, url: str, path: str) -> int:
+        """Stream ``url`` to ``path`` chunk by chunk and return the byte count.
+
+        The body is written to ``path + ".part"`` and renamed on success, so a
+        failed download never leaves a truncated file at ``path``.
+        """
+        target = Path(path)
+        part_path = target.with_name(target.name + ".part")
+        with open(part_path, "wb") as f:
+            def reset() -> None:
+                f.seek(0)
+                f.truncate()
+
+            await self._stream(url, f.write, reset)
+            size = f.tell()
+        os.replace(part_path, target)
+        return size
+
+    async def fetch_conditional(self, url: str, path: str) -> bool:
+        """Async version of :func:`fetch_conditional`."""
+        target = Path(path)
+        part_path = target.with_name(target.name + ".part")
+        client = self._client()
+        async with self._host_limit(url):
+            for attempt in range(self.retries + 1):
+                meta = read_validators(target)
+                headers, offset = _conditional_headers(target, part_path, meta)
+                try:
+                    async with client.stream("GET", url, headers=headers) as response:
+                        if response.status_code == 304:
+                            return _not_modified(target, part_path, meta)
+                        if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                            self.retried += 1
+                            await asyncio.sleep(_backoff_delay(attempt, self.backoff, response))
+                            continue
+                        response.raise_for_status()
+                        _start_body(target, meta, response.headers)
+                        with open(part_path, _body_mode(response.status_code, response.headers, offset, part_path)) as f:
+                            async for chunk in response.aiter_bytes(FETCH_CHUNK_SIZE):
+                                f.write(chunk)
+                    return _complete(target, part_path, meta)
+                except httpx.TransportError:
+                    if attempt >= self.retries:
+                        raise
+                    self.retried += 1
+                    await asyncio.sleep(_backoff_delay(attempt, self.backoff))
+        raise RuntimeError(f"Retries exhausted for {url}")
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of retried requests."""
+        return {"retries": self.retried}
+
+    async def aclose(self) -> None:
+        """Close the clients bound to the running loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+_async_fetcher: Optional[AsyncFetcher] = None
+
+
+def get_async_fetcher() -> AsyncFetcher:
+    """Return the process-wide async fetcher."""
+    global _async_fetcher
+    if _async_fetcher is None:
+        _async_fetcher = AsyncFetcher()
+    return _async_fetcher
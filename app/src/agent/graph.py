@@ -1,13 +1,35 @@
-from typing import Any, Dict, List, TypedDict
-from langgraph.graph import StateGraph, END, START
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+import logging
+from typing import Any, Callable, Dict, List, Optional, Union
 
-from dotenv import load_dotenv
-load_dotenv()
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
 
 # Import agents from the same package
-from agent.agents import student_node, teacher_node, observer_node, init_node, AgentState
-from langgraph.checkpoint.memory import InMemorySaver
+from agent.agents import (
+    AgentState,
+    acleanup_node,
+    ainit_node,
+    aobserver_node,
+    astudent_node,
+    ateacher_answer_node,
+    ateacher_node,
+    cleanup_node,
+    init_node,
+    observer_node,
+    student_node,
+    teacher_answer_node,
+    teacher_merge_node,
+    teacher_node,
+    teacher_sends,
+)
+from agent.cassette import install_from_env
+from agent.checkpoint import get_checkpoint_saver
+from agent.configuration import DEFAULTS, get_configuration
+from agent.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
 
 # # Define the graph state
 # class AgentState(MessagesState):
@@ -21,16 +43,9 @@ from langgraph.checkpoint.memory import InMemorySaver
 
 
 
-# Define configurable parameters for the graph
-class Configuration(TypedDict):
-    """Configurable parameters for the agent.
-    Set these when creating assistants OR when invoking the graph.
-    """
-    pdf_url: str
-
-# Define constants for N and K
-N_LOOPS = 8
-K_INTERVAL = 3
+# Defaults for N and K; set n_loops and k_interval under configurable to override
+N_LOOPS = DEFAULTS["n_loops"]
+K_INTERVAL = DEFAULTS["k_interval"]
 
 # Define the graph with custom checkpoint saver
 workflow = StateGraph(
@@ -38,51 +53,80 @@ workflow = StateGraph(
 )
 
 # Add nodes for each agent
-workflow.add_node("initial", init_node )
-workflow.add_node("student", student_node )
-workflow.add_node("teacher", teacher_node )
-workflow.add_node("observer", observer_node)
+# Nodes that do I/O have an async variant: graph.invoke runs the sync one,
+# graph.ainvoke/astream await the async one on the event loop instead of
+# holding a worker thread per run
+# Every node records its wall time and a per-run span in agent.metrics
+def instrumented(name: str, func: Callable[..., Any], afunc: Optional[Callable[..., Any]] = None) -> Any:
+    """Return ``func`` (and its async variant) wrapped with timing and spans."""
+    metrics = get_metrics()
+    if afunc is None:
+        return metrics.instrument_node(name, func)
+    return RunnableLambda(metrics.instrument_node(name, func), afunc=metrics.instrument_node(name, afunc), name=name)
+
+
+workflow.add_node("initial", instrumented("initial", init_node, ainit_node))
+workflow.add_node("student", instrumented("student", student_node, astudent_node))
+workflow.add_node("teacher", instrumented("teacher", teacher_node, ateacher_node))
+# Fan-out mode: one teacher_answer branch per batch of questions, joined by teacher_merge
+workflow.add_node("teacher_answer", instrumented("teacher_answer", teacher_answer_node, ateacher_answer_node))
+workflow.add_node("teacher_merge", instrumented("teacher_merge", teacher_merge_node))
+workflow.add_node("observer", instrumented("observer", observer_node, aobserver_node))
+# Every "end" route passes through cleanup, which releases cached paper content
+workflow.add_node("cleanup", instrumented("cleanup", cleanup_node, acleanup_node))
 
 
 
 # Define routing function from student
-def route_from_student(state: AgentState):
+def route_from_student(state: AgentState, config: RunnableConfig) -> Union[str, List[Send]]:
+    """Route to the teacher (or its fan-out branches), the observer, or the end."""
     current_turn = state["current_turn"]
+    configuration = get_configuration(config)
+    n_loops = configuration["n_loops"]
+    k_interval = configuration["k_interval"]
 
     if "error" in state:
-        print(f"Routing from student: Error occurred. Ending conversation.")
+        logger.info("Routing from student: Error occurred. Ending conversation.")
         return "end"
 
 
     if current_turn == 0:
-        print(f"Routing from student: Initial turn. Going to student.")
+        logger.info("Routing from student: Initial turn. Going to student.")
         return "student"
-    elif current_turn % K_INTERVAL == 0:
-        print(f"Routing from student: K interval ({K_INTERVAL}) reached at turn {current_turn}. Going to observer for insights.")
+    elif current_turn % k_interval == 0:
+        logger.info("Routing from student: K interval (%s) reached at turn %s. Going to observer for insights.", k_interval, current_turn)
         return "observer"
-    elif current_turn < N_LOOPS:
-        print(f"Routing from student: Questions remaining. Going to teacher.")
+    elif current_turn < n_loops:
+        if configuration["teacher_fanout"]:
+            sends = teacher_sends(state, config)
+            logger.info("Routing from student: Questions remaining. Fanning out to %s teacher branches.", len(sends))
+            return sends
+        logger.info("Routing from student: Questions remaining. Going to teacher.")
         return "teacher"
     else:
-        print(f"Routing from student: No more questions. Ending conversation.")
+        logger.info("Routing from student: No more questions. Ending conversation.")
         return "end"
 
 # Define routing function from teacher
-def route_from_teacher(state: AgentState):
+def route_from_teacher(state: AgentState, config: RunnableConfig) -> str:
+    """Route back to the student, to the observer, or to the end."""
     current_turn = state["current_turn"]
+    configuration = get_configuration(config)
+    n_loops = configuration["n_loops"]
+    k_interval = configuration["k_interval"]
 
     if "error" in state:
-        print(f"Routing from teacher: Error occurred. Ending conversation.")
+        logger.info("Routing from teacher: Error occurred. Ending conversation.")
         return "end"
     
-    if current_turn % K_INTERVAL == 0:
-        print(f"Routing from teacher: K interval ({K_INTERVAL}) reached at turn {current_turn}. Going to observer for insights.")
+    if current_turn % k_interval == 0:
+        logger.info("Routing from teacher: K interval (%s) reached at turn %s. Going to observer for insights.", k_interval, current_turn)
         return "observer"
-    elif current_turn < N_LOOPS:
-        print(f"Routing from teacher: Continuing to student.")
+    elif current_turn < n_loops:
+        logger.info("Routing from teacher: Continuing to student.")
         return "student"
     else:
-        print(f"Routing from teacher: N loops ({N_LOOPS}) completed. Ending conversation.")
+        logger.info("Routing from teacher: N loops (%s) completed. Ending conversation.", n_loops)
         return "end"
 
 
@@ -96,7 +140,7 @@ workflow.add_conditional_edges(
     {
         "teacher": "teacher",
         "observer": "observer",
-        "end": END
+        "end": "cleanup"
     }
 )
 
@@ -107,23 +151,37 @@ workflow.add_conditional_edges(
     {
         "student": "student",
         "observer": "observer",
-        "end": END
+        "end": "cleanup"
+    }
+)
+
+workflow.add_edge("teacher_answer", "teacher_merge")
+workflow.add_conditional_edges(
+    "teacher_merge",
+    route_from_teacher,
+    {
+        "student": "student",
+        "observer": "observer",
+        "end": "cleanup"
     }
 )
 
 # Add edges from observer back to student or END
-def route_from_observer(state: AgentState):
+def route_from_observer(state: AgentState, config: RunnableConfig) -> str:
+    """Route back to the student, or to the end once all turns are done."""
     current_turn = state["current_turn"]
+    configuration = get_configuration(config)
+    n_loops = configuration["n_loops"]
 
     if "error" in state:
-        print(f"Routing from observer: Error occurred. Ending conversation.")
+        logger.info("Routing from observer: Error occurred. Ending conversation.")
         return "end"
 
-    if current_turn >= N_LOOPS:
-        print("Routing from observer: N loops completed. Ending.")
+    if current_turn >= n_loops:
+        logger.info("Routing from observer: N loops completed. Ending.")
         return "end"
     else:
-        print("Routing from observer: Insights provided. Returning to student.")
+        logger.info("Routing from observer: Insights provided. Returning to student.")
         return "student"
 
 workflow.add_conditional_edges(
@@ -131,13 +189,19 @@ workflow.add_conditional_edges(
     route_from_observer,
     {
         "student": "student",
-        "end": END
+        "end": "cleanup"
     }
 )
 
+workflow.add_edge("cleanup", END)
+
+
+# LLM_CASSETTE records or replays model calls and paper fetches, see agent.cassette
+install_from_env()
 
-# Compile the graph
-graph = workflow.compile()
+# Compile the graph with the durable SQLite saver; invoke it with a
+# configurable thread_id so an interrupted run can resume from its last step
+graph = workflow.compile(checkpointer=get_checkpoint_saver())
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""Bounded store for the observer's directives.
+
+The observer answers with ``<Student>`` and ``<Teacher>`` sections that used
+to be appended verbatim to ``observer_insights`` and pasted in full into
+every student and teacher prompt, so guidance grew without bound. Here the
+sections are parsed into one directive per instruction. A new directive
+that overlaps an earlier one for the same role replaces it. Each role keeps
+only its newest directives that fit a token budget, and each node gets only
+the directives meant for its role.
+
+A directive is a plain dict, so it serializes with the rest of the state::
+
+    {"role": "Student", "text": "...", "turn": 6, "hits": 2}
+"""
+
+import os
+import re
+from typing import Any, Dict, List
+
+from agent.retrieval import tokenize
+from agent.text_cleanup import estimate_tokens
+
+ROLES = ("Student", "Teacher")
+
+# Token budget for the directives kept per role.
+INSIGHT_TOKEN_BUDGET = int(os.getenv("INSIGHT_TOKEN_BUDGET", "250"))
+# Word-overlap (Jaccard) above which a new directive supersedes an old one.
+INSIGHT_SIMILARITY = float(os.getenv("INSIGHT_SIMILARITY", "0.5"))
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def parse_directives(content: str) -> Dict[str, List[str]]:
+    """Split the observer's ``<Student>``/``<Teacher>`` sections into directives.
+
+    Every non-empty line of a section is one directive, without list markers.
+    """
+    directives: Dict[str, List[str]] = {role: [] for role in ROLES}
+    for role in ROLES:
+        for section in re.findall(rf"<{role}>(.*?)</{role}>", content, re.DOTALL):
+            for line in section.splitlines():
+                line = _BULLET.sub("", line).strip()
+                if line:
+                    directives[role].append(" ".join(line.split()))
+    return directives
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard overlap of the word sets of ``a`` and ``b``."""
+    a_terms, b_terms = set(tokenize(a)), set(tokenize(b))
+    if not a_terms or not b_terms:
+        return 0.0
+    return len(a_terms & b_terms) / len(a_terms | b_terms)
+
+
+def merge_insights(
+    insights: List[Dict[str, Any]],
+    directives: Dict[str, List[str]],
+    turn: int,
+    budget_tokens: int = INSIGHT_TOKEN_BUDGET,
+    min_similarity: float = INSIGHT_SIMILARITY,
+) -> List[Dict[str, Any]]:
+    """Merge new directives into the store and compact it.
+
+    Args:
+        insights: The current directives.
+        directives: New directive texts per role, as from ``parse_directives``.
+        turn: The turn the new directives were given at.
+        budget_tokens: Tokens of directives kept per role; the newest win.
+        min_similarity: Overlap at which a new directive replaces an old one.
+
+    Returns:
+        The new list of directives, oldest first.
+    """
+    merged = [dict(insight) for insight in insights]
+    for role, texts in directives.items():
+        for text in texts:
+            same_role = [insight for insight in merged if insight["role"] == role]
+            best = max(same_role, key=lambda insight: similarity(insight["text"], text), default=None)
+            if best is not None and similarity(best["text"], text) >= min_similarity:
+                # Superseded: the newer wording wins and counts as repeated advice.
+                merged.remove(best)
+                merged.append({"role": role, "text": text, "turn": turn, "hits": best["hits"] + 1})
+            else:
+                merged.append({"role": role, "text": text, "turn": turn, "hits": 1})
+
+    kept = []
+    used = {role: 0 for role in ROLES}
+    for insight in reversed(merged):
+        tokens = estimate_tokens(insight["text"])
+        if used.get(insight["role"], 0) + tokens > budget_tokens:
+            continue
+        used[insight["role"]] = used.get(insight["role"], 0) + tokens
+        kept.append(insight)
+    return kept[::-1]
+
+
+def insights_for(insights: List[Dict[str, Any]], role: str) -> str:
+    """Render the directives for ``role`` as a bullet list, oldest first."""
+    return "\n".join(f"- {insight['text']}" for insight in insights if insight["role"] == role)
@@ -0,0 +1,381 @@
+"""Metrics and per-run spans for graph nodes, model calls and runs.
+
+Nodes, model calls and whole runs record into process-wide counters,
+gauges and latency histograms. ``render`` exports them in the Prometheus
+text format, which the API server serves on ``/metrics``::
+
+    paper_agent_node_duration_seconds_bucket{node="teacher",le="2.5"} 41
+    paper_agent_llm_tokens_total{role="teacher",model="gemini-2.0-flash",direction="in"} 402113
+    paper_agent_active_runs 3
+
+Cache hits, rate-limit waits and download retries are already counted by
+their own modules; they are read from those ``stats()`` only when metrics are
+scraped, so the hot path pays for nothing but the node and call timings.
+
+Each run also keeps its last ``METRICS_SPANS_PER_RUN`` spans (node and model
+call timings) under its thread_id, for the last ``METRICS_RUNS`` runs. The
+server's SSE stream announces its thread_id first, so a client can fetch the
+spans of the run it is watching from ``/runs/{thread_id}/spans``.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "paper_agent")
+METRICS_RUNS = int(os.getenv("METRICS_RUNS", "200"))
+METRICS_SPANS_PER_RUN = int(os.getenv("METRICS_SPANS_PER_RUN", "500"))
+
+# Seconds; model calls and nodes range from milliseconds to a couple of minutes.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up, per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add ``amount`` to the series for ``labels``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Return the current value for ``labels``."""
+        with self._lock:
+            return float(self._values.get(self._key(labels), 0.0))
+
+
+class Gauge(Counter):
+    """A value that can go up and down, per label set."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the series for ``labels`` to ``value``."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        """Create a histogram with the given upper bucket bounds; ``+Inf`` is implied."""
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Count ``value`` into its bucket and add it to the sum."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per bucket (not cumulative) counts, then the sum.
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        """Return the number of observations for ``labels``."""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return sum(series[:-1]) if series else 0
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Return the cumulative bucket, sum and count samples of every series."""
+        with self._lock:
+            values = [(key, list(series)) for key, series in self._values.items()]
+        samples = []
+        for key, series in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, series[-1]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Spans:
+    """The most recent spans of the most recent runs, keyed by thread_id."""
+
+    def __init__(self, runs: int = METRICS_RUNS, per_run: int = METRICS_SPANS_PER_RUN) -> None:
+        """Keep up to ``per_run`` spans for each of the last ``runs`` runs."""
+        self.runs = runs
+        self.per_run = per_run
+        self._runs: OrderedDict[str, Deque[Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, run_id: str, name: str, start: float, seconds: float, status: str, **attributes: Any) -> None:
+        """Record a span for ``run_id``; spans outside a run are dropped."""
+        if not run_id:
+            return
+        span = {"name": name, "start": start, "duration_ms": round(seconds * 1000, 3), "status": status, **attributes}
+        with self._lock:
+            spans = self._runs.get(run_id)
+            if spans is None:
+                spans = self._runs[run_id] = deque(maxlen=self.per_run)
+                while len(self._runs) > self.runs:
+                    self._runs.popitem(last=False)
+            else:
+                self._runs.move_to_end(run_id)
+            spans.append(span)
+
+    def get(self, run_id: str) -> List[Dict[str, Any]]:
+        """Return the spans of ``run_id``, oldest first."""
+        with self._lock:
+            return list(self._runs.get(run_id, ()))
+
+
+def run_id(config: Any) -> str:
+    """Return the thread_id a node or call runs under, or "" outside a thread."""
+    return str(((config or {}).get("configurable") or {}).get("thread_id") or "")
+
+
+class Metrics:
+    """The process-wide metrics: node, model call and run instruments, spans and collectors."""
+
+    def __init__(self, prefix: str = METRICS_PREFIX) -> None:
+        """Create the instruments, named ``<prefix>_...``."""
+        self.prefix = prefix
+        self.node_duration = Histogram(f"{prefix}_node_duration_seconds", "Graph node wall time.", ("node",))
+        self.node_errors = Counter(f"{prefix}_node_errors_total", "Graph node calls that raised.", ("node",))
+        self.llm_duration = Histogram(
+            f"{prefix}_llm_call_duration_seconds", "Model call latency, after any rate-limit wait.", ("role", "model")
+        )
+        self.llm_wait = Histogram(f"{prefix}_llm_rate_limit_wait_seconds", "Time model calls waited for the rate limiter.", ("model",))
+        self.llm_tokens = Counter(f"{prefix}_llm_tokens_total", "Model tokens, reported or estimated.", ("role", "model", "direction"))
+        self.llm_errors = Counter(f"{prefix}_llm_errors_total", "Model calls that raised.", ("role", "model"))
+        self.active_runs = Gauge(f"{prefix}_active_runs", "Graph runs in progress.")
+        self.runs = Counter(f"{prefix}_runs_total", "Finished graph runs by status.", ("status",))
+        self.run_duration = Histogram(f"{prefix}_run_duration_seconds", "Graph run wall time.", ("status",))
+        self.spans = Spans()
+        self._metrics: List[_Metric] = [
+            self.node_duration, self.node_errors, self.llm_duration, self.llm_wait, self.llm_tokens,
+            self.llm_errors, self.active_runs, self.runs, self.run_duration,
+        ]
+        self._collectors: List[Callable[[], List[_Metric]]] = [_collect_stats]
+
+    def add_collector(self, collect: Callable[[], List[_Metric]]) -> None:
+        """Register a function that builds metrics at scrape time, e.g. from a module's ``stats()``."""
+        self._collectors.append(collect)
+
+    def record_llm_call(
+        self, run_id: str, role: str, model: str, start: float, wait: float, seconds: float, tokens_in: int, tokens_out: int
+    ) -> None:
+        """Record a completed model call and its rate-limit wait."""
+        self.llm_duration.observe(seconds, role=role, model=model)
+        self.llm_wait.observe(wait, model=model)
+        self.llm_tokens.inc(tokens_in, role=role, model=model, direction="in")
+        self.llm_tokens.inc(tokens_out, role=role, model=model, direction="out")
+        self.spans.add(
+            run_id, f"llm:{role}", start, seconds, "ok", model=model, wait_ms=round(wait * 1000, 3),
+            tokens_in=tokens_in, tokens_out=tokens_out,
+        )
+
+    def record_llm_error(self, run_id: str, role: str, model: str, start: float, seconds: float, error: BaseException) -> None:
+        """Record a model call that raised."""
+        self.llm_errors.inc(role=role, model=model)
+        self.spans.add(run_id, f"llm:{role}", start, seconds, "error", model=model, error=repr(error))
+
+    def _record_node(self, node: str, config: Any, start: float, began: float, error: Optional[BaseException]) -> None:
+        seconds = time.perf_counter() - began
+        self.node_duration.observe(seconds, node=node)
+        if error is not None:
+            self.node_errors.inc(node=node)
+        self.spans.add(run_id(config), f"node:{node}", start, seconds, "error" if error else "ok")
+
+    def instrument_node(self, node: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap a sync or async node so each call is timed and recorded as a span."""
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def anode(state: Any, config: Any) -> Any:
+                start, began = time.time(), time.perf_counter()
+                try:
+                    result = await func(state, config)
+                except BaseException as e:
+                    self._record_node(node, config, start, began, e)
+                    raise
+                self._record_node(node, config, start, began, None)
+                return result
+
+            return anode
+
+        @functools.wraps(func)
+        def wrapper(state: Any, config: Any) -> Any:
+            start, began = time.time(), time.perf_counter()
+            try:
+                result = func(state, config)
+            except BaseException as e:
+                self._record_node(node, config, start, began, e)
+                raise
+            self._record_node(node, config, start, began, None)
+            return result
+
+        return wrapper
+
+    @contextlib.contextmanager
+    def track_run(self, thread_id: str) -> Iterator[None]:
+        """Count a graph run as active for the block and record how it ended.
+
+        A run that raises is counted as "error"; one closed or cancelled
+        before it finished, e.g. by a client leaving an SSE stream, as
+        "cancelled".
+        """
+        start, began = time.time(), time.perf_counter()
+        self.active_runs.inc()
+        status = "cancelled"
+        try:
+            yield
+            status = "ok"
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            seconds = time.perf_counter() - began
+            self.active_runs.inc(-1)
+            self.runs.inc(status=status)
+            self.run_duration.observe(seconds, status=status)
+            self.spans.add(thread_id, "run", start, seconds, status)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        metrics = list(self._metrics)
+        for collect in self._collectors:
+            try:
+                metrics.extend(collect())
+            except Exception as e:
+                logger.warning("Metrics: collector %s failed: %s", collect.__name__, e)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+def _from_stats(
+    prefix: str,
+    help: str,
+    labels: Sequence[str],
+    rows: List[Tuple[Dict[str, str], Dict[str, Any]]],
+    counters: Sequence[str] = (),
+) -> List[_Metric]:
+    """One metric per field of a ``stats()`` dict, labelled by ``labels``.
+
+    Fields in ``counters`` only ever grow and are exported as counters named
+    ``<field>_total``; the rest are levels and exported as gauges.
+    """
+    metrics: Dict[str, Counter] = {}
+    for row_labels, stats in rows:
+        for field, value in stats.items():
+            if not isinstance(value, (int, float)):
+                continue
+            metric = metrics.get(field)
+            if metric is None:
+                if field in counters:
+                    metric = Counter(f"{prefix}_{field}_total", f"{help}: {field}.", labels)
+                else:
+                    metric = Gauge(f"{prefix}_{field}", f"{help}: {field}.", labels)
+                metrics[field] = metric
+            # Built fresh on every scrape, so incrementing from zero sets the value.
+            metric.inc(value, **row_labels)
+    return list(metrics.values())
+
+
+def _collect_stats() -> List[_Metric]:
+    """Build metrics from the counters the caches, rate limiter, model statistics and fetcher already keep."""
+    from agent.blob_store import get_blob_store
+    from agent.context_cache import get_context_cache_registry
+    from agent.fetch import get_async_fetcher
+    from agent.model_stats import get_model_stats
+    from agent.paper_cache import get_paper_cache
+    from agent.rate_limiter import get_rate_limiter
+
+    prefix = METRICS_PREFIX
+    models = get_model_stats().stats()
+    limits = get_rate_limiter().stats()
+    paper_cache = get_paper_cache().stats()
+    blob_store = get_blob_store().stats()
+    return [
+        # Every paper cache and blob store field is a running count.
+        *_from_stats(f"{prefix}_paper_cache", "Paper cache", (), [({}, paper_cache)], counters=tuple(paper_cache)),
+        *_from_stats(f"{prefix}_blob_store", "Blob store", (), [({}, blob_store)], counters=tuple(blob_store)),
+        *_from_stats(
+            f"{prefix}_context_cache", "Context cache", (), [({}, get_context_cache_registry().stats())],
+            counters=("created", "reused", "refreshed", "deleted"),
+        ),
+        *_from_stats(f"{prefix}_fetch", "Async paper downloads", (), [({}, get_async_fetcher().stats())], counters=("retries",)),
+        *_from_stats(
+            f"{prefix}_model", "Model calls, latency over the statistics window", ("role", "model"),
+            [({"role": role, "model": model}, stats) for role, per_model in models.items() for model, stats in per_model.items()],
+            counters=("calls", "tokens_in", "tokens_out", "cost_usd"),
+        ),
+        *_from_stats(
+            f"{prefix}_rate_limit", "Rate limiter", ("model",), [({"model": model}, stats) for model, stats in limits.items()],
+            counters=("granted", "tokens"),
+        ),
+    ]
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
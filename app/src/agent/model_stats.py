@@ -0,0 +1,159 @@
+"""Latency, token and cost statistics per role and model, and latency routing.
+
+Every chain call made by the nodes is recorded here under its role
+("student", "teacher", "observer") and model. ``stats`` reports, for each
+pair, the p50/p95 latency over the last ``MODEL_STATS_WINDOW`` calls and the
+tokens and estimated cost of all calls so far::
+
+    {"teacher": {"gemini-2.0-flash": {"calls": 12, "p50_ms": 840.0, "p95_ms": 1630.0,
+                                      "tokens_in": 40211, "tokens_out": 5873, "cost_usd": 0.0064}}}
+
+``route`` is the optional routing policy: it picks the cheapest of a set of
+models whose p95 latency for the role meets a target, trying each model on
+``ROUTING_MIN_SAMPLES`` calls before judging it. Routing only trusts samples
+from the last ``ROUTING_SAMPLE_MAX_AGE`` seconds, so a model that once missed
+the target, and is therefore no longer picked, is tried again once its slow
+samples have expired.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+MODEL_STATS_WINDOW = int(os.getenv("MODEL_STATS_WINDOW", "200"))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "5"))
+ROUTING_SAMPLE_MAX_AGE = float(os.getenv("ROUTING_SAMPLE_MAX_AGE", "900"))
+
+# USD per million input and output tokens.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+def cost(model: str, tokens_in: int, tokens_out: int) -> float:
+    """Estimated USD cost of a call; unknown models cost nothing."""
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+
+
+def usage(message: Any) -> Tuple[int, int]:
+    """Input and output tokens reported on a message or message chunk."""
+    metadata = getattr(message, "usage_metadata", None) or {}
+    return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """Nearest-rank percentile, ``q`` in [0, 1]."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class _Series:
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        # When each latency in ``latencies`` was recorded.
+        self.recorded_at: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+
+class ModelStats:
+    """Thread-safe per (role, model) call statistics."""
+
+    def __init__(
+        self,
+        window: int = MODEL_STATS_WINDOW,
+        min_samples: int = ROUTING_MIN_SAMPLES,
+        max_age: float = ROUTING_SAMPLE_MAX_AGE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Keep the last ``window`` calls per pair; routing ignores samples older than ``max_age`` seconds."""
+        self.window = window
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self.clock = clock
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, role: str, model: str, latency_s: float, tokens_in: int, tokens_out: int) -> None:
+        """Record one completed call."""
+        with self._lock:
+            series = self._series.get((role, model))
+            if series is None:
+                series = self._series[(role, model)] = _Series(self.window)
+            series.latencies.append(latency_s * 1000)
+            series.recorded_at.append(self.clock())
+            series.calls += 1
+            series.tokens_in += tokens_in
+            series.tokens_out += tokens_out
+
+    def p95_ms(self, role: str, model: str) -> Optional[float]:
+        """p95 latency over the last ``max_age`` seconds, or ``None`` with fewer than ``min_samples`` calls in them."""
+        with self._lock:
+            series = self._series.get((role, model))
+            if series is None:
+                return None
+            oldest = self.clock() - self.max_age
+            recent: List[float] = [
+                latency for latency, at in zip(series.latencies, series.recorded_at) if at >= oldest
+            ]
+            if len(recent) < self.min_samples:
+                return None
+            return percentile(recent, 0.95)
+
+    def route(self, role: str, models: Iterable[str], target_ms: float) -> str:
+        """Pick the cheapest model whose p95 latency for ``role`` is within ``target_ms``.
+
+        Models are tried cheapest first; one without enough samples yet is
+        picked so it gets measured, which is also how a model that missed the
+        target is measured again once its samples are older than
+        ``max_age``. If none meets the target the fastest is used.
+        """
+        models = sorted(models, key=lambda model: cost(model, 1, 1))
+        if not models:
+            raise ValueError("No models to route between")
+        measured: Dict[str, float] = {}
+        for model in models:
+            p95 = self.p95_ms(role, model)
+            if p95 is None or p95 <= target_ms:
+                return model
+            measured[model] = p95
+        return min(measured, key=lambda model: measured[model])
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Return latency percentiles, token totals and cost per role and model."""
+        with self._lock:
+            result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+            for (role, model), series in self._series.items():
+                result.setdefault(role, {})[model] = {
+                    "calls": series.calls,
+                    "p50_ms": percentile(series.latencies, 0.5),
+                    "p95_ms": percentile(series.latencies, 0.95),
+                    "tokens_in": series.tokens_in,
+                    "tokens_out": series.tokens_out,
+                    "cost_usd": cost(model, series.tokens_in, series.tokens_out),
+                }
+            return result
+
+
+_model_stats: Optional[ModelStats] = None
+
+
+def get_model_stats() -> ModelStats:
+    """Return the process-wide model statistics."""
+    global _model_stats
+    if _model_stats is None:
+        _model_stats = ModelStats()
+    return _model_stats
@@ -0,0 +1,223 @@
+"""Persistent on-disk cache for extracted paper text.
+
+Extracted markdown is stored content-addressed by the SHA-256 of the PDF
+bytes it came from, and a small index maps paper keys to those digests.
+Keys come from ``agent.arxiv_id.paper_key``, so every URL variant of an
+arXiv paper shares one entry. A lookup by URL therefore skips both the
+download and the conversion, while a lookup by digest still skips the
+conversion when the same PDF is served from an unrelated URL.
+
+The downloaded PDF is kept as well, keyed the same way, together with its HTTP
+validators. Once an entry is older than ``max_age`` seconds it is
+revalidated with a conditional GET instead of being downloaded again.
+
+Entries are evicted least-recently-used first once the total size of the
+cached markdown and PDFs exceeds ``max_bytes``. Recency is tracked through
+the file modification time, so hits never rewrite the index.
+
+Several processes may share one cache directory. Writers hold an exclusive
+``flock`` on ``index.lock`` and re-read the index before changing it, so
+one process never drops the entries another has just added; readers that
+miss re-read the index in case another process has filled it meanwhile.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from agent.arxiv_id import paper_key
+from agent.fetch import read_validators, validators_path
+
+PAPER_CACHE_DIR = os.getenv("PAPER_CACHE_DIR", ".paper_cache")
+PAPER_CACHE_MAX_BYTES = int(os.getenv("PAPER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PAPER_CACHE_MAX_AGE = float(os.getenv("PAPER_CACHE_MAX_AGE", str(24 * 60 * 60)))
+
+
+def sha256_digest(data: bytes) -> str:
+    """Return the hex SHA-256 digest of ``data``."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PaperCache:
+    """Size-bounded LRU cache of extracted markdown, keyed by paper and PDF digest."""
+
+    def __init__(
+        self,
+        cache_dir: str = PAPER_CACHE_DIR,
+        max_bytes: int = PAPER_CACHE_MAX_BYTES,
+        max_age: float = PAPER_CACHE_MAX_AGE,
+    ) -> None:
+        """Keep at most ``max_bytes`` under ``cache_dir``; revalidate PDFs older than ``max_age`` seconds."""
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.content_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._index_path = self.cache_dir / "index.json"
+        self._index_lock_path = self.cache_dir / "index.lock"
+        self._keys: Optional[Dict[str, str]] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether caching is on; ``max_bytes <= 0`` turns it off."""
+        return self.max_bytes > 0
+
+    def _entry_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.md"
+
+    def pdf_path(self, url: str) -> Path:
+        """Return where the PDF downloaded from ``url`` is kept; the fetcher creates the directory."""
+        return self.cache_dir / f"{sha256_digest(paper_key(url).encode())}.pdf"
+
+    def is_fresh(self, url: str) -> bool:
+        """Return whether ``url`` was fetched or revalidated within ``max_age``."""
+        meta = read_validators(self.pdf_path(url))
+        return time.time() - float(meta.get("checked_at", 0)) < self.max_age
+
+    def record_revalidation(self, modified: bool) -> None:
+        """Count a conditional GET and whether it returned a new PDF."""
+        with self._lock:
+            self.revalidations += 1
+            if not modified:
+                self.not_modified += 1
+
+    def _load_index(self, reload: bool = False) -> Dict[str, str]:
+        if self._keys is None or reload:
+            try:
+                with open(self._index_path, encoding="utf-8") as f:
+                    self._keys = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._keys = {}
+        return self._keys
+
+    @contextlib.contextmanager
+    def _index_locked(self) -> Iterator[Dict[str, str]]:
+        """Hold the cross-process index lock and yield the index as on disk.
+
+        Changes made to the yielded dict are written back on exit.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._index_lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield self._load_index(reload=True)
+                self._save_index()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_index(self) -> None:
+        tmp_path = self._index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._keys, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _read_entry(self, digest: str) -> Optional[str]:
+        path = self._entry_path(digest)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        # Touch the entry so eviction sees it as recently used.
+        os.utime(path)
+        return text
+
+    def get(self, url: str) -> Optional[str]:
+        """Return cached markdown for ``url`` or ``None`` on a miss."""
+        if not self.enabled:
+            return None
+        key = paper_key(url)
+        with self._lock:
+            digest = self._load_index().get(key)
+            if digest is None:
+                # Another process may have cached it since the index was read.
+                digest = self._load_index(reload=True).get(key)
+            text = self._read_entry(digest) if digest else None
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return text
+
+    def get_by_digest(self, digest: str) -> Optional[str]:
+        """Return cached markdown for a PDF digest or ``None`` on a miss.
+
+        Used after a URL miss, so only hits are counted here.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            text = self._read_entry(digest)
+            if text is not None:
+                self.content_hits += 1
+            return text
+
+    def put(self, url: str, digest: str, markdown_text: str) -> None:
+        """Store ``markdown_text`` under ``digest`` and point ``url`` at it."""
+        if not self.enabled:
+            return
+        with self._lock, self._index_locked() as keys:
+            entry_path = self._entry_path(digest)
+            if not entry_path.exists():
+                tmp_path = entry_path.with_suffix(".tmp")
+                tmp_path.write_text(markdown_text, encoding="utf-8")
+                os.replace(tmp_path, entry_path)
+            else:
+                os.utime(entry_path)
+            keys[paper_key(url)] = digest
+            self._evict(keys)
+
+    def _evict(self, keys: Dict[str, str]) -> None:
+        entries = []
+        total = 0
+        for path in [*self.cache_dir.glob("*.md"), *self.cache_dir.glob("*.pdf")]:
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        evicted = set()
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            if path.suffix == ".pdf":
+                validators_path(path).unlink(missing_ok=True)
+            else:
+                evicted.add(path.stem)
+            total -= size
+            self.evictions += 1
+        for key in [key for key, digest in keys.items() if digest in evicted]:
+            del keys[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters."""
+        return {
+            "hits": self.hits,
+            "content_hits": self.content_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+            "not_modified": self.not_modified,
+        }
+
+
+_paper_cache: Optional[PaperCache] = None
+
+
+def get_paper_cache() -> PaperCache:
+    """Return the process-wide paper cache."""
+    global _paper_cache
+    if _paper_cache is None:
+        _paper_cache = PaperCache()
+    return _paper_cache
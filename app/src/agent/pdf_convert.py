@@ -0,0 +1,125 @@
+"""Parallel PDF-to-markdown conversion.
+
+``pymupdf4llm.to_markdown`` is single threaded and CPU bound, so long papers
+are split into contiguous page ranges that are converted in a shared
+``ProcessPoolExecutor`` and joined back in page order. Short documents are
+converted serially, where the pool start-up and the copy of the PDF bytes to
+each worker would cost more than they save.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Optional
+
+import pymupdf
+import pymupdf4llm
+
+PDF_CONVERT_WORKERS = int(os.getenv("PDF_CONVERT_WORKERS", str(os.cpu_count() or 1)))
+# A 12-page paper still converted faster serially (7.2 s) than in the pool (8.7 s).
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+
+# The pool is reached from asyncio.to_thread workers, and forking a
+# multi-threaded process can copy a lock some other thread holds.
+PDF_POOL_START_METHOD = os.getenv(
+    "PDF_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            context = multiprocessing.get_context(PDF_POOL_START_METHOD)
+            if PDF_POOL_START_METHOD == "forkserver":
+                # Import the converter once in the server rather than in every worker.
+                context.set_forkserver_preload([__name__])
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+            _executor_workers = max_workers
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """Shut down the shared conversion pool, if one was started."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+            _executor_workers = 0
+
+
+def split_pages(page_count: int, chunks: int) -> List[List[int]]:
+    """Split ``range(page_count)`` into at most ``chunks`` contiguous, balanced ranges."""
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def _page_texts(doc: pymupdf.Document, pages: Optional[List[int]] = None) -> List[str]:
+    return [chunk["text"] for chunk in pymupdf4llm.to_markdown(doc, pages=pages, page_chunks=True)]
+
+
+def _convert_pages(pdf_bytes: bytes, pages: List[int]) -> List[str]:
+    doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return _page_texts(doc, pages)
+    finally:
+        doc.close()
+
+
+def convert_pdf_to_pages(
+    pdf_bytes: bytes,
+    max_workers: Optional[int] = None,
+    min_pages: Optional[int] = None,
+) -> List[str]:
+    """Convert a PDF to one markdown string per page, in parallel for long documents.
+
+    Args:
+        pdf_bytes: The raw PDF document.
+        max_workers: Size of the process pool. Defaults to ``PDF_CONVERT_WORKERS``.
+        min_pages: Documents with fewer pages are converted serially.
+            Defaults to ``PDF_PARALLEL_MIN_PAGES``.
+
+    Returns:
+        The markdown of every page, in page order.
+    """
+    max_workers = PDF_CONVERT_WORKERS if max_workers is None else max_workers
+    min_pages = PDF_PARALLEL_MIN_PAGES if min_pages is None else min_pages
+
+    doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        page_count = doc.page_count
+        if max_workers <= 1 or page_count < max(min_pages, 2):
+            return _page_texts(doc)
+    finally:
+        doc.close()
+
+    page_ranges = split_pages(page_count, max_workers)
+    executor = _get_executor(max_workers)
+    # map() yields results in submission order, which is page order.
+    return [page for chunk in executor.map(_convert_pages, repeat(pdf_bytes), page_ranges) for page in chunk]
+
+
+def convert_pdf_to_markdown(
+    pdf_bytes: bytes,
+    max_workers: Optional[int] = None,
+    min_pages: Optional[int] = None,
+) -> str:
+    """Convert a PDF to a single markdown document. See ``convert_pdf_to_pages``."""
+    return "".join(convert_pdf_to_pages(pdf_bytes, max_workers, min_pages))
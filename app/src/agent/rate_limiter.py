@@ -0,0 +1,237 @@
+"""Process-wide request and token rate limits for model calls.
+
+Concurrent runs used to call Gemini independently and ran into bursts of
+429s, which the client then retried blindly. Every chain call made by the
+nodes now waits here first for one request and its estimated tokens from
+two token buckets per model: requests per minute and tokens per minute.
+
+Each bucket holds ``burst_seconds`` worth of its quota and refills
+continuously, so calls are spread out instead of spending the whole minute's
+quota at once. The token estimate is settled against the real usage once the
+call returns.
+
+Waiting calls are queued per run and served round-robin, so one run with many
+calls in flight, e.g. a teacher fan-out, cannot starve the others. Both sync
+and async callers queue in the same line.
+
+A rate of 0 disables the corresponding bucket.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from agent.model_stats import percentile
+
+RATE_LIMIT_RPM = float(os.getenv("RATE_LIMIT_RPM", "1000"))
+RATE_LIMIT_TPM = float(os.getenv("RATE_LIMIT_TPM", "4000000"))
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "5"))
+# Output tokens reserved per call until the real usage is known.
+RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv("RATE_LIMIT_OUTPUT_TOKENS", "1500"))
+RATE_LIMIT_STATS_WINDOW = int(os.getenv("RATE_LIMIT_STATS_WINDOW", "1000"))
+
+
+class _Ticket:
+    __slots__ = ("run_id", "tokens", "wake", "granted")
+
+    def __init__(self, run_id: str, tokens: float):
+        self.run_id = run_id
+        self.tokens = tokens
+        self.wake: Callable[[], None] = lambda: None
+        self.granted = False
+
+
+class _Bucket:
+    def __init__(self, per_minute: float, burst_seconds: float, now: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, amount: float) -> float:
+        """Seconds until ``amount`` (at most the capacity) is available."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class _Model:
+    def __init__(self, rpm: float, tpm: float, burst_seconds: float, now: float):
+        self.requests = _Bucket(rpm, burst_seconds, now) if rpm > 0 else None
+        self.tokens = _Bucket(tpm, burst_seconds, now) if tpm > 0 else None
+        # Waiting tickets per run, served round-robin.
+        self.queues: OrderedDict[str, Deque[_Ticket]] = OrderedDict()
+        self.waits: Deque[float] = deque(maxlen=RATE_LIMIT_STATS_WINDOW)
+        self.granted = 0
+        self.tokens_used = 0.0
+
+    def head(self) -> Optional[_Ticket]:
+        for queue in self.queues.values():
+            return queue[0]
+        return None
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per model, with round-robin queueing across runs."""
+
+    def __init__(
+        self,
+        rpm: float = RATE_LIMIT_RPM,
+        tpm: float = RATE_LIMIT_TPM,
+        burst_seconds: float = RATE_LIMIT_BURST_SECONDS,
+        quotas: Optional[Dict[str, Tuple[float, float]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Limit every model to ``rpm``/``tpm``, or the per-model pair in ``quotas``; 0 disables a limit."""
+        self.rpm = rpm
+        self.tpm = tpm
+        self.burst_seconds = burst_seconds
+        # Per-model (rpm, tpm) overriding the defaults.
+        self.quotas = dict(quotas or {})
+        self.clock = clock
+        self._models: Dict[str, _Model] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> _Model:
+        state = self._models.get(model)
+        if state is None:
+            rpm, tpm = self.quotas.get(model, (self.rpm, self.tpm))
+            state = self._models[model] = _Model(rpm, tpm, self.burst_seconds, self.clock())
+        return state
+
+    def _enqueue(self, model: str, tokens: float, run_id: str) -> _Ticket:
+        ticket = _Ticket(run_id, tokens)
+        with self._lock:
+            self._model(model).queues.setdefault(run_id, deque()).append(ticket)
+        return ticket
+
+    def _remove(self, state: _Model, ticket: _Ticket) -> None:
+        queue = state.queues[ticket.run_id]
+        queue.remove(ticket)
+        if ticket.granted or not queue:
+            del state.queues[ticket.run_id]
+        if queue and ticket.granted:
+            # The run goes to the back of the line for its next call.
+            state.queues[ticket.run_id] = queue
+        head = state.head()
+        if head is not None:
+            head.wake()
+
+    def _poll(self, model: str, ticket: _Ticket) -> Optional[float]:
+        """Grant ``ticket`` if it is first in line and both buckets allow it.
+
+        Returns 0 once granted, the seconds to wait for the buckets to refill
+        if it is first in line, or ``None`` to wait until it is.
+        """
+        with self._lock:
+            state = self._model(model)
+            if state.head() is not ticket:
+                return None
+            now = self.clock()
+            wait = 0.0
+            for bucket, amount in ((state.requests, 1), (state.tokens, ticket.tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait(amount))
+            if wait > 0:
+                return wait
+            if state.requests is not None:
+                state.requests.level -= 1
+            if state.tokens is not None:
+                state.tokens.level -= min(ticket.tokens, state.tokens.capacity)
+            ticket.granted = True
+            state.granted += 1
+            state.tokens_used += ticket.tokens
+            self._remove(state, ticket)
+            return 0.0
+
+    def _cancel(self, model: str, ticket: _Ticket) -> None:
+        with self._lock:
+            if not ticket.granted:
+                self._remove(self._model(model), ticket)
+
+    def _record(self, model: str, waited: float) -> float:
+        with self._lock:
+            self._model(model).waits.append(waited)
+        return waited
+
+    def acquire(self, model: str, tokens: float = 0, run_id: str = "") -> float:
+        """Block until a call to ``model`` using ``tokens`` may start; return the seconds waited."""
+        start = time.perf_counter()
+        ticket = self._enqueue(model, tokens, run_id)
+        event = threading.Event()
+        ticket.wake = event.set
+        try:
+            while True:
+                event.clear()
+                wait = self._poll(model, ticket)
+                if wait == 0:
+                    return self._record(model, time.perf_counter() - start)
+                event.wait(wait)
+        finally:
+            self._cancel(model, ticket)
+
+    async def aacquire(self, model: str, tokens: float = 0, run_id: str = "") -> float:
+        """Async ``acquire``: waits on the event loop instead of blocking a thread."""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        ticket = self._enqueue(model, tokens, run_id)
+        event = asyncio.Event()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(event.set)
+
+        ticket.wake = wake
+        try:
+            while True:
+                event.clear()
+                wait = self._poll(model, ticket)
+                if wait == 0:
+                    return self._record(model, time.perf_counter() - start)
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._cancel(model, ticket)
+
+    def settle(self, model: str, reserved: float, used: float) -> None:
+        """Return unused reserved tokens to the bucket, or take the overrun from it."""
+        with self._lock:
+            state = self._model(model)
+            state.tokens_used += used - reserved
+            if state.tokens is not None:
+                state.tokens.refill(self.clock())
+                state.tokens.level = min(state.tokens.capacity, state.tokens.level + reserved - used)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return granted calls, queued calls, tokens and wait times per model."""
+        with self._lock:
+            return {
+                model: {
+                    "granted": state.granted,
+                    "queued": sum(len(queue) for queue in state.queues.values()),
+                    "tokens": int(state.tokens_used),
+                    "wait_p50_ms": percentile(state.waits, 0.5) * 1000,
+                    "wait_p95_ms": percentile(state.waits, 0.95) * 1000,
+                    "wait_max_ms": max(state.waits, default=0.0) * 1000,
+                }
+                for model, state in self._models.items()
+            }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,194 @@
+"""Section-aware chunking and BM25 retrieval over a paper.
+
+The teacher used to receive the whole paper on every turn. Instead the
+paper is split once into chunks that respect section boundaries, a BM25
+index is built over them with NumPy, and each turn only the ``top_k``
+chunks most relevant to the current questions are sent.
+
+Indexes live in a small in-process registry keyed by paper and the digest
+of its text, so they are built once at ``init_node`` time, reused by every
+teacher turn, and never served for an older version of a paper.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from agent.paper_cache import sha256_digest
+
+# Markdown headings and numbered section titles such as "2.1. Related work".
+_HEADING = re.compile(r"^(?:#{1,6}\s+\S.*|(?:\d{1,2}\.)+\d{0,2}\s+[A-Z][^.,;:]{2,60}[^-])$")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in into is it its of on or "
+    "that the their then there these this to was what when where which while who "
+    "why with".split()
+)
+
+MAX_INDEXES = 32
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def _sections(text: str) -> List[Tuple[str, str]]:
+    sections = []
+    title = ""
+    lines: List[str] = []
+    for line in text.splitlines():
+        if _HEADING.match(line.strip()):
+            if any(kept.strip() for kept in lines):
+                sections.append((title, "\n".join(lines)))
+            title = line.strip().lstrip("#").strip()
+            lines = []
+        else:
+            lines.append(line)
+    if any(kept.strip() for kept in lines):
+        sections.append((title, "\n".join(lines)))
+    return sections
+
+
+def _pieces(paragraph: str, chunk_chars: int) -> List[str]:
+    if len(paragraph) <= chunk_chars:
+        return [paragraph]
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > chunk_chars:
+            pieces.append(sentence[:chunk_chars])
+            sentence = sentence[chunk_chars:]
+        if current and len(current) + len(sentence) + 1 > chunk_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_paper(text: str, chunk_chars: int = 1500) -> List[str]:
+    """Split a paper into chunks of at most about ``chunk_chars`` characters.
+
+    Chunks never span two sections, paragraphs are kept whole when they fit,
+    and every chunk starts with its section title so it reads on its own.
+    """
+    chunks = []
+    for title, body in _sections(text):
+        header = f"## {title}\n" if title else ""
+        current = ""
+        for paragraph in _PARAGRAPH_BREAK.split(body):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for piece in _pieces(paragraph, chunk_chars):
+                if current and len(current) + len(piece) + 2 > chunk_chars:
+                    chunks.append(header + current)
+                    current = ""
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(header + current)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of chunks.
+
+    Per-term BM25 weights are precomputed into postings: for each term, the
+    chunks it occurs in and its weight in each. Memory grows with the number
+    of (term, chunk) pairs rather than chunks times vocabulary, and scoring a
+    query adds up the postings of its terms.
+    """
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75) -> None:
+        """Index ``chunks`` with the usual BM25 parameters ``k1`` and ``b``."""
+        self.chunks = chunks
+        self.vocabulary: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_len = np.zeros(len(chunks), dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            counts: Dict[int, int] = {}
+            for token in tokenize(chunk):
+                term = self.vocabulary.get(token)
+                if term is None:
+                    term = self.vocabulary[token] = len(postings)
+                    postings.append([])
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings[term].append((row, count))
+            doc_len[row] = sum(counts.values())
+
+        avg_len = float(doc_len.mean()) if len(chunks) else 1.0
+        norm = k1 * (1 - b + b * doc_len / max(avg_len, 1e-9))
+        # Postings of term t are chunk_ids[offsets[t]:offsets[t + 1]], in chunk order.
+        self.offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(pairs) for pairs in postings])
+        pairs = np.array([pair for term_pairs in postings for pair in term_pairs], dtype=np.int64).reshape(-1, 2)
+        self.chunk_ids = pairs[:, 0].astype(np.int32)
+        tf = pairs[:, 1].astype(np.float32)
+        df = np.diff(self.offsets).astype(np.float32)
+        idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        term_idf = np.repeat(idf, np.diff(self.offsets))
+        self.weights = term_idf * tf * (k1 + 1) / (tf + norm[self.chunk_ids])
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for ``query``."""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in tokenize(query):
+            term = self.vocabulary.get(token)
+            if term is not None:
+                start, end = self.offsets[term], self.offsets[term + 1]
+                # A term lists each chunk once, so plain fancy-index addition is safe.
+                scores[self.chunk_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Return the indices of the ``k`` best chunks for ``query``, in document order."""
+        if not self.chunks:
+            return []
+        k = min(k, len(self.chunks))
+        scores = self.scores(query)
+        best = np.argpartition(-scores, k - 1)[:k]
+        return sorted(int(i) for i in best)
+
+    def context(self, query: str, k: int) -> str:
+        """Return the ``k`` best chunks for ``query``, joined in document order."""
+        return "\n\n[...]\n\n".join(self.chunks[i] for i in self.top_k(query, k))
+
+
+_indexes: "OrderedDict[Tuple[str, str, int], BM25Index]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_paper_index(
+    paper_key: Optional[str], text: Union[str, Callable[[], str]], chunk_chars: int, digest: Optional[str] = None
+) -> BM25Index:
+    """Return the index for a paper, building and registering it on first use.
+
+    ``text`` may be a function returning the paper, which is only called when
+    the index has to be built. ``digest`` identifies the text, e.g. its blob
+    reference, so a paper whose text changed under the same key, such as an
+    unversioned arXiv URL, gets a new index; it is computed from the text
+    when not given.
+    """
+    if digest is None:
+        text = text() if callable(text) else text
+        digest = sha256_digest(text.encode())
+    key = (paper_key or "", digest, chunk_chars)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = BM25Index(chunk_paper(text() if callable(text) else text, chunk_chars))
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
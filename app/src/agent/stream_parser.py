@@ -0,0 +1,159 @@
+"""Incremental parsers for the agents' structured responses.
+
+The student answers its first turn with a JSON array of questions and
+later turns with ``<Questions>`` XML. The teacher answers with
+``<Responses>`` XML. These parsers take the completion chunk by chunk and
+return each item as soon as it is complete, so an item can be streamed to
+the client while the model is still writing the rest::
+
+    parser = XmlItemParser("ResponseItem")
+    for chunk in chain.stream({"input": prompt}):
+        for item in parser.feed(chunk.content):
+            ...
+    leftover = parser.close()
+
+They recover from the usual malformed output instead of failing the whole
+response: code fences and chatter around the payload, unquoted keys and
+trailing commas in JSON, a missing closing tag, and a completion cut off in
+the middle of its last item.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_BARE_KEY = re.compile(r'([{,]\s*)([A-Za-z_]\w*)\s*:')
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+def _load_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse one JSON object, repairing bare keys and trailing commas if needed."""
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", _BARE_KEY.sub(r'\1"\2":', text))):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+class JsonItemParser:
+    """Emit the objects of a streamed JSON array one by one.
+
+    Anything outside the objects (fences, brackets, prose) is skipped. An
+    object that cannot be repaired is dropped and counted in ``errors``.
+    """
+
+    def __init__(self, name: str = "item") -> None:
+        """Create a parser whose items are reported under ``name``."""
+        self.name = name
+        self.errors = 0
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _emit(self, text: str) -> List[Dict[str, Any]]:
+        value = _load_object(text)
+        if value is None:
+            self.errors += 1
+            return []
+        return [value]
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add a chunk of the completion; return the objects it completed."""
+        self._buffer += chunk
+        items = []
+        for i in range(self._pos, len(self._buffer)):
+            char = self._buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth:
+                self._in_string = True
+            elif char == "{":
+                if not self._depth:
+                    self._start = i
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    items.extend(self._emit(self._buffer[self._start:i + 1]))
+                    self._start = None
+        self._pos = len(self._buffer)
+        return items
+
+    def close(self) -> List[Dict[str, Any]]:
+        """End the completion; return the object it was cut off in, closed, if it parses."""
+        if self._start is None:
+            return []
+        tail = self._buffer[self._start:].rstrip().rstrip(",")
+        tail += ('"' if self._in_string else "") + "}" * self._depth
+        self._start = None
+        return self._emit(tail)
+
+
+class XmlItemParser:
+    """Emit the text of each ``<tag>...</tag>`` element of a streamed completion.
+
+    An element that is opened again before it is closed ends where the next
+    one starts, and an element still open when the completion ends is
+    emitted as it is.
+    """
+
+    def __init__(self, tag: str, name: Optional[str] = None) -> None:
+        """Create a parser for ``tag`` elements, reported under ``name`` (the lowercased tag by default)."""
+        self.name = name or tag.lower()
+        self._open = f"<{tag}>"
+        self._close = f"</{tag}>"
+        self._buffer = ""
+        self._pos = 0
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add a chunk of the completion; return the elements it completed."""
+        self._buffer += chunk
+        items = []
+        while True:
+            start = self._buffer.find(self._open, self._pos)
+            if start == -1:
+                break
+            body = start + len(self._open)
+            end = self._buffer.find(self._close, body)
+            reopened = self._buffer.find(self._open, body)
+            if reopened != -1 and (end == -1 or reopened < end):
+                items.append(self._buffer[body:reopened].strip())
+                self._pos = reopened
+            elif end != -1:
+                items.append(self._buffer[body:end].strip())
+                self._pos = end + len(self._close)
+            else:
+                break
+        return [item for item in items if item]
+
+    def close(self) -> List[str]:
+        """End the completion; return the element left open, if any."""
+        start = self._buffer.find(self._open, self._pos)
+        self._pos = len(self._buffer)
+        if start == -1:
+            return []
+        item = self._buffer[start + len(self._open):].strip()
+        return [item] if item else []
+
+
+def parse_json_items(text: str) -> List[Dict[str, Any]]:
+    """Parse a whole completion with ``JsonItemParser``."""
+    parser = JsonItemParser()
+    return parser.feed(text) + parser.close()
+
+
+def parse_xml_items(text: str, tag: str) -> List[str]:
+    """Parse a whole completion with ``XmlItemParser``."""
+    parser = XmlItemParser(tag)
+    return parser.feed(text) + parser.close()
@@ -0,0 +1,146 @@
+"""Post-extraction normalization of paper text.
+
+Extracted papers repeat journal running headers and footers ("X. Wang et
+al.", "Knowledge-Based Systems 295 (2024) 111737", page numbers) on every
+page and carry long runs of layout whitespace from multi-column pages. All
+of it is sent to the model on every turn, so it is stripped once, right
+after extraction:
+
+* lines that recur at the top or bottom of many pages are dropped as page
+  furniture wherever they occur, along with the rules that separate pages;
+* runs of column whitespace inside and in front of lines are collapsed;
+* runs of blank lines are collapsed to one.
+
+Fenced code blocks are left untouched.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Set, Tuple
+
+# Rough characters-per-token ratio used for prompt size estimates.
+CHARS_PER_TOKEN = 4
+
+# Lines this close to the top or bottom of a page are header/footer candidates.
+EDGE_LINES = 3
+# A candidate line must recur on at least this fraction of pages.
+MIN_PAGE_FRACTION = 0.3
+
+_PAGE_BREAK = re.compile(r"^[ \t]*(?:-{3,}|\f)[ \t]*$", re.MULTILINE)
+_INNER_WHITESPACE = re.compile(r"(?<=\S)[ \t]{2,}")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_HAS_LETTERS = re.compile(r"[^\W\d_]")
+_COLUMN_GAP = re.compile(r"[ \t]{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of ``text``."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_on_page_breaks(text: str) -> List[str]:
+    """Split extracted text on page breaks (form feeds or horizontal rules)."""
+    return _PAGE_BREAK.split(text)
+
+
+def _furniture_key(line: str) -> str:
+    key = " ".join(line.split())
+    if _HAS_LETTERS.search(key):
+        # Running headers repeat verbatim; "Table 2" and "Table 5" are content.
+        return key
+    # Bare page numbers change from page to page.
+    return re.sub(r"\d+", "#", key)
+
+
+def _edge_lines(page: str, edge_lines: int) -> List[str]:
+    lines = [line for line in page.splitlines() if line.strip()]
+    return lines[:edge_lines] + lines[-edge_lines:]
+
+
+def _furniture(pages: List[str], edge_lines: int, min_page_fraction: float) -> Set[str]:
+    if len(pages) < 2:
+        return set()
+    counts: Counter[str] = Counter()
+    columns: Dict[str, Set[str]] = {}
+    for page in pages:
+        lines = _edge_lines(page, edge_lines)
+        keys = {_furniture_key(line) for line in lines}
+        counts.update(keys)
+        for line in lines:
+            columns.setdefault(_furniture_key(line), set()).update(
+                _furniture_key(part) for part in _COLUMN_GAP.split(line.strip())
+            )
+    min_pages = max(2, math.ceil(min_page_fraction * len(pages)))
+    furniture = {key for key, count in counts.items() if count >= min_pages}
+    # A header laid out in columns ("X. Wang et al.   Journal 295 (2024)") also
+    # shows up one column per line, so its parts are furniture too.
+    for key in list(furniture):
+        furniture.update(part for part in columns.get(key, ()) if len(_HAS_LETTERS.findall(part)) >= 6)
+    return furniture
+
+
+def _clean_page(page: str, furniture: Set[str], edge_lines: int) -> Tuple[List[str], int]:
+    lines = page.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(content[:edge_lines] + content[-edge_lines:])
+    kept = []
+    dropped = 0
+    in_fence = False
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            kept.append(line.strip())
+            continue
+        if in_fence:
+            kept.append(line)
+            continue
+        key = _furniture_key(line)
+        # Running headers also show up mid-page where a page break was lost;
+        # bare numbers are only furniture at a page edge.
+        if key in furniture and (i in edges or _HAS_LETTERS.search(key)):
+            dropped += 1
+            continue
+        line = _INNER_WHITESPACE.sub(" ", line.rstrip())
+        indent = len(line) - len(line.lstrip())
+        # Keep list nesting; wider indents are layout padding, not markdown.
+        kept.append(line.lstrip() if indent > 4 else line)
+    return kept, dropped
+
+
+def clean_pages(
+    pages: List[str],
+    edge_lines: int = EDGE_LINES,
+    min_page_fraction: float = MIN_PAGE_FRACTION,
+) -> Tuple[str, Dict[str, int]]:
+    """Drop page furniture and layout whitespace from per-page text.
+
+    Args:
+        pages: Extracted text, one string per page.
+        edge_lines: Non-empty lines at each end of a page considered header/footer.
+        min_page_fraction: Fraction of pages a header/footer line must recur on.
+
+    Returns:
+        The cleaned document and a dict with ``chars_removed``,
+        ``tokens_removed``, ``furniture_lines`` and ``chars_after``.
+    """
+    original = "\n".join(pages)
+    furniture = _furniture(pages, edge_lines, min_page_fraction)
+    kept_pages = []
+    furniture_lines = 0
+    for page in pages:
+        kept, dropped = _clean_page(page, furniture, edge_lines)
+        kept_pages.append("\n".join(kept))
+        furniture_lines += dropped
+    text = _BLANK_LINES.sub("\n\n", "\n\n".join(kept_pages)).strip() + "\n"
+    return text, {
+        "chars_removed": len(original) - len(text),
+        "tokens_removed": estimate_tokens(original) - estimate_tokens(text),
+        "furniture_lines": furniture_lines,
+        "chars_after": len(text),
+    }
+
+
+def clean_paper_text(text: str, **kwargs: Any) -> Tuple[str, Dict[str, int]]:
+    """Clean a whole extracted document; pages are split on page breaks."""
+    return clean_pages(split_on_page_breaks(text), **kwargs)
@@ -1,19 +1,44 @@
+"""Paper download and text extraction, and the search tools the agents can use.
+
+``extract_pdf_from_url`` and its async twin download a paper through the
+paper cache and convert it to markdown; ``parse_pdf_from_url`` is the
+plain-text tool variant.
+"""
+
+import asyncio
+import logging
+import mmap
 import os
-import requests
-from typing import Any, Dict, List
-import PyPDF2
-import io
-from dotenv import load_dotenv
-load_dotenv()
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List
 
-from langchain_community.tools import WikipediaQueryRun, TavilySearchResults
+import pdfplumber
+import PyPDF2
+from langchain_community.tools import TavilySearchResults, WikipediaQueryRun
 from langchain_community.utilities import WikipediaAPIWrapper
 from langchain_core.tools import tool
-import pdfplumber
-from io import BytesIO
-import time
-import pymupdf4llm
-import pymupdf
+
+from agent.arxiv_id import canonical_pdf_url
+from agent.fetch import (
+    FETCH_TIMEOUT,
+    fetch_bytes,
+    fetch_conditional,
+    get_async_fetcher,
+    get_session,
+)
+from agent.paper_cache import get_paper_cache, sha256_digest
+from agent.pdf_convert import convert_pdf_to_pages
+from agent.text_cleanup import clean_pages
+
+logger = logging.getLogger(__name__)
+
+# Strip running headers/footers and layout whitespace from extracted papers
+PAPER_TEXT_CLEANUP = os.getenv("PAPER_TEXT_CLEANUP", "1") != "0"
+# Pages whose parsed PDF objects stay in memory while extracting text
+PDF_PAGE_WINDOW = int(os.getenv("PDF_PAGE_WINDOW", "16"))
+# Downloads larger than this are spooled to a temporary file instead of memory
+PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
 
 # Initialize Wikipedia Tool
 wikipedia = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
@@ -23,28 +48,122 @@ tavily = TavilySearchResults(max_results=5)
 
 
 
+def _markdown_for_pdf(url: str, pdf_content: bytes) -> str:
+    paper_cache = get_paper_cache()
+    digest = sha256_digest(pdf_content)
+    markdown_text = paper_cache.get_by_digest(digest)
+    if markdown_text is None:
+        pages = convert_pdf_to_pages(pdf_content)
+        if PAPER_TEXT_CLEANUP:
+            markdown_text, cleanup_stats = clean_pages(pages)
+            logger.info(
+                "Paper text cleanup removed %d chars (~%d tokens, %d header/footer lines)",
+                cleanup_stats["chars_removed"], cleanup_stats["tokens_removed"], cleanup_stats["furniture_lines"],
+            )
+        else:
+            markdown_text = "".join(pages)
+    paper_cache.put(url, digest, markdown_text)
+    return markdown_text
+
+
 def extract_pdf_from_url(url: str) -> str:
     """
     Downloads a PDF from the given URL and extracts its text content.
+    Extracted text is cached on disk by URL and by the SHA-256 of the PDF,
+    so a cached URL skips the download and a known PDF skips the conversion.
+    Stale entries are revalidated with a conditional GET, and interrupted
+    downloads resume with a Range request. arXiv URLs of any form (abs, pdf,
+    versioned, mirrors) share one cache entry and download the arxiv.org PDF.
     Args:
         url: The URL of the PDF file.
     Returns:
         The extracted text content of the PDF.
     """
-    print(f"Fetching PDF from URL started: {url}")
+    paper_cache = get_paper_cache()
+    markdown_text = paper_cache.get(url)
+    if markdown_text is not None and paper_cache.is_fresh(url):
+        logger.info("Paper cache hit: %s", url)
+        return markdown_text
+
+    logger.info("Fetching PDF from URL started: %s", url)
     start_time = time.time()
-    response = requests.get(url)
-    response.raise_for_status()
-    pdf_bytes = BytesIO(response.content)
+    if not paper_cache.enabled:
+        pdf_content = fetch_bytes(canonical_pdf_url(url))
+    else:
+        pdf_path = paper_cache.pdf_path(url)
+        modified = fetch_conditional(canonical_pdf_url(url), str(pdf_path))
+        if markdown_text is not None:
+            paper_cache.record_revalidation(modified)
+            if not modified:
+                logger.info("Paper not modified since last fetch: %s", url)
+                return markdown_text
+        pdf_content = pdf_path.read_bytes()
     end_time = time.time()
-    print(f"Fetching PDF from URL finished: {url} in {end_time - start_time:.2f} seconds")
-    doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
-    markdown_text = pymupdf4llm.to_markdown(doc)
-    return markdown_text
+    logger.info("Fetching PDF from URL finished: %s in %.2f seconds", url, end_time - start_time)
+    return _markdown_for_pdf(url, pdf_content)
 
 
+async def aextract_pdf_from_url(url: str) -> str:
+    """Async version of extract_pdf_from_url.
+
+    The download goes through the shared AsyncFetcher, and the cache lookups and
+    the CPU-bound conversion run in a worker thread, so the event loop is never blocked.
+
+    Args:
+        url: The URL of the PDF file.
+
+    Returns:
+        The extracted text content of the PDF.
+    """
+    paper_cache = get_paper_cache()
+    markdown_text = await asyncio.to_thread(paper_cache.get, url)
+    if markdown_text is not None and paper_cache.is_fresh(url):
+        logger.info("Paper cache hit: %s", url)
+        return markdown_text
+
+    logger.info("Fetching PDF from URL started: %s", url)
+    start_time = time.time()
+    fetcher = get_async_fetcher()
+    if not paper_cache.enabled:
+        pdf_content = await fetcher.fetch_bytes(canonical_pdf_url(url))
+    else:
+        pdf_path = paper_cache.pdf_path(url)
+        modified = await fetcher.fetch_conditional(canonical_pdf_url(url), str(pdf_path))
+        if markdown_text is not None:
+            paper_cache.record_revalidation(modified)
+            if not modified:
+                logger.info("Paper not modified since last fetch: %s", url)
+                return markdown_text
+        pdf_content = await asyncio.to_thread(pdf_path.read_bytes)
+    end_time = time.time()
+    logger.info("Fetching PDF from URL finished: %s in %.2f seconds", url, end_time - start_time)
+    return await asyncio.to_thread(_markdown_for_pdf, url, pdf_content)
+
+
+def iter_pdf_pages(stream: Any, page_window: int = PDF_PAGE_WINDOW) -> Iterator[str]:
+    """Yield the text of each page of a PDF as soon as it is extracted.
+
+    PyPDF2 indexes every page when the reader opens (the xref table and one
+    small dictionary per page), so that part of memory still grows with the
+    page count, by a few KB per page. The content streams, fonts and other
+    objects parsed to extract text are what would otherwise pile up for the
+    whole document: they are dropped once each window of pages is done, and
+    each page's dictionary is emptied once its text is out.
+
+    Args:
+        stream: A seekable binary stream holding the PDF.
+        page_window: Number of pages whose parsed objects are kept alive.
+    """
+    reader = PyPDF2.PdfReader(stream)
+    for page_num in range(len(reader.pages)):
+        page = reader.pages[page_num]
+        yield page.extract_text()
+        # The reader keeps every page object; release what this one refers to.
+        page.clear()
+        if (page_num + 1) % page_window == 0:
+            # Parsed objects are re-read from the stream if a later page needs them.
+            reader.resolved_objects.clear()
 
-    
 
 @tool
 def parse_pdf_from_url(pdf_url: str, file_path: str) -> str:
@@ -52,27 +171,22 @@ def parse_pdf_from_url(pdf_url: str, file_path: str) -> str:
     Downloads a PDF from the given URL and extracts its text content.
     Args:
         pdf_url: The URL of the PDF file.
+        file_path: Local PDF path, used when pdf_url is empty.
     Returns:
         The extracted text content of the PDF.
     """
     try:
         if pdf_url:
-            response = requests.get(pdf_url)
-            response.raise_for_status() # Raise an exception for HTTP errors
-            with io.BytesIO(response.content) as pdf_file:
-                reader = PyPDF2.PdfReader(pdf_file)
-                text = ""
-                for page_num in range(len(reader.pages)):
-                    text += reader.pages[page_num].extract_text()
-                return text
+            with get_session().get(pdf_url, stream=True, timeout=FETCH_TIMEOUT) as response:
+                response.raise_for_status() # Raise an exception for HTTP errors
+                with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES) as pdf_file:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        pdf_file.write(chunk)
+                    pdf_file.seek(0)
+                    return "".join(iter_pdf_pages(pdf_file))
         else:
-            with open(file_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page_num in range(len(reader.pages)):
-                    text += reader.pages[page_num].extract_text()
-                return text
-        
+            with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pdf_file:
+                return "".join(iter_pdf_pages(pdf_file))
 
     except Exception as e:
         return f"Error parsing PDF from URL {pdf_url}: {e}"
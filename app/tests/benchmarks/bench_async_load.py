@@ -0,0 +1,113 @@
+"""Concurrent runs on one event loop: async nodes vs the sync nodes they replace.
+
+Starts ``--runs`` discussions at once with ``graph.ainvoke`` against the
+canned LLM of ``bench_checkpoint``, which waits ``--latency`` seconds per
+call like a remote model would. The "sync" graph is the same workflow with
+the async variants stripped, so LangGraph runs every node in a worker
+thread, as it did before. Reports runs per second and the peak number of
+live threads.
+
+    python tests/benchmarks/bench_async_load.py --runs 50 200 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import dataclasses
+import io
+import tempfile
+import threading
+import time
+
+from bench_checkpoint import canned_llm
+from langchain_core.runnables import RunnableLambda
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.chain_registry import set_llm_factory
+from agent.graph import workflow
+from agent.pdf import PDF_TEXT
+from agent.rate_limiter import RateLimiter
+
+
+def slow_llm(latency: float) -> RunnableLambda:
+    def call(prompt_value):
+        time.sleep(latency)
+        return canned_llm(prompt_value)
+
+    async def acall(prompt_value):
+        await asyncio.sleep(latency)
+        return canned_llm(prompt_value)
+
+    return RunnableLambda(call, afunc=acall)
+
+
+def sync_workflow():
+    """The workflow with every node reduced to its sync function."""
+    sync = copy.copy(workflow)
+    sync.nodes = {
+        name: dataclasses.replace(spec, runnable=getattr(spec.runnable, "func", spec.runnable))
+        for name, spec in workflow.nodes.items()
+    }
+    return sync
+
+
+async def load(graph, runs: int, turns: int) -> dict:
+    peak = threading.active_count()
+    done = asyncio.Event()
+
+    async def sample() -> None:
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    sampler = asyncio.create_task(sample())
+    config = {"configurable": {"n_loops": turns}, "recursion_limit": 10 * turns}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(
+            graph.ainvoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config) for _ in range(runs)
+        ))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await sampler
+    return {"runs_per_s": runs / elapsed, "seconds": elapsed, "peak_threads": peak}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    set_llm_factory(lambda model, cached_content=None: slow_llm(args.latency))
+
+    async def fetch(url: str) -> str:
+        return PDF_TEXT
+
+    agents.extract_pdf_from_url = lambda url: PDF_TEXT
+    # The fake model has no quota to protect.
+    unlimited = RateLimiter(rpm=0, tpm=0)
+    agents.get_rate_limiter = lambda: unlimited
+    agents.aextract_pdf_from_url = fetch
+    graphs = {"sync": sync_workflow().compile(), "async": workflow.compile()}
+
+    print(f"{args.turns} turns, {args.latency:.2f} s per LLM call")
+    print(f"{'runs':>6} {'nodes':>6} {'runs/s':>8} {'seconds':>8} {'threads':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(tmp)
+        agents.get_blob_store = lambda: store
+        for runs in args.runs:
+            for name, graph in graphs.items():
+                result = asyncio.run(load(graph, runs, args.turns))
+                print(
+                    f"{runs:>6} {name:>6} {result['runs_per_s']:>8.1f} {result['seconds']:>8.2f} "
+                    f"{result['peak_threads']:>8}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Checkpoint bytes with the paper inline in state vs interned in the blob store.
+
+Runs the agent graph against the canned LLM of ``bench_checkpoint`` and the
+``PDF_TEXT`` fixture. It reports the bytes each saver holds per run, with
+the paper interned (the state holds a ``sha256:`` reference) and inline
+(the state holds the text, as before). The inline case is reproduced with a
+store that hands the text back as its own reference. Interned bytes include
+the blob store, which holds the paper once for all threads.
+
+    python tests/benchmarks/bench_blob_store.py --turns 10 --threads 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+from bench_checkpoint import canned_llm, memory_bytes
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.chain_registry import set_llm_factory
+from agent.checkpoint import SqliteCheckpointSaver
+from agent.graph import workflow
+from agent.pdf import PDF_TEXT
+from agent.rate_limiter import RateLimiter
+
+
+class InlineStore:
+    """Keeps the paper in state: the "reference" is the text itself."""
+
+    def put(self, text: str) -> str:
+        return text
+
+    def get(self, ref: str) -> str:
+        return ref
+
+
+def run(saver, turns: int, threads: int) -> int:
+    graph = workflow.compile(checkpointer=saver)
+    for thread in range(threads):
+        config = {"configurable": {"thread_id": f"bench-{thread}", "n_loops": turns}, "recursion_limit": 10 * turns}
+        with contextlib.redirect_stdout(io.StringIO()):
+            graph.invoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+    if isinstance(saver, SqliteCheckpointSaver):
+        saver.close()
+        return sum(os.path.getsize(saver.path + suffix) for suffix in ("", "-wal") if os.path.exists(saver.path + suffix))
+    return memory_bytes(saver)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="runs on the same paper, each in its own thread")
+    args = parser.parse_args()
+
+    set_llm_factory(lambda model, cached_content=None: RunnableLambda(canned_llm))
+    agents.extract_pdf_from_url = lambda url: PDF_TEXT
+    # The fake model has no quota to protect.
+    unlimited = RateLimiter(rpm=0, tpm=0)
+    agents.get_rate_limiter = lambda: unlimited
+
+    print(f"paper: {len(PDF_TEXT) / 1024:.0f} KB, {args.turns} turns, {args.threads} threads")
+    print(f"{'saver':>8} {'paper':>9} {'KB':>9} {'ratio':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("memory", "sqlite"):
+            sizes = {}
+            blobs = os.path.join(tmp, f"{name}-blobs")
+            for mode, store in (("inline", InlineStore()), ("interned", BlobStore(blobs))):
+                agents.get_blob_store = lambda store=store: store
+                saver = InMemorySaver() if name == "memory" else SqliteCheckpointSaver(os.path.join(tmp, f"{mode}.sqlite"))
+                sizes[mode] = run(saver, args.turns, args.threads)
+                if mode == "interned":
+                    sizes[mode] += sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(blobs) for f in files)
+                ratio = sizes["inline"] / sizes[mode]
+                print(f"{name:>8} {mode:>9} {sizes[mode] / 1024:>9.1f} {ratio:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare checkpoint savers: put/get latency and stored bytes per checkpoint.
+
+Runs the agent graph end to end against a canned LLM and the ``PDF_TEXT``
+fixture, once with the old in-memory ``CustomMemorySaver`` and once with
+``SqliteCheckpointSaver``. Every ``put``/``get_tuple`` call is timed. Stored
+bytes are the serialized payloads the in-memory saver holds, or the size of
+the SQLite database file after the run. Both are divided by the number of
+checkpoints.
+
+    python tests/benchmarks/bench_checkpoint.py --turns 8 20
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent import agents
+from agent.chain_registry import set_llm_factory
+from agent.checkpoint import CustomMemorySaver, SqliteCheckpointSaver
+from agent.graph import workflow
+from agent.pdf import PDF_TEXT
+from agent.rate_limiter import RateLimiter
+
+
+def canned_llm(prompt_value) -> AIMessage:
+    text = prompt_value.to_string()
+    if "Generate 6 questions" in text:
+        questions = [{"title": f"t{i}", "prompt": f"How does dormancy {i} work?", "category": "method"} for i in range(6)]
+        return AIMessage(content=json.dumps(questions))
+    if "Generate 3 questions" in text:
+        return AIMessage(content="<Questions><Question>How is foraging modelled?</Question></Questions>")
+    if "Respond to the questions" in text:
+        return AIMessage(content="<Responses><ResponseItem><Question>q</Question><Response>" + "a" * 1500 + "</Response></ResponseItem></Responses>")
+    return AIMessage(content="<Summary>So far.</Summary><Instructions><Instruction><Student>Ask deeper.</Student><Teacher>Cite sections.</Teacher></Instruction></Instructions>")
+
+
+def timed(saver, name: str, samples: list) -> None:
+    method = getattr(saver, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = method(*args, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+        return result
+
+    setattr(saver, name, wrapper)
+
+
+def memory_bytes(saver: CustomMemorySaver) -> int:
+    checkpoints = sum(
+        len(checkpoint[1]) + len(metadata[1])
+        for namespaces in saver.storage.values()
+        for checkpoints_ in namespaces.values()
+        for checkpoint, metadata, _ in checkpoints_.values()
+    )
+    blobs = sum(len(value[1]) for value in saver.blobs.values())
+    writes = sum(len(write[2][1]) for writes_ in saver.writes.values() for write in writes_.values())
+    return checkpoints + blobs + writes
+
+
+def run(saver, turns: int) -> dict:
+    puts, gets = [], []
+    timed(saver, "put", puts)
+    timed(saver, "get_tuple", gets)
+    graph = workflow.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "bench", "n_loops": turns}, "recursion_limit": 10 * turns}
+    # The nodes print progress on every turn.
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph.invoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+    for snapshot in graph.get_state_history(config):
+        saver.get_tuple(snapshot.config)
+    if isinstance(saver, SqliteCheckpointSaver):
+        saver.close()
+        size = sum(os.path.getsize(saver.path + suffix) for suffix in ("", "-wal") if os.path.exists(saver.path + suffix))
+    else:
+        size = memory_bytes(saver)
+    return {
+        "checkpoints": len(puts),
+        "put_ms": statistics.median(puts),
+        "get_ms": statistics.median(gets),
+        "kb_per_checkpoint": size / 1024 / len(puts),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[8, 20])
+    args = parser.parse_args()
+
+    set_llm_factory(lambda model, cached_content=None: RunnableLambda(canned_llm))
+    agents.extract_pdf_from_url = lambda url: PDF_TEXT
+    # The fake model has no quota to protect.
+    unlimited = RateLimiter(rpm=0, tpm=0)
+    agents.get_rate_limiter = lambda: unlimited
+
+    print(f"{'turns':>6} {'saver':>8} {'checkpoints':>12} {'put ms':>8} {'get ms':>8} {'KB/ckpt':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for turns in args.turns:
+            savers = {
+                "memory": CustomMemorySaver(),
+                "sqlite": SqliteCheckpointSaver(os.path.join(tmp, f"bench-{turns}.sqlite")),
+            }
+            for name, saver in savers.items():
+                result = run(saver, turns)
+                print(
+                    f"{turns:>6} {name:>8} {result['checkpoints']:>12} {result['put_ms']:>8.2f} "
+                    f"{result['get_ms']:>8.2f} {result['kb_per_checkpoint']:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark paper downloads against a local HTTP stand-in.
+
+Serves a payload the size of ``app/pdf.txt`` from a threaded local server
+with a fixed per-request latency, then downloads it ``--requests`` times
+with bare ``requests.get`` calls, the shared ``requests.Session`` and the
+pooled ``AsyncFetcher``.
+
+    python tests/benchmarks/bench_fetch.py --requests 32 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+from agent.fetch import AsyncFetcher, fetch_bytes
+
+PAYLOAD_PATH = Path(__file__).resolve().parents[2] / "pdf.txt"
+
+
+def start_server(payload: bytes, latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(label: str, count: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed:>8.3f}s {count / elapsed:>9.1f} req/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--per-host-limit", type=int, default=8)
+    args = parser.parse_args()
+
+    payload = PAYLOAD_PATH.read_bytes()
+    server = start_server(payload, args.latency)
+    url = f"http://127.0.0.1:{server.server_address[1]}/paper.pdf"
+    print(f"payload {len(payload)} bytes, {args.requests} requests, {args.latency * 1000:.0f} ms latency")
+
+    def bare_requests() -> None:
+        for _ in range(args.requests):
+            requests.get(url).content
+
+    def shared_session() -> None:
+        for _ in range(args.requests):
+            fetch_bytes(url)
+
+    async def pooled_async() -> None:
+        fetcher = AsyncFetcher(per_host_limit=args.per_host_limit)
+        await asyncio.gather(*(fetcher.fetch_bytes(url) for _ in range(args.requests)))
+        await fetcher.aclose()
+
+    timed("requests.get", args.requests, bare_requests)
+    timed("shared session", args.requests, shared_session)
+    timed(f"async x{args.per_host_limit}", args.requests, lambda: asyncio.run(pooled_async()))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
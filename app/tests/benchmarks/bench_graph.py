@@ -0,0 +1,245 @@
+"""End-to-end and per-node cost of a discussion run.
+
+Drives the compiled graph over a grid of ``--n-loops``, ``--k-interval``
+and paper sizes (the ``PDF_TEXT`` fixture repeated or cut to ``--paper-kb``)
+with a fake LLM that answers every prompt in the format it asks for, or with
+a recorded cassette (``--cassette``, see ``agent.cassette``). Each case
+reports:
+
+* wall time per node (initial, student, teacher, observer, cleanup)
+* prompt bytes and estimated tokens per model call, and per node
+* serialized state size after every superstep
+* checkpoint writes to a fresh SQLite saver: time per put, bytes per checkpoint
+
+``--output`` writes the results as JSON, one case per line. ``--baseline``
+compares the deterministic metrics (prompt bytes and tokens, state and
+checkpoint sizes) with an earlier output and exits with status 1 if any grew
+by more than ``--tolerance``. Times depend on the machine and its load, so
+they are only compared with ``--compare-times``, and then only when they also
+grew by more than ``--min-ms``. ``bench_graph_baseline.json`` holds the
+default grid::
+
+    python tests/benchmarks/bench_graph.py --baseline tests/benchmarks/bench_graph_baseline.json
+    python tests/benchmarks/bench_graph.py --n-loops 8 32 --paper-kb 100 400 --output bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.config import get_config
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.cassette import Cassette, synthesize
+from agent.chain_registry import set_llm_factory
+from agent.checkpoint import SqliteCheckpointSaver
+from agent.graph import workflow
+from agent.pdf import PDF_TEXT
+from agent.rate_limiter import RateLimiter
+
+# Metrics where lower is better. Sizes are the same on every machine; times are not.
+SIZES = ("prompt_bytes", "prompt_tokens", "state_bytes", "checkpoint_bytes")
+TIMES = ("wall_ms", "node_ms", "put_ms")
+
+
+def paper(kb: int) -> str:
+    size = kb * 1024
+    return (PDF_TEXT * (size // len(PDF_TEXT) + 1))[:size]
+
+
+def fake_llm(calls: List[Dict[str, Any]], cassette: Any = None):
+    """Answer like ``agent.cassette.synthesize`` (or a cassette) and log each prompt."""
+    replay = cassette.llm_factory() if cassette else None
+
+    def factory(model, cached_content=None):
+        replayed = replay(model) if replay else None
+
+        def respond(prompt_value) -> AIMessage:
+            prompt = prompt_value.to_string()
+            calls.append({
+                "node": get_config()["metadata"].get("langgraph_node"),
+                "bytes": len(prompt.encode()),
+                # About four characters a token, as in agent.model_stats.
+                "tokens": len(prompt) // 4,
+            })
+            if replayed:
+                return replayed.invoke(prompt_value)
+            return AIMessage(content=synthesize(prompt))
+
+        return RunnableLambda(respond)
+
+    return factory
+
+
+def run_case(n_loops: int, k_interval: int, paper_kb: int, tmp: str, cassette: Any = None) -> Dict[str, Any]:
+    calls: List[Dict[str, Any]] = []
+    set_llm_factory(fake_llm(calls, cassette))
+    text = paper(paper_kb)
+    agents.extract_pdf_from_url = lambda url: text
+    store = BlobStore(os.path.join(tmp, f"blobs-{n_loops}-{k_interval}-{paper_kb}"))
+    agents.get_blob_store = lambda: store
+
+    saver = SqliteCheckpointSaver(os.path.join(tmp, f"{n_loops}-{k_interval}-{paper_kb}.sqlite"))
+    puts: List[float] = []
+    put = saver.put
+
+    def timed_put(*args, **kwargs):
+        start = time.perf_counter()
+        result = put(*args, **kwargs)
+        puts.append((time.perf_counter() - start) * 1000)
+        return result
+
+    saver.put = timed_put
+    graph = workflow.compile(checkpointer=saver)
+    serde = JsonPlusSerializer()
+    config = {
+        "configurable": {"thread_id": "bench", "n_loops": n_loops, "k_interval": k_interval},
+        "recursion_limit": 10 * n_loops,
+    }
+
+    node_ms: Dict[str, List[float]] = {}
+    started: Dict[str, float] = {}
+    state_bytes: List[int] = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for mode, chunk in graph.stream({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config, stream_mode=["tasks", "values"]):
+            if mode == "values":
+                state_bytes.append(len(serde.dumps_typed(chunk)[1]))
+            elif "result" in chunk or "error" in chunk:
+                node_ms.setdefault(chunk["name"], []).append((time.perf_counter() - started.pop(chunk["id"])) * 1000)
+            else:
+                started[chunk["id"]] = time.perf_counter()
+    wall_ms = (time.perf_counter() - start) * 1000
+    saver.close()
+    db_bytes = sum(os.path.getsize(saver.path + suffix) for suffix in ("", "-wal") if os.path.exists(saver.path + suffix))
+
+    prompts: Dict[str, Dict[str, float]] = {}
+    for node in sorted({call["node"] for call in calls}):
+        sizes = [call["bytes"] for call in calls if call["node"] == node]
+        prompts[node] = {
+            "calls": len(sizes),
+            "mean_bytes": statistics.mean(sizes),
+            "max_bytes": max(sizes),
+            "tokens": sum(call["tokens"] for call in calls if call["node"] == node),
+        }
+    return {
+        "case": {"n_loops": n_loops, "k_interval": k_interval, "paper_kb": paper_kb},
+        "summary": {
+            "wall_ms": wall_ms,
+            "node_ms": {node: sum(samples) for node, samples in node_ms.items()},
+            "prompt_bytes": sum(call["bytes"] for call in calls),
+            "prompt_tokens": sum(call["tokens"] for call in calls),
+            "state_bytes": max(state_bytes, default=0),
+            "put_ms": statistics.median(puts) if puts else 0.0,
+            "checkpoint_bytes": db_bytes / max(1, len(puts)),
+        },
+        "nodes": {node: {"calls": len(samples), "p50_ms": statistics.median(samples)} for node, samples in node_ms.items()},
+        "prompts": prompts,
+        "prompt_bytes_per_call": [call["bytes"] for call in calls],
+        "state_bytes_per_superstep": state_bytes,
+        "checkpoints": len(puts),
+    }
+
+
+def flatten(summary: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in summary.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def case_key(case: Dict[str, Any]) -> str:
+    return f"n{case['n_loops']}-k{case['k_interval']}-{case['paper_kb']}kb"
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float, times: bool = False, min_ms: float = 5.0
+) -> List[str]:
+    """Metrics that grew by more than ``tolerance`` over the baseline.
+
+    Times are only compared if ``times`` is set, and must also have grown by
+    more than ``min_ms``.
+    """
+    compared = SIZES + TIMES if times else SIZES
+    previous = {case_key(result["case"]): flatten(result["summary"]) for result in baseline}
+    regressions = []
+    print(f"\n{'case':>18} {'metric':>24} {'baseline':>12} {'now':>12} {'ratio':>7}")
+    for result in results:
+        key = case_key(result["case"])
+        if key not in previous:
+            continue
+        for metric, value in flatten(result["summary"]).items():
+            old = previous[key].get(metric)
+            if not old or not metric.startswith(compared):
+                continue
+            ratio = value / old
+            grew = ratio > tolerance and (not metric.startswith(TIMES) or value - old > min_ms)
+            flag = " !" if grew else ""
+            print(f"{key:>18} {metric:>24} {old:>12.1f} {value:>12.1f} {ratio:>6.2f}x{flag}")
+            if flag:
+                regressions.append(f"{key} {metric}: {old:.1f} -> {value:.1f}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-loops", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--k-interval", type=int, nargs="+", default=[3])
+    parser.add_argument("--paper-kb", type=int, nargs="+", default=[40, 160, 640])
+    parser.add_argument("--cassette", help="replay a recorded cassette instead of synthesized answers")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="ratio over the baseline counted as a regression")
+    parser.add_argument("--compare-times", action="store_true", help="also compare times with the baseline")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="smallest growth in a time counted as a regression")
+    args = parser.parse_args()
+
+    # The fake model has no quota to protect.
+    unlimited = RateLimiter(rpm=0, tpm=0)
+    agents.get_rate_limiter = lambda: unlimited
+    cassette = Cassette(args.cassette) if args.cassette else None
+
+    results = []
+    print(f"{'n_loops':>7} {'k':>3} {'paper KB':>8} {'wall ms':>9} {'prompt KB':>10} {'tokens':>8} {'state KB':>9} {'put ms':>7} {'KB/ckpt':>8}  node ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_loops, k_interval, paper_kb in itertools.product(args.n_loops, args.k_interval, args.paper_kb):
+            result = run_case(n_loops, k_interval, paper_kb, tmp, cassette)
+            results.append(result)
+            summary = result["summary"]
+            nodes = " ".join(f"{node}={ms:.0f}" for node, ms in summary["node_ms"].items())
+            print(
+                f"{n_loops:>7} {k_interval:>3} {paper_kb:>8} {summary['wall_ms']:>9.0f} "
+                f"{summary['prompt_bytes'] / 1024:>10.1f} {summary['prompt_tokens']:>8} "
+                f"{summary['state_bytes'] / 1024:>9.1f} {summary['put_ms']:>7.2f} "
+                f"{summary['checkpoint_bytes'] / 1024:>8.1f}  {nodes}"
+            )
+    set_llm_factory(None)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write("[\n" + ",\n".join(json.dumps(result) for result in results) + "\n]\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.compare_times, args.min_ms)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
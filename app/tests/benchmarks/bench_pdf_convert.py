@@ -0,0 +1,53 @@
+"""Benchmark parallel PDF-to-markdown conversion.
+
+Builds a synthetic paper from the ``PDF_TEXT`` fixture and converts it with
+1, 2, 4 and 8 workers, reporting the speedup over the serial conversion.
+
+    python tests/benchmarks/bench_pdf_convert.py --pages 40
+"""
+
+import argparse
+import time
+
+import pymupdf
+
+from agent.pdf import PDF_TEXT
+from agent.pdf_convert import convert_pdf_to_markdown, shutdown_executor
+
+
+def build_pdf(pages: int) -> bytes:
+    lines = [line.strip() for line in PDF_TEXT.splitlines() if line.strip()]
+    per_page = 60
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        start = (page_num * per_page) % max(len(lines) - per_page, 1)
+        page.insert_text((40, 40), f"Section {page_num + 1}", fontsize=14)
+        page.insert_text((40, 70), "\n".join(lines[start:start + per_page]), fontsize=8)
+    return doc.tobytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_bytes = build_pdf(args.pages)
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+    for workers in (1, 2, 4, 8):
+        # Warm the pool so process start-up is not part of the measurement.
+        convert_pdf_to_markdown(pdf_bytes, max_workers=workers, min_pages=1)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            convert_pdf_to_markdown(pdf_bytes, max_workers=workers, min_pages=1)
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>9.3f} {baseline / best:>7.2f}x")
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare teacher prompt size and latency: full paper vs retrieved chunks.
+
+Uses the ``PDF_TEXT`` fixture and a fixed set of student questions. For
+each chunk size and top-k it reports the estimated tokens of paper context
+per teacher turn and the time to build the index and to retrieve. With
+``--live`` it also times real teacher calls against Gemini (needs
+``GOOGLE_API_KEY``).
+
+    python tests/benchmarks/bench_retrieval.py --live
+"""
+
+import argparse
+import time
+
+from agent.pdf import PDF_TEXT
+from agent.retrieval import BM25Index, chunk_paper
+from agent.text_cleanup import clean_paper_text, estimate_tokens
+
+QUESTIONS = [
+    "How does the dormancy mechanism balance exploration and exploitation?",
+    "What role does the foraging factor play in autotrophic and heterotrophic foraging?",
+    "How does APO perform against other algorithms on the CEC2022 benchmark?",
+    "Which engineering design problems were used and how were constraints handled?",
+    "What statistical tests support the claimed superiority of APO?",
+    "How sensitive is APO to the proportion fraction and reproduction probability?",
+]
+
+
+def live_latency(context: str) -> float:
+    from agent.chain_registry import get_llm
+    from agent.create_chain import create_agent_chain
+    from agent.prompts import TEACHER_AGENT_PROMPT
+
+    chain = create_agent_chain(get_llm(), TEACHER_AGENT_PROMPT)
+    start = time.perf_counter()
+    chain.invoke({"input": f"Answer briefly: {QUESTIONS[0]}\n\n#Arxiv Paper#\n{context}\n#End Arxiv Paper#"})
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="also time real Gemini teacher calls")
+    args = parser.parse_args()
+
+    paper, _ = clean_paper_text(PDF_TEXT)
+    full_tokens = estimate_tokens(paper)
+    print(f"full paper: ~{full_tokens} tokens per teacher turn")
+    if args.live:
+        print(f"full paper live latency: {live_latency(paper):.2f}s")
+
+    print(f"{'chunk':>6} {'k':>3} {'chunks':>7} {'build ms':>9} {'query ms':>9} {'tokens':>7} {'ratio':>6}")
+    for chunk_chars in (800, 1500, 3000):
+        start = time.perf_counter()
+        index = BM25Index(chunk_paper(paper, chunk_chars))
+        build_ms = (time.perf_counter() - start) * 1000
+        for k in (3, 6, 10):
+            start = time.perf_counter()
+            contexts = [index.context(question, k) for question in QUESTIONS]
+            query_ms = (time.perf_counter() - start) * 1000 / len(QUESTIONS)
+            tokens = sum(estimate_tokens(context) for context in contexts) // len(contexts)
+            print(
+                f"{chunk_chars:>6} {k:>3} {len(index.chunks):>7} {build_ms:>9.1f} "
+                f"{query_ms:>9.2f} {tokens:>7} {tokens / full_tokens:>6.1%}"
+            )
+            if args.live and (chunk_chars, k) == (1500, 6):
+                print(f"{'':>6} live latency: {live_latency(contexts[0]):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
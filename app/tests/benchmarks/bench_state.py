@@ -0,0 +1,94 @@
+"""Compare how graph state grows per turn: copied message lists vs add_messages.
+
+Before, ``AgentState.messages`` was a plain list and every node returned
+``messages + [new_message]``, so each step wrote a full copy of the history.
+Now the channel uses the ``add_messages`` reducer and nodes return only the
+new message. This runs a one-node loop with the same state shape both ways,
+checkpointed with ``InMemorySaver``. For each run length it reports the bytes
+written per step at the last turn, the total bytes held by the saver, and the
+time per step.
+
+    python tests/benchmarks/bench_state.py --turns 100 200 400
+"""
+
+import argparse
+import time
+from typing import Annotated, Any, TypedDict
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+# Roughly the size of one teacher response.
+MESSAGE = "<Responses>" + "x" * 1500 + "</Responses>"
+
+
+class CopyState(TypedDict):
+    messages: list[Any]
+    current_turn: int
+
+
+class AppendState(TypedDict):
+    messages: Annotated[list[Any], add_messages]
+    current_turn: int
+
+
+def build(append: bool, turns: int):
+    def node(state):
+        message = AIMessage(content=MESSAGE, name="Teacher")
+        messages = [message] if append else state.get("messages", []) + [message]
+        return {"messages": messages, "current_turn": state.get("current_turn", 0) + 1}
+
+    workflow = StateGraph(AppendState if append else CopyState)
+    workflow.add_node("turn", node)
+    workflow.add_edge(START, "turn")
+    workflow.add_conditional_edges("turn", lambda state: "turn" if state["current_turn"] < turns else END)
+    saver = InMemorySaver()
+    return workflow.compile(checkpointer=saver), saver
+
+
+def write_bytes(saver: InMemorySaver, checkpoint_id: str) -> int:
+    writes = saver.writes.get(("bench", "", checkpoint_id), {})
+    return sum(len(value[1]) for _, _, value, _ in writes.values())
+
+
+def saver_bytes(saver: InMemorySaver) -> int:
+    blobs = sum(len(value[1]) for value in saver.blobs.values())
+    writes = sum(write_bytes(saver, key[2]) for key in saver.writes)
+    return blobs + writes
+
+
+def run(append: bool, turns: int) -> dict:
+    graph, saver = build(append, turns)
+    config = {"configurable": {"thread_id": "bench"}, "recursion_limit": turns + 10}
+    start = time.perf_counter()
+    graph.invoke({"messages": [], "current_turn": 0}, config)
+    elapsed = time.perf_counter() - start
+    # The write of the last step is held against its parent checkpoint.
+    history = list(graph.get_state_history(config))
+    last_write = max(write_bytes(saver, snapshot.config["configurable"]["checkpoint_id"]) for snapshot in history[:3])
+    return {
+        "last_write_kb": last_write / 1024,
+        "saver_mb": saver_bytes(saver) / 2**20,
+        "step_ms": elapsed * 1000 / turns,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[50, 100, 200, 400])
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'reducer':>12} {'write/step KB':>14} {'saver MB':>9} {'ms/step':>8}")
+    for turns in args.turns:
+        for append in (False, True):
+            result = run(append, turns)
+            print(
+                f"{turns:>6} {'add_messages' if append else 'copy':>12} {result['last_write_kb']:>14.1f} "
+                f"{result['saver_mb']:>9.1f} {result['step_ms']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,89 @@
+import json
+
 import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+
+from agent.chain_registry import set_llm_factory
+
+REPLIES = {
+    "questions": json.dumps([{"title": "t", "prompt": f"Q{i}?", "category": "c"} for i in range(6)]),
+    "follow_up": "<Questions><Question>Why?</Question></Questions>",
+    "responses": "<Responses><ResponseItem><Question>Why?</Question><Response>A</Response></ResponseItem></Responses>",
+    "observer": "<Summary>S</Summary><Instructions><Instruction><Student>Dig.</Student><Teacher>Cite.</Teacher></Instruction></Instructions>",
+}
+
+
+class FakeLLM:
+    """Fake model that answers each agent prompt with a canned reply.
+
+    Replies are strings or ``AIMessage``s keyed as in ``REPLIES``. Every call
+    records the model it went to and the prompt it was sent.
+    """
+
+    def __init__(self, **replies):
+        self.replies = {**REPLIES, **replies}
+        self.func = self.reply
+        self.afunc = None
+        self.chunk_size = 0
+        self.models = []
+        self.prompts = []
+
+    def reply(self, prompt_value) -> AIMessage:
+        text = prompt_value.to_string()
+        if "Generate 6 questions" in text:
+            kind = "questions"
+        elif "Generate 3 questions" in text:
+            kind = "follow_up"
+        elif "Respond to the questions" in text:
+            kind = "responses"
+        else:
+            kind = "observer"
+        reply = self.replies[kind]
+        return reply if isinstance(reply, AIMessage) else AIMessage(content=reply)
+
+    def use(self, func=None, afunc=None, chunk_size=0, **replies) -> None:
+        """Install this model, answering with ``func``/``afunc`` instead of ``reply`` if given.
+
+        A ``chunk_size`` streams replies in chunks of that many characters.
+        """
+        self.replies.update(replies)
+        self.func = func or self.reply
+        self.afunc = afunc
+        self.chunk_size = chunk_size
+        set_llm_factory(self.factory)
+
+    def factory(self, model, cached_content=None):
+        def call(prompt_value):
+            self.models.append(model)
+            self.prompts.append(prompt_value.to_string())
+            return self.func(prompt_value)
+
+        async def acall(prompt_value):
+            self.models.append(model)
+            self.prompts.append(prompt_value.to_string())
+            return await self.afunc(prompt_value)
+
+        def stream(inputs):
+            for prompt_value in inputs:
+                content = call(prompt_value).content
+                for i in range(0, len(content), self.chunk_size):
+                    yield AIMessageChunk(content=content[i:i + self.chunk_size])
+
+        if self.chunk_size:
+            return RunnableGenerator(stream)
+        return RunnableLambda(call, afunc=acall if self.afunc else None)
 
 
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture
+def fake_llm(request):
+    """Run every chain on a ``FakeLLM``; parametrize indirectly with reply overrides."""
+    llm = FakeLLM()
+    llm.use(**getattr(request, "param", {}))
+    yield llm
+    set_llm_factory(None)
@@ -1,3 +1,5 @@
+import uuid
+
 import pytest
 
 from agent import graph
@@ -6,7 +8,11 @@ pytestmark = pytest.mark.anyio
 
 
 @pytest.mark.langsmith
-async def test_agent_simple_passthrough() -> None:
-    inputs = {"changeme": "some_val"}
-    res = await graph.ainvoke(inputs)
-    assert res is not None
+async def test_agent_discusses_paper() -> None:
+    # Runs live against Gemini and arXiv; set LLM_CASSETTE to replay a
+    # recorded run offline instead, see agent.cassette.
+    inputs = {"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}
+    config = {"configurable": {"thread_id": uuid.uuid4().hex, "n_loops": 4, "k_interval": 3}}
+    res = await graph.ainvoke(inputs, config)
+    assert not res.get("error")
+    assert [message.name for message in res["messages"]] == ["Student", "Teacher", "Student", "Observer"]
@@ -0,0 +1,36 @@
+import pytest
+
+from agent.arxiv_id import (
+    ArxivId,
+    canonical_pdf_url,
+    normalize_url,
+    paper_key,
+    parse_arxiv_id,
+)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://arxiv.org/abs/2401.12345v2",
+        "https://arxiv.org/pdf/2401.12345v2",
+        "https://arxiv.org/pdf/2401.12345v2.pdf",
+        "http://www.arxiv.org/abs/2401.12345v2/",
+        "https://export.arxiv.org/abs/2401.12345v2",
+        "arXiv:2401.12345v2",
+    ],
+)
+def test_url_variants_share_one_key(url: str) -> None:
+    assert paper_key(url) == "arxiv:2401.12345v2"
+
+
+def test_unversioned_and_old_style_ids() -> None:
+    assert parse_arxiv_id("https://arxiv.org/abs/2401.12345") == ArxivId("2401.12345")
+    assert parse_arxiv_id("https://arxiv.org/abs/hep-th/9901001v3") == ArxivId("hep-th/9901001", 3)
+    assert canonical_pdf_url("https://arxiv.org/abs/2401.12345") == "https://arxiv.org/pdf/2401.12345"
+
+
+def test_non_arxiv_urls_fall_back_to_normalized_url() -> None:
+    assert parse_arxiv_id("https://example.org/pdf/2401.12345") is None
+    assert paper_key("HTTP://Example.org/paper.pdf/#page=2") == normalize_url("https://example.org/paper.pdf")
+    assert canonical_pdf_url("https://example.org/paper.pdf") == "https://example.org/paper.pdf"
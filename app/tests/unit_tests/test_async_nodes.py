@@ -0,0 +1,70 @@
+import asyncio
+import contextlib
+import io
+import threading
+
+import pytest
+
+from agent import agents
+from agent.blob_store import BlobStore
+
+
+@pytest.fixture
+def fake_run(fake_llm, monkeypatch, tmp_path):
+    calls = {"sync": 0, "async": 0}
+
+    def call(prompt_value):
+        calls["sync"] += 1
+        return fake_llm.reply(prompt_value)
+
+    async def acall(prompt_value):
+        calls["async"] += 1
+        await asyncio.sleep(0)
+        return fake_llm.reply(prompt_value)
+
+    async def fetch(url):
+        return "paper"
+
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(agents, "get_blob_store", lambda: store)
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: "paper")
+    monkeypatch.setattr(agents, "aextract_pdf_from_url", fetch)
+    fake_llm.use(call, acall)
+    return calls
+
+
+@pytest.mark.anyio
+async def test_ainvoke_awaits_the_model_and_matches_invoke(fake_run) -> None:
+    from agent.graph import workflow
+
+    graph = workflow.compile()
+    config = {"configurable": {"n_loops": 6, "k_interval": 3}}
+    url = {"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = graph.invoke(url, config)
+        sync_calls = fake_run["sync"]
+        result = await graph.ainvoke(url, config)
+
+    assert fake_run["sync"] == sync_calls and fake_run["async"] == sync_calls
+    assert [(m.name, m.content) for m in result["messages"]] == [(m.name, m.content) for m in expected["messages"]]
+    assert result["observer_insights"] == expected["observer_insights"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("teacher_fanout", [False, True])
+async def test_async_nodes_read_the_paper_off_the_event_loop(fake_run, monkeypatch, teacher_fanout) -> None:
+    from agent.graph import workflow
+
+    loop_thread = threading.get_ident()
+    reads = []
+    paper_text = agents.paper_text
+
+    def record(state):
+        reads.append(threading.get_ident())
+        return paper_text(state)
+
+    monkeypatch.setattr(agents, "paper_text", record)
+    config = {"configurable": {"n_loops": 3, "k_interval": 5, "teacher_context": "full", "teacher_fanout": teacher_fanout}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        await workflow.compile().ainvoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+    assert reads and loop_thread not in reads
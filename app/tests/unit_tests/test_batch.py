@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import io
+import json
+import sqlite3
+
+import pytest
+
+from agent import agents
+from agent.arxiv_id import paper_key
+from agent.batch import arun_batch, read_results, thread_id
+from agent.blob_store import BlobStore
+from agent.checkpoint import SqliteCheckpointSaver
+
+URLS = [f"https://arxiv.org/abs/2401.0000{i}" for i in range(3)]
+CONFIG = {"n_loops": 4, "k_interval": 3}
+
+
+@pytest.fixture
+def papers(fake_llm, monkeypatch, tmp_path):
+    broken = {URLS[2]}
+
+    async def fetch(url):
+        if url in broken:
+            raise RuntimeError("download failed")
+        return f"paper {url}"
+
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path / "blobs")))
+    monkeypatch.setattr(agents, "aextract_pdf_from_url", fetch)
+    return broken
+
+
+def graph(tmp_path):
+    from agent.graph import workflow
+
+    return workflow.compile(checkpointer=SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite")))
+
+
+@pytest.mark.anyio
+async def test_batch_writes_results_and_retries_failures(papers, tmp_path) -> None:
+    output = str(tmp_path / "results.jsonl")
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = await arun_batch(
+            URLS + URLS[:1] + [URLS[1].replace("/abs/", "/pdf/") + ".pdf"], output, concurrency=2, configurable=CONFIG, graph=graph(tmp_path)
+        )
+
+    # Each paper ran once, whichever URL form it was listed under.
+    assert (report["papers"], report["ok"], report["failed"]) == (3, 2, 1)
+    assert report["papers_per_hour"] > 0
+    assert {"initial", "student", "teacher", "observer"} <= set(report["nodes"])
+    assert report["nodes"]["student"]["count"] == 4 and report["nodes"]["student"]["p95_ms"] >= 0
+    results = [json.loads(line) for line in open(output)]
+    failed = next(result for result in results if result["status"] == "failed")
+    assert failed["url"] == URLS[2] and "download failed" in failed["error"]
+    assert all(result["turns"] == 4 for result in results if result["status"] == "ok")
+
+    # On restart only the failed paper runs again, in a fresh thread, under any of its URLs.
+    papers.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = await arun_batch(URLS[:2] + ["2401.00002"], output, configurable=CONFIG, graph=graph(tmp_path))
+    assert (report["papers"], report["ok"], report["skipped"]) == (1, 1, 2)
+    retried = json.loads(open(output).readlines()[-1])
+    assert retried["url"] == "2401.00002" and retried["thread_id"] == thread_id(URLS[2], 1)
+    assert read_results(output)[0] == {paper_key(url) for url in URLS}
+
+
+@pytest.mark.anyio
+async def test_interrupted_batch_resumes_from_checkpoints(papers, fake_llm, tmp_path) -> None:
+    prompts = []
+    stuck = asyncio.Event()
+
+    async def hang_on_teacher(prompt_value):
+        prompts.append(prompt_value.to_string())
+        if "Respond to the questions" in prompts[-1]:
+            stuck.set()
+            await asyncio.Event().wait()
+        return fake_llm.reply(prompt_value)
+
+    fake_llm.use(afunc=hang_on_teacher)
+    output = str(tmp_path / "results.jsonl")
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch = asyncio.create_task(arun_batch(URLS[:1], output, configurable=CONFIG, graph=graph(tmp_path)))
+        await stuck.wait()
+        batch.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await batch
+    assert read_results(output) == (set(), {})
+
+    fake_llm.use()
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = await arun_batch(URLS[:1], output, configurable=CONFIG, graph=graph(tmp_path))
+    assert report["ok"] == 1
+    # The opening questions were not asked again.
+    assert "initial" not in report["nodes"]
+    assert [report["nodes"][node]["count"] for node in ("teacher", "student", "observer")] == [1, 1, 1]
+
+
+@pytest.mark.anyio
+async def test_errors_outside_the_graph_run_are_failed_results(papers, tmp_path) -> None:
+    compiled = graph(tmp_path)
+
+    class LockedGraph:
+        checkpointer = compiled.checkpointer
+
+        async def aget_state(self, config):
+            if config["configurable"]["thread_id"] == thread_id(URLS[0]):
+                raise sqlite3.OperationalError("database is locked")
+            return await compiled.aget_state(config)
+
+        def astream(self, *args, **kwargs):
+            return compiled.astream(*args, **kwargs)
+
+    output = str(tmp_path / "results.jsonl")
+    report = await arun_batch(URLS[:2], output, configurable=CONFIG, graph=LockedGraph())
+    assert (report["ok"], report["failed"]) == (1, 1)
+    failed = next(json.loads(line) for line in open(output) if '"failed"' in line)
+    assert failed["url"] == URLS[0] and failed["error"] == "database is locked"
@@ -0,0 +1,53 @@
+import os
+import time
+
+import pytest
+
+from agent.blob_store import BlobStore, is_ref
+
+
+def test_put_is_content_addressed_and_deduplicated(tmp_path) -> None:
+    store = BlobStore(str(tmp_path))
+    paper = "# Protozoa\n" * 5000
+    ref = store.put(paper)
+    assert is_ref(ref)
+    assert store.put(paper) == ref
+    assert len(list(tmp_path.rglob("*.zst"))) == 1
+    assert sum(f.stat().st_size for f in tmp_path.rglob("*.zst")) < len(paper) / 10
+    assert store.stats()["dedup_hits"] == 1
+
+
+def test_get_hydrates_from_disk_and_caches(tmp_path) -> None:
+    ref = BlobStore(str(tmp_path)).put("paper text")
+    store = BlobStore(str(tmp_path), cache_items=1)
+    assert store.get(ref) == "paper text"
+    assert store.get(ref) == "paper text"
+    assert store.stats() == {"puts": 0, "dedup_hits": 0, "reads": 1, "cache_hits": 1, "evictions": 0}
+    with pytest.raises(KeyError):
+        store.get("sha256:" + "0" * 64)
+
+
+def test_least_recently_used_and_old_blobs_are_evicted(tmp_path) -> None:
+    store = BlobStore(str(tmp_path), max_bytes=10**9, max_age=3600)
+    old, used, new = (store.put(f"paper {i} " + os.urandom(2000).hex()) for i in range(3))
+    size = sum(f.stat().st_size for f in tmp_path.rglob("*.zst"))
+    now = time.time()
+    for ref, age in ((old, 300), (used, 200), (new, 100)):
+        path = store._path(ref[len("sha256:"):])
+        os.utime(path, (now - age, now - age))
+    # Reading a blob from disk makes it the most recently used.
+    assert BlobStore(str(tmp_path)).get(old)
+
+    # Room for two of the three, and the small new one.
+    store.max_bytes = size * 2 // 3 + 200
+    store.put("another paper")
+    assert {f.stem for f in tmp_path.rglob("*.zst")} >= {old[7:], new[7:]}
+    with pytest.raises(KeyError):
+        BlobStore(str(tmp_path)).get(used)
+
+    # Unused for longer than max_age.
+    store.max_bytes, store.max_age = 10**9, 50
+    store.put("a third paper")
+    assert new[7:] not in {f.stem for f in tmp_path.rglob("*.zst")}
+    assert len(list(tmp_path.rglob("*.zst"))) == 3
+    assert store.stats()["evictions"] == 2
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.cassette import Cassette, use_cassette
+from agent.pdf import PDF_TEXT
+
+URL = "https://arxiv.org/abs/2401.00001"
+CONFIG = {"configurable": {"n_loops": 4, "k_interval": 3}}
+
+
+def offline_factory(model, cached_content=None):
+    raise AssertionError("replay must not build live models")
+
+
+def run(n_loops: int = 4):
+    from agent.graph import workflow
+
+    config = {"configurable": {"n_loops": n_loops, "k_interval": 3}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = workflow.compile().invoke({"arxiv_paper_url": URL}, config)
+    return [(message.name, message.content) for message in result["messages"]]
+
+
+@pytest.fixture
+def cassette_path(fake_llm, monkeypatch, tmp_path):
+    fetches = []
+
+    def fetch(url):
+        fetches.append(url)
+        return PDF_TEXT
+
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path / "blobs")))
+    monkeypatch.setattr(agents, "extract_pdf_from_url", fetch)
+    path = str(tmp_path / "run.cassette")
+    fake_llm.replies.update(
+        questions=json.dumps([{"title": "t", "prompt": "Live question?", "category": "c"}]),
+        follow_up="<Questions><Question>Live follow-up?</Question></Questions>",
+        responses="<Responses><ResponseItem><Question>q</Question><Response>Live answer</Response></ResponseItem></Responses>",
+        observer="<Summary>Live summary</Summary><Instructions></Instructions>",
+    )
+    with use_cassette(path, "record", live_factory=fake_llm.factory) as cassette:
+        recorded = run()
+        # Another URL for the same paper keeps a single copy of the text.
+        agents.extract_pdf_from_url(URL + "v2")
+        # Nothing is written until the block exits.
+        assert not os.path.exists(path)
+    assert len(fetches) == 2 and len(cassette.papers) == 2 and len(cassette.texts) == 1
+
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: pytest.fail("replay must not fetch"))
+    return path, recorded
+
+
+def test_replay_reproduces_the_recorded_run_offline(cassette_path) -> None:
+    path, recorded = cassette_path
+    assert recorded[0][1].startswith("<Questions>") and "Live question?" in recorded[0][1]
+    with use_cassette(path, "replay", live_factory=offline_factory) as cassette:
+        assert run() == recorded
+    assert cassette.synthesized == 0
+    assert Cassette(path).texts[Cassette(path).papers[URL]] == PDF_TEXT
+    # Compressed, with prompts stored as hashes.
+    with open(path, "rb") as f:
+        assert len(f.read()) < len(PDF_TEXT) / 2
+
+
+def test_replay_latency_and_synthesized_calls(cassette_path) -> None:
+    path, recorded = cassette_path
+    with use_cassette(path, "replay", latency=0.05, live_factory=offline_factory):
+        start = time.monotonic()
+        run()
+    assert time.monotonic() - start >= 4 * 0.05
+
+    # More turns than were recorded: the missing calls are synthesized.
+    with use_cassette(path, "replay", live_factory=offline_factory) as cassette:
+        longer = run(n_loops=8)
+    assert longer[:4] == recorded and len(longer) == 8
+    # The student's second follow-up repeats a recorded prompt and gets its answer.
+    assert cassette.synthesized == 3
+
+    # Strict replay fails the first call it has no recording for.
+    with use_cassette(path, "replay", strict=True, live_factory=offline_factory):
+        assert run(n_loops=8) == longer[:5]
@@ -0,0 +1,44 @@
+import pickle
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent import chain_registry
+from agent.chain_registry import (
+    get_chain,
+    register_cached_chain,
+    register_chain,
+    set_llm_factory,
+)
+
+
+def test_chains_are_built_once_and_referenced_by_string() -> None:
+    built = []
+
+    def factory(model, cached_content=None):
+        built.append((model, cached_content))
+        return RunnableLambda(lambda prompt: AIMessage(content=f"{model}/{cached_content}"))
+
+    set_llm_factory(factory)
+    try:
+        ref = register_chain("teacher")
+        assert register_chain("teacher") == ref
+        assert register_chain("student") != ref
+        assert built == [("gemini-2.0-flash-exp", None)]
+        assert pickle.loads(pickle.dumps({"teacher_chain": ref})) == {"teacher_chain": ref}
+
+        cached = register_cached_chain("cachedContents/abc")
+        assert get_chain(cached).invoke({"input": "q"}).content == "gemini-2.0-flash/cachedContents/abc"
+
+        # A reference from another process is rebuilt on first use.
+        set_llm_factory(factory)
+        assert get_chain(ref).invoke({"input": "q"}).content == "gemini-2.0-flash-exp/None"
+        assert chain_registry.stats() == {"llms": 1, "chains": 1}
+    finally:
+        set_llm_factory(None)
+
+
+def test_stale_prompt_reference_is_rejected() -> None:
+    with pytest.raises(KeyError, match="teacher prompt"):
+        get_chain("teacher:gemini-2.0-flash-exp:0000000000000000")
@@ -0,0 +1,99 @@
+from typing import Annotated, Any, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from agent.checkpoint import BoundedMemorySaver, SqliteCheckpointSaver, ZstdSerializer
+
+
+class State(TypedDict):
+    messages: Annotated[list[Any], add_messages]
+    paper: str
+    turn: int
+
+
+def build(saver: SqliteCheckpointSaver, fail_at: int = -1):
+    def node(state):
+        if state["turn"] == fail_at:
+            raise RuntimeError("crash")
+        return {"messages": [AIMessage(content=f"turn {state['turn']}")], "turn": state["turn"] + 1}
+
+    workflow = StateGraph(State)
+    workflow.add_node("turn", node)
+    workflow.add_edge(START, "turn")
+    workflow.add_conditional_edges("turn", lambda state: "turn" if state["turn"] < 5 else END)
+    return workflow.compile(checkpointer=saver)
+
+
+def test_serializer_compresses_large_values() -> None:
+    serde = ZstdSerializer()
+    paper = "protozoa " * 1000
+    type_, data = serde.dumps_typed({"paper": paper})
+    assert type_.endswith("+zstd") and len(data) < len(paper) / 10
+    assert serde.loads_typed((type_, data)) == {"paper": paper}
+    assert not serde.dumps_typed("short")[0].endswith("+zstd")
+    # Older SerializerProtocol versions also require the untyped pair.
+    assert serde.loads(serde.dumps({"paper": paper})) == {"paper": paper}
+    assert serde.loads(serde.dumps("short")) == "short"
+
+
+def test_run_resumes_from_disk_after_crash(tmp_path) -> None:
+    path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+    with pytest.raises(RuntimeError):
+        build(SqliteCheckpointSaver(path), fail_at=3).invoke({"paper": "p" * 1000, "turn": 0}, config)
+
+    # A fresh saver on the same file, as after a restart.
+    saver = SqliteCheckpointSaver(path)
+    graph = build(saver)
+    assert graph.get_state(config).values["turn"] == 3
+    result = graph.invoke(None, config)
+    assert result["turn"] == 5
+    assert [m.content for m in result["messages"]] == [f"turn {i}" for i in range(5)]
+    assert len(list(saver.list(config, limit=2))) == 2
+    assert saver.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    saver.delete_thread("t1")
+    assert saver.get_tuple(config) is None
+
+
+@pytest.mark.anyio
+async def test_async_run_with_batched_commits(tmp_path) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), batch_size=4)
+    config = {"configurable": {"thread_id": "t2"}}
+    result = await build(saver).ainvoke({"paper": "p", "turn": 0}, config)
+    assert result["turn"] == 5
+    saver.close()
+    assert SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite")).get_tuple(config).checkpoint["channel_values"]["turn"] == 5
+
+
+def test_bounded_memory_saver_trims_and_evicts_lru(tmp_path) -> None:
+    saver = BoundedMemorySaver(max_bytes=10_000, max_checkpoints_per_thread=3, spill_dir=str(tmp_path))
+    graph = build(saver)
+    for thread in ("a", "b", "c"):
+        graph.invoke({"paper": thread * 4000, "turn": 0}, {"configurable": {"thread_id": thread}})
+        assert len(saver.storage[thread][""]) <= 3
+
+    stats = saver.stats()
+    assert stats["resident_bytes"] <= 10_000
+    assert stats["evictions"] >= 2 and stats["spills"] == stats["evictions"]
+    assert stats["trimmed_checkpoints"] > 0
+    assert stats["resident_bytes"] == sum(len(value[1]) for value in saver.blobs.values()) + sum(
+        len(c[1]) + len(m[1]) for c, m, _ in saver.storage["c"][""].values()
+    ) + sum(len(w[2][1]) for writes in saver.writes.values() for w in writes.values())
+
+    # An evicted thread is reloaded from its spill file.
+    state = graph.get_state({"configurable": {"thread_id": "a"}})
+    assert state.values["turn"] == 5 and state.values["paper"] == "a" * 4000
+    assert saver.stats()["reloads"] == 1
+
+
+def test_bounded_memory_saver_without_spill_drops_threads() -> None:
+    saver = BoundedMemorySaver(max_bytes=5_000)
+    graph = build(saver)
+    graph.invoke({"paper": "x" * 4000, "turn": 0}, {"configurable": {"thread_id": "a"}})
+    graph.invoke({"paper": "y" * 4000, "turn": 0}, {"configurable": {"thread_id": "b"}})
+    assert graph.get_state({"configurable": {"thread_id": "a"}}).values == {}
+    assert graph.get_state({"configurable": {"thread_id": "b"}}).values["turn"] == 5
@@ -0,0 +1,143 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.context_cache import ContextCacheRegistry
+
+
+class FakeCachingBackend:
+    """In-memory stand-in for Gemini context caching."""
+
+    def __init__(self):
+        self.contents: Dict[str, float] = {}
+        self.ttl_updates = 0
+        self.fail = False
+
+    def create(self, model: str, system_instruction: str, text: str, ttl: float) -> str:
+        if self.fail:
+            raise RuntimeError("caching unavailable")
+        name = f"cachedContents/{len(self.contents) + self.ttl_updates}-{model}"
+        self.contents[name] = ttl
+        return name
+
+    def update_ttl(self, name: str, ttl: float) -> None:
+        self.contents[name] = ttl
+        self.ttl_updates += 1
+
+    def delete(self, name: str) -> None:
+        del self.contents[name]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_run_scope_is_deleted_when_last_run_releases() -> None:
+    backend = FakeCachingBackend()
+    registry = ContextCacheRegistry(backend, ttl=100, refresh_margin=10)
+    name = registry.acquire("arxiv:1", "paper", "system", "run-a")
+    assert registry.acquire("arxiv:1", "paper", "system", "run-b") == name
+    assert registry.acquire("arxiv:1", "paper", "other system", "run-a") != name
+
+    registry.release("run-a")
+    assert name in backend.contents
+    registry.release("run-b")
+    assert backend.contents == {}
+    assert registry.stats() == {"entries": 0, "created": 2, "reused": 1, "refreshed": 0, "deleted": 2}
+
+
+def test_paper_scope_outlives_run_and_refreshes_ttl() -> None:
+    backend = FakeCachingBackend()
+    clock = Clock()
+    registry = ContextCacheRegistry(backend, ttl=100, refresh_margin=30, clock=clock)
+    name = registry.acquire("arxiv:1", "paper", "system", "run-a", scope="paper")
+    registry.release("run-a")
+    assert name in backend.contents
+
+    clock.now = 50
+    assert registry.acquire("arxiv:1", "paper", "system", "run-b", scope="paper") == name
+    assert backend.ttl_updates == 0
+    clock.now = 80
+    assert registry.acquire("arxiv:1", "paper", "system", "run-c", scope="paper") == name
+    assert backend.ttl_updates == 1
+
+    # Expired on the server: forgotten and created again.
+    clock.now = 500
+    assert registry.acquire("arxiv:1", "paper", "system", "run-d", scope="paper") != name
+
+
+def test_idle_entries_are_evicted_lru() -> None:
+    backend = FakeCachingBackend()
+    clock = Clock()
+    registry = ContextCacheRegistry(backend, ttl=100, max_entries=2, clock=clock)
+    first = registry.acquire("arxiv:1", "paper", "system", "run-a", scope="paper")
+    registry.release("run-a")
+    clock.now = 1
+    second = registry.acquire("arxiv:2", "paper", "system", "run-b", scope="paper")
+    clock.now = 2
+    registry.acquire("arxiv:3", "paper", "system", "run-c", scope="paper")
+    assert first not in backend.contents
+    assert second in backend.contents
+
+
+def test_init_uses_cached_chains_and_cleanup_releases(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    backend = FakeCachingBackend()
+    registry = ContextCacheRegistry(backend)
+    monkeypatch.setattr(agents, "get_context_cache_registry", lambda: registry)
+    monkeypatch.setattr(agents, "CONTEXT_CACHE_MODEL", "gemini-cache-test")
+    config = {"configurable": {"context_cache": "run"}}
+
+    update = agents._init_update("https://arxiv.org/abs/2401.00001", "paper text", config)
+    assert update["context_cache_run"]
+    assert len(backend.contents) == 2
+    # The chains call the model the content was cached for.
+    assert all(name.endswith("-gemini-cache-test") for name in backend.contents)
+    assert update["student_chain"].startswith("cached:gemini-cache-test:")
+    assert update["teacher_chain"].startswith("cached:gemini-cache-test:")
+    assert agents.teacher_paper_context(update, "questions", config) == ""
+
+    agents.cleanup_node(update, config)
+    assert backend.contents == {}
+
+
+def test_init_falls_back_to_paper_text_when_caching_fails(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    backend = FakeCachingBackend()
+    backend.fail = True
+    monkeypatch.setattr(agents, "get_context_cache_registry", lambda: ContextCacheRegistry(backend))
+    config = {"configurable": {"context_cache": "run", "teacher_context": "full"}}
+
+    update = agents._init_update("https://arxiv.org/abs/2401.00001", "paper text", config)
+    assert "context_cache_run" not in update
+    assert agents.teacher_paper_context(update, "questions", config) == "paper text"
+
+
+def test_uploads_run_outside_the_lock_and_once_per_key() -> None:
+    release_upload = threading.Event()
+    uploading = threading.Event()
+
+    class SlowBackend(FakeCachingBackend):
+        def create(self, model, system_instruction, text, ttl):
+            if text == "slow paper":
+                uploading.set()
+                assert release_upload.wait(5)
+            return super().create(model, system_instruction, text, ttl)
+
+    backend = SlowBackend()
+    registry = ContextCacheRegistry(backend)
+    with ThreadPoolExecutor(4) as pool:
+        slow = [pool.submit(registry.acquire, "arxiv:1", "slow paper", "system", f"run-{i}") for i in range(3)]
+        assert uploading.wait(5)
+        # Another paper is not held up by the upload in flight.
+        assert pool.submit(registry.acquire, "arxiv:2", "paper", "system", "run-x").result(timeout=5)
+        release_upload.set()
+        names = {future.result(timeout=5) for future in slow}
+    assert len(names) == 1
+    assert registry.stats()["created"] == 2 and registry.stats()["reused"] == 2
@@ -0,0 +1,132 @@
+import json
+
+import httpx
+import pytest
+import requests
+
+from agent import fetch
+from agent.fetch import AsyncFetcher, read_validators
+
+pytestmark = pytest.mark.anyio
+
+
+def _flaky_transport(body: bytes, failures: int) -> httpx.MockTransport:
+    calls = {"count": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            return httpx.Response(503)
+        return httpx.Response(200, content=body)
+
+    return httpx.MockTransport(handler)
+
+
+async def test_fetch_bytes_retries_retryable_status() -> None:
+    fetcher = AsyncFetcher(backoff=0, transport=_flaky_transport(b"%PDF-1.4", failures=2))
+    assert await fetcher.fetch_bytes("https://arxiv.org/pdf/2401.00001") == b"%PDF-1.4"
+    await fetcher.aclose()
+
+
+async def test_fetch_bytes_gives_up_after_retries() -> None:
+    fetcher = AsyncFetcher(retries=1, backoff=0, transport=_flaky_transport(b"", failures=5))
+    with pytest.raises(httpx.HTTPStatusError):
+        await fetcher.fetch_bytes("https://arxiv.org/pdf/2401.00001")
+    await fetcher.aclose()
+
+
+async def test_fetch_to_file(tmp_path) -> None:
+    fetcher = AsyncFetcher(backoff=0, transport=_flaky_transport(b"x" * 200_000, failures=1))
+    target = tmp_path / "paper.pdf"
+    assert await fetcher.fetch_to_file("https://arxiv.org/pdf/2401.00001", str(target)) == 200_000
+    assert target.read_bytes() == b"x" * 200_000
+    assert not (tmp_path / "paper.pdf.part").exists()
+    await fetcher.aclose()
+
+
+def _validating_transport(body: bytes, etag: str, seen: list) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        range_header = request.headers.get("Range")
+        if range_header and request.headers.get("If-Range") == etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            return httpx.Response(
+                206,
+                content=body[start:],
+                headers={"ETag": etag, "Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"},
+            )
+        return httpx.Response(200, content=body, headers={"ETag": etag})
+
+    return httpx.MockTransport(handler)
+
+
+async def test_fetch_conditional_revalidates_with_etag(tmp_path) -> None:
+    seen: list = []
+    fetcher = AsyncFetcher(backoff=0, transport=_validating_transport(b"pdf-v1", '"v1"', seen))
+    target = tmp_path / "paper.pdf"
+
+    assert await fetcher.fetch_conditional("https://arxiv.org/pdf/2401.00001", str(target)) is True
+    assert await fetcher.fetch_conditional("https://arxiv.org/pdf/2401.00001", str(target)) is False
+    assert seen[1]["if-none-match"] == '"v1"'
+    assert target.read_bytes() == b"pdf-v1"
+    await fetcher.aclose()
+
+
+async def test_fetch_conditional_resumes_partial_download(tmp_path) -> None:
+    body = bytes(range(256)) * 100
+    seen: list = []
+    fetcher = AsyncFetcher(backoff=0, transport=_validating_transport(body, '"v2"', seen))
+    target = tmp_path / "paper.pdf"
+    (tmp_path / "paper.pdf.part").write_bytes(body[:1000])
+    (tmp_path / "paper.pdf.meta.json").write_text(json.dumps({"partial": {"etag": '"v2"'}}))
+
+    assert await fetcher.fetch_conditional("https://arxiv.org/pdf/2401.00001", str(target)) is True
+    assert seen[0]["range"] == "bytes=1000-"
+    assert target.read_bytes() == body
+    assert read_validators(target)["etag"] == '"v2"'
+    await fetcher.aclose()
+
+
+class _Response:
+    def __init__(self, status_code: int, headers: dict, chunks: list):
+        self.status_code = status_code
+        self.headers = headers
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def iter_content(self, chunk_size: int):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+def test_sync_fetch_conditional_resumes_after_a_broken_chunked_body(monkeypatch, tmp_path) -> None:
+    seen = []
+    responses = [
+        _Response(200, {"ETag": '"v1"'}, [b"abc", requests.exceptions.ChunkedEncodingError("connection reset")]),
+        _Response(206, {"ETag": '"v1"', "Content-Range": "bytes 3-5/6"}, [b"def"]),
+    ]
+
+    class Session:
+        def get(self, url, headers, stream, timeout):
+            seen.append(headers)
+            return responses.pop(0)
+
+    monkeypatch.setattr(fetch, "get_session", lambda: Session())
+    monkeypatch.setattr(fetch, "FETCH_BACKOFF", 0.0)
+    # The cache directory does not exist yet; the download creates it.
+    target = tmp_path / "cache" / "paper.pdf"
+    assert fetch.fetch_conditional("https://example.org/paper.pdf", str(target)) is True
+    assert target.read_bytes() == b"abcdef"
+    assert seen[1]["Range"] == "bytes=3-"
@@ -0,0 +1,41 @@
+from agent.insights import insights_for, merge_insights, parse_directives
+
+RESPONSE = """<Instructions>
+<Instruction>
+    <Student>
+        - Ask about the limitations of the dormancy operator.
+        - Compare APO with PSO on CEC2022.
+    </Student>
+    <Teacher>
+        Cite the section each answer comes from.
+    </Teacher>
+</Instruction>
+</Instructions>"""
+
+
+def test_parse_directives_per_role() -> None:
+    directives = parse_directives(RESPONSE)
+    assert directives["Student"] == [
+        "Ask about the limitations of the dormancy operator.",
+        "Compare APO with PSO on CEC2022.",
+    ]
+    assert directives["Teacher"] == ["Cite the section each answer comes from."]
+
+
+def test_overlapping_directive_supersedes_old_one() -> None:
+    insights = merge_insights([], parse_directives(RESPONSE), turn=3)
+    insights = merge_insights(insights, {"Teacher": ["Cite the paper section each answer comes from."]}, turn=6)
+    teacher = [insight for insight in insights if insight["role"] == "Teacher"]
+    assert teacher == [{"role": "Teacher", "text": "Cite the paper section each answer comes from.", "turn": 6, "hits": 2}]
+    assert insights_for(insights, "Teacher") == "- Cite the paper section each answer comes from."
+    assert "dormancy" in insights_for(insights, "Student")
+    assert "dormancy" not in insights_for(insights, "Teacher")
+
+
+def test_budget_keeps_newest_per_role() -> None:
+    insights = []
+    for turn in range(20):
+        insights = merge_insights(insights, {"Student": [f"Directive {turn} about topic{turn} alone."]}, turn, budget_tokens=30)
+    assert len(insights) < 20
+    assert insights[-1]["turn"] == 19
+    assert sum(len(insight["text"]) for insight in insights) <= 30 * 4
@@ -0,0 +1,90 @@
+import contextlib
+import io
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.metrics import Histogram, Metrics, Spans, get_metrics
+
+
+def test_histogram_and_text_format() -> None:
+    histogram = Histogram("latency_seconds", "Latency.", ("node",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, node='te"acher')
+    assert histogram.count(node='te"acher') == 4
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{node="te\\"acher",le="0.1"} 2',
+        'latency_seconds_bucket{node="te\\"acher",le="1"} 3',
+        'latency_seconds_bucket{node="te\\"acher",le="+Inf"} 4',
+        'latency_seconds_sum{node="te\\"acher"} 3.65',
+        'latency_seconds_count{node="te\\"acher"} 4',
+    ]
+
+
+def test_spans_are_bounded_per_run_and_in_runs() -> None:
+    spans = Spans(runs=2, per_run=3)
+    for run in ("a", "b", "c"):
+        for i in range(4):
+            spans.add(run, f"node:{i}", 0.0, 0.001, "ok")
+    spans.add("", "node:x", 0.0, 0.001, "ok")
+    assert spans.get("a") == []
+    assert [span["name"] for span in spans.get("c")] == ["node:1", "node:2", "node:3"]
+
+
+def test_track_run_counts_active_runs_and_status() -> None:
+    metrics = Metrics(prefix="test")
+    with metrics.track_run("t1"):
+        assert metrics.active_runs.value() == 1
+    with pytest.raises(ValueError), metrics.track_run("t2"):
+        raise ValueError("boom")
+    assert metrics.active_runs.value() == 0
+    assert metrics.runs.value(status="ok") == 1 and metrics.runs.value(status="error") == 1
+    assert metrics.spans.get("t2")[0]["status"] == "error"
+    text = metrics.render()
+    assert "test_active_runs 0" in text and 'test_runs_total{status="error"} 1' in text
+    # Scraped from the modules' own counters.
+    assert "test_paper_cache_hits" not in text
+    assert "# TYPE paper_agent_paper_cache_hits_total counter" in text
+    assert "# TYPE paper_agent_blob_store_puts_total counter" in text
+    assert "# TYPE paper_agent_context_cache_entries gauge" in text
+
+
+def test_failing_collector_is_logged_and_skipped(caplog) -> None:
+    metrics = Metrics(prefix="test")
+
+    def broken():
+        raise RuntimeError("stats unavailable")
+
+    metrics.add_collector(broken)
+    text = metrics.render()
+    assert "# TYPE test_runs_total counter" in text
+    assert "collector broken failed: stats unavailable" in caplog.text
+
+
+@pytest.mark.parametrize("fake_llm", [{
+    "responses": AIMessage(content="<Responses></Responses>", usage_metadata={"input_tokens": 70, "output_tokens": 7, "total_tokens": 77}),
+}], indirect=True)
+def test_graph_run_records_nodes_calls_and_spans(fake_llm, monkeypatch, tmp_path) -> None:
+    from agent.graph import workflow
+
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: "paper")
+    metrics = get_metrics()
+    student_calls = metrics.node_duration.count(node="student")
+    tokens_in = metrics.llm_tokens.value(role="teacher", model="gemini-2.0-flash-exp", direction="in")
+    config = {"configurable": {"thread_id": "metrics-test", "n_loops": 2, "k_interval": 5}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        workflow.compile().invoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+
+    assert metrics.node_duration.count(node="student") == student_calls + 1
+    assert metrics.llm_tokens.value(role="teacher", model="gemini-2.0-flash-exp", direction="in") == tokens_in + 70
+    spans = metrics.spans.get("metrics-test")
+    assert [span["name"] for span in spans] == [
+        "node:initial", "llm:student", "node:student", "llm:teacher", "node:teacher", "node:cleanup",
+    ]
+    assert spans[3]["tokens_out"] == 7 and spans[3]["model"] == "gemini-2.0-flash-exp"
+    assert 'paper_agent_node_duration_seconds_count{node="teacher"}' in metrics.render()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.model_stats import ModelStats, cost, percentile
+
+
+def test_percentile_and_stats() -> None:
+    assert percentile([], 0.95) == 0.0
+    assert percentile(range(1, 101), 0.5) == 50
+    assert percentile(range(1, 101), 0.95) == 95
+
+    stats = ModelStats(window=3)
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        stats.record("teacher", "gemini-2.0-flash", latency, 1000, 100)
+    teacher = stats.stats()["teacher"]["gemini-2.0-flash"]
+    assert teacher["calls"] == 4 and teacher["tokens_in"] == 4000 and teacher["tokens_out"] == 400
+    # Latencies only cover the window; token totals cover every call.
+    assert teacher["p50_ms"] == 300 and teacher["p95_ms"] == 400
+    assert teacher["cost_usd"] == cost("gemini-2.0-flash", 4000, 400) > 0
+
+
+def test_route_picks_the_cheapest_model_within_the_target() -> None:
+    stats = ModelStats(min_samples=2)
+    models = ["gemini-2.5-pro", "gemini-2.0-flash", "gemini-2.0-flash-lite"]
+    # Unmeasured models are tried, cheapest first.
+    assert stats.route("student", models, 500) == "gemini-2.0-flash-lite"
+    for _ in range(2):
+        stats.record("student", "gemini-2.0-flash-lite", 0.9, 1, 1)
+    assert stats.route("student", models, 500) == "gemini-2.0-flash"
+    for _ in range(2):
+        stats.record("student", "gemini-2.0-flash", 0.3, 1, 1)
+    assert stats.route("student", models, 500) == "gemini-2.0-flash"
+    # Latency is tracked per role.
+    assert stats.route("teacher", models, 500) == "gemini-2.0-flash-lite"
+    # Nothing meets the target: use the fastest.
+    for _ in range(2):
+        stats.record("student", "gemini-2.5-pro", 0.6, 1, 1)
+    assert stats.route("student", models, 100) == "gemini-2.0-flash"
+
+
+@pytest.mark.parametrize("fake_llm", [{
+    "responses": AIMessage(content="<Responses></Responses>", usage_metadata={"input_tokens": 70, "output_tokens": 7, "total_tokens": 77}),
+}], indirect=True)
+def test_roles_run_on_their_configured_models(fake_llm, monkeypatch, tmp_path) -> None:
+    from agent.graph import workflow
+
+    stats = ModelStats()
+    monkeypatch.setattr(agents, "get_model_stats", lambda: stats)
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: "paper")
+    config = {"configurable": {"n_loops": 2, "k_interval": 5, "student_model": "gemini-2.0-flash-lite", "teacher_model": "gemini-2.5-pro"}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        workflow.compile().invoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+
+    assert fake_llm.models == ["gemini-2.0-flash-lite", "gemini-2.5-pro"]
+    result = stats.stats()
+    assert set(result) == {"student", "teacher"}
+    assert list(result["student"]) == ["gemini-2.0-flash-lite"]
+    assert result["teacher"]["gemini-2.5-pro"]["tokens_in"] == 70
+    assert result["teacher"]["gemini-2.5-pro"]["tokens_out"] == 7
+
+
+def test_route_tries_a_slow_model_again_once_its_samples_expire() -> None:
+    now = [0.0]
+    stats = ModelStats(min_samples=2, max_age=60, clock=lambda: now[0])
+    models = ["gemini-2.0-flash", "gemini-2.0-flash-lite"]
+    for _ in range(2):
+        stats.record("student", "gemini-2.0-flash-lite", 0.9, 1, 1)
+        stats.record("student", "gemini-2.0-flash", 0.3, 1, 1)
+    assert stats.route("student", models, 500) == "gemini-2.0-flash"
+
+    now[0] = 45
+    stats.record("student", "gemini-2.0-flash", 0.3, 1, 1)
+    stats.record("student", "gemini-2.0-flash", 0.3, 1, 1)
+    assert stats.route("student", models, 500) == "gemini-2.0-flash"
+    # The cheaper model's slow samples are stale now, so it is measured again.
+    now[0] = 90
+    assert stats.route("student", models, 500) == "gemini-2.0-flash-lite"
+    for _ in range(2):
+        stats.record("student", "gemini-2.0-flash-lite", 0.2, 1, 1)
+    assert stats.route("student", models, 500) == "gemini-2.0-flash-lite"
+    # Stats still cover the whole window.
+    assert stats.stats()["student"]["gemini-2.0-flash-lite"]["p95_ms"] == 900
@@ -0,0 +1,51 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.agents import observer_node, split_observer_response
+from agent.chain_registry import register_chain
+
+
+@pytest.fixture
+def observer_chain(fake_llm):
+    fake_llm.use(observer="<Summary>so far</Summary>\n<Instructions>go deeper</Instructions>")
+    return register_chain("observer"), fake_llm.prompts
+
+
+def test_split_observer_response() -> None:
+    assert split_observer_response("<Summary> s </Summary><Instructions/>", "old", "new") == ("s", "<Instructions/>")
+    summary, instructions = split_observer_response("<Instructions/>", "old", "new" * 5000)
+    assert instructions == "<Instructions/>"
+    assert summary.endswith("new") and len(summary) == 4000
+
+
+def test_observer_sends_only_new_messages(observer_chain) -> None:
+    chain, sent = observer_chain
+    messages = [
+        HumanMessage(content="opening questions", name="Student"),
+        AIMessage(content="first answer", name="Teacher"),
+    ]
+    state = {"messages": messages, "current_turn": 3, "observer_chain": chain}
+    config = {"configurable": {"n_loops": 20, "k_interval": 3}}
+    update = observer_node(state, config)
+    assert "first answer" in sent[0] and "opening questions" not in sent[0]
+    assert update["observer_summary"] == "so far"
+    assert update["observer_cursor"] == 3
+
+    state = {**state, **update}
+    state["messages"] = messages + update["messages"] + [AIMessage(content="second answer", name="Teacher")]
+    observer_node(state, config)
+    assert "second answer" in sent[1] and "first answer" not in sent[1]
+    assert "so far" in sent[1]
+
+
+def test_observer_full_history_on_last_intervention(observer_chain) -> None:
+    chain, sent = observer_chain
+    messages = [
+        HumanMessage(content="opening questions", name="Student"),
+        AIMessage(content="first answer", name="Teacher"),
+        AIMessage(content="second answer", name="Teacher"),
+    ]
+    state = {"messages": messages, "current_turn": 6, "observer_chain": chain, "observer_cursor": 2}
+    config = {"configurable": {"n_loops": 8, "k_interval": 3, "observer_full_history_final": True}}
+    observer_node(state, config)
+    assert "first answer" in sent[0] and "Conversation Summary" not in sent[0]
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+
+from agent.paper_cache import PaperCache, sha256_digest
+
+
+def test_hit_and_miss_by_url_and_digest(tmp_path) -> None:
+    cache = PaperCache(str(tmp_path), max_bytes=1024 * 1024)
+    digest = sha256_digest(b"%PDF-1.4 paper")
+
+    assert cache.get("https://arxiv.org/pdf/2401.00001") is None
+    cache.put("https://arxiv.org/pdf/2401.00001", digest, "# Paper")
+
+    assert cache.get("http://arxiv.org/pdf/2401.00001/") == "# Paper"
+    assert cache.get_by_digest(digest) == "# Paper"
+    stats = cache.stats()
+    assert (stats["hits"], stats["content_hits"], stats["misses"], stats["evictions"]) == (1, 1, 1, 0)
+
+    # Other spellings of the same arXiv paper share the entry.
+    assert cache.get("https://export.arxiv.org/abs/2401.00001") == "# Paper"
+
+    # The index survives a new process.
+    assert PaperCache(str(tmp_path)).get("https://arxiv.org/pdf/2401.00001") == "# Paper"
+
+
+def test_lru_eviction(tmp_path) -> None:
+    cache = PaperCache(str(tmp_path), max_bytes=25)
+    cache.put("https://a", "a" * 64, "x" * 10)
+    cache.put("https://b", "b" * 64, "y" * 10)
+    os.utime(tmp_path / f"{'a' * 64}.md", (1, 1))
+    os.utime(tmp_path / f"{'b' * 64}.md", (2, 2))
+    cache.get("https://a")
+
+    cache.put("https://c", "c" * 64, "z" * 10)
+
+    assert cache.get("https://b") is None
+    assert cache.get("https://a") == "x" * 10
+    assert cache.get("https://c") == "z" * 10
+    assert cache.evictions == 1
+
+
+def _put_many(cache_dir: str, prefix: str) -> None:
+    cache = PaperCache(cache_dir, max_bytes=1024 * 1024)
+    for i in range(20):
+        cache.put(f"https://{prefix}/{i}", sha256_digest(f"{prefix}{i}".encode()), f"{prefix}{i}")
+
+
+def test_processes_sharing_the_cache_keep_each_others_entries(tmp_path) -> None:
+    first = PaperCache(str(tmp_path), max_bytes=1024 * 1024)
+    second = PaperCache(str(tmp_path), max_bytes=1024 * 1024)
+    assert first.get("https://a") is None and second.get("https://b") is None
+    first.put("https://a", "a" * 64, "A")
+    second.put("https://b", "b" * 64, "B")
+    # The stale in-memory index of the first cache does not hide the second's entry.
+    assert first.get("https://b") == "B"
+    assert PaperCache(str(tmp_path)).get("https://a") == "A"
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_put_many, args=(str(tmp_path), prefix)) for prefix in ("p", "q", "r")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+    cache = PaperCache(str(tmp_path))
+    assert all(cache.get(f"https://{prefix}/{i}") == f"{prefix}{i}" for prefix in "pqr" for i in range(20))
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pymupdf
+import pytest
+
+from agent import pdf_convert
+from agent.pdf_convert import (
+    convert_pdf_to_markdown,
+    convert_pdf_to_pages,
+    shutdown_executor,
+    split_pages,
+)
+
+
+def _pdf_bytes(pages: int) -> bytes:
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 40), f"Section {page_num}", fontsize=18)
+        for line in range(5):
+            page.insert_text((40, 80 + 14 * line), f"page {page_num} line {line} of the paper text")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_split_pages_is_contiguous_and_balanced() -> None:
+    ranges = split_pages(10, 4)
+    assert [len(r) for r in ranges] == [3, 3, 2, 2]
+    assert [page for r in ranges for page in r] == list(range(10))
+
+
+def test_split_pages_never_exceeds_page_count() -> None:
+    assert split_pages(2, 8) == [[0], [1]]
+
+
+def test_parallel_conversion_matches_serial() -> None:
+    pdf_bytes = _pdf_bytes(5)
+    serial = convert_pdf_to_pages(pdf_bytes, max_workers=1)
+    try:
+        parallel = convert_pdf_to_pages(pdf_bytes, max_workers=3, min_pages=2)
+    finally:
+        shutdown_executor()
+    assert len(serial) == 5 and "page 4 line 4" in serial[4]
+    assert parallel == serial
+    assert convert_pdf_to_markdown(pdf_bytes, max_workers=1) == "".join(serial)
+
+
+def test_short_documents_skip_the_pool(monkeypatch) -> None:
+    monkeypatch.setattr(pdf_convert, "PDF_PARALLEL_MIN_PAGES", 4)
+    monkeypatch.setattr(pdf_convert, "_get_executor", lambda max_workers: pytest.fail("short PDFs convert serially"))
+    assert len(convert_pdf_to_pages(_pdf_bytes(3), max_workers=4)) == 3
+
+
+def test_threads_share_one_pool_that_does_not_fork() -> None:
+    try:
+        with ThreadPoolExecutor(8) as threads:
+            pools = list(threads.map(lambda _: pdf_convert._get_executor(2), range(16)))
+        assert all(pool is pools[0] for pool in pools)
+        assert pools[0]._mp_context.get_start_method() != "fork"
+    finally:
+        shutdown_executor()
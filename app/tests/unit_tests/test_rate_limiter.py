@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent import agents
+from agent.chain_registry import register_chain
+from agent.model_stats import ModelStats
+from agent.rate_limiter import RateLimiter
+
+
+class QuotaLLM:
+    """Fake model that answers 429 beyond ``limit`` calls in any ``window`` seconds."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.calls = deque()
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt_value) -> AIMessage:
+        with self.lock:
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] > self.window:
+                self.calls.popleft()
+            if len(self.calls) >= self.limit:
+                self.rejected += 1
+                raise RuntimeError("429 Resource has been exhausted")
+            self.calls.append(now)
+        return AIMessage(content="<Questions><Question>Why?</Question></Questions>")
+
+
+def test_requests_are_spaced_by_the_bucket() -> None:
+    limiter = RateLimiter(rpm=600, tpm=0, burst_seconds=0.1)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire("m")
+    # One request of burst, then one every 0.1 s.
+    assert time.monotonic() - start >= 0.35
+    assert limiter.stats()["m"]["granted"] == 5
+
+
+def test_token_reservations_are_settled() -> None:
+    limiter = RateLimiter(rpm=0, tpm=6000, burst_seconds=1)
+    assert limiter.acquire("m", 100) < 0.05
+    # The call used 20 of the 100 reserved tokens; the rest is available again.
+    limiter.settle("m", 100, 20)
+    assert limiter.acquire("m", 60) < 0.05
+    assert limiter.acquire("m", 50) >= 0.25
+    assert limiter.stats()["m"]["tokens"] == 130
+
+
+def test_runs_are_served_round_robin() -> None:
+    limiter = RateLimiter(rpm=1200, tpm=0, burst_seconds=0.05)
+    order = []
+
+    def call(run_id):
+        limiter.acquire("m", run_id=run_id)
+        order.append(run_id)
+
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(6):
+            pool.submit(call, "busy")
+        time.sleep(0.01)
+        for _ in range(2):
+            pool.submit(call, "quiet")
+    # The quiet run does not wait behind all of the busy run's calls.
+    assert order.count("quiet") == 2
+    assert order.index("quiet") <= 2 and len(order) - 1 - order[::-1].index("quiet") <= 4
+
+
+@pytest.mark.anyio
+async def test_async_and_sync_callers_share_the_queue() -> None:
+    limiter = RateLimiter(rpm=1200, tpm=0, burst_seconds=0.05)
+    start = time.monotonic()
+    sync = asyncio.to_thread(lambda: [limiter.acquire("m", run_id="sync") for _ in range(3)])
+    await asyncio.gather(sync, *(limiter.aacquire("m", run_id=f"async-{i}") for i in range(3)))
+    # Six requests at one per 50 ms.
+    assert time.monotonic() - start >= 0.2
+    assert limiter.stats()["m"]["granted"] == 6 and limiter.stats()["m"]["queued"] == 0
+
+
+def run_concurrently(fake_llm, monkeypatch, limiter, llm) -> int:
+    monkeypatch.setattr(agents, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(agents, "get_model_stats", lambda: ModelStats())
+    fake_llm.use(llm)
+    state = {"student_chain": register_chain("student", "quota-model")}
+
+    def run(thread_id):
+        errors = 0
+        for _ in range(6):
+            try:
+                agents._call_chain("student", state, "prompt", {"configurable": {"thread_id": thread_id}})
+            except RuntimeError:
+                errors += 1
+        return errors
+
+    with ThreadPoolExecutor(4) as pool:
+        return sum(pool.map(run, ["a", "b", "c", "d"]))
+
+
+def test_limiter_keeps_concurrent_runs_within_the_quota(fake_llm, monkeypatch) -> None:
+    # The fake allows 6 calls per 0.2 s; the limiter lets through at most 5.
+    unlimited = QuotaLLM(6, 0.2)
+    assert run_concurrently(fake_llm, monkeypatch, RateLimiter(rpm=0, tpm=0), unlimited) > 0
+
+    limited = QuotaLLM(6, 0.2)
+    limiter = RateLimiter(rpm=750, tpm=0, burst_seconds=0.2)
+    assert run_concurrently(fake_llm, monkeypatch, limiter, limited) == 0
+    assert limited.rejected == 0
+    stats = limiter.stats()["quota-model"]
+    assert stats["granted"] == 24 and stats["wait_p95_ms"] > 0
+
+
+def test_failed_call_returns_its_reservation(fake_llm, monkeypatch) -> None:
+    limiter = RateLimiter(rpm=0, tpm=6000, burst_seconds=1)
+    monkeypatch.setattr(agents, "get_rate_limiter", lambda: limiter)
+    monkeypatch.setattr(agents, "get_model_stats", lambda: ModelStats())
+
+    def fail(prompt_value):
+        raise RuntimeError("500 Internal error")
+
+    fake_llm.use(fail)
+    state = {"student_chain": register_chain("student", "quota-model")}
+    with pytest.raises(RuntimeError):
+        agents._call_chain("student", state, "p" * 400, {"configurable": {"thread_id": "a"}})
+    # Nothing was charged, so the full bucket is available right away.
+    assert limiter.stats()["quota-model"]["tokens"] == 0
+    assert limiter.acquire("quota-model", 100) < 0.05
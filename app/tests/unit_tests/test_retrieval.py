@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from agent.retrieval import BM25Index, chunk_paper, get_paper_index, tokenize
+
+PAPER = """# Introduction
+Metaheuristics search large spaces.
+
+# Method
+Protozoa forage autotrophically in light and heterotrophically in darkness.
+
+Dormancy replaces weak individuals with random ones.
+
+# Results
+APO wins most CEC2022 functions.
+"""
+
+
+def test_chunks_respect_sections_and_size() -> None:
+    chunks = chunk_paper(PAPER, chunk_chars=80)
+    assert chunks[0].startswith("## Introduction")
+    assert all(chunk.count("## ") == 1 for chunk in chunks)
+    assert any("Dormancy" in chunk and chunk.startswith("## Method") for chunk in chunks)
+    assert all(len(chunk) <= 80 + len("## Method\n") for chunk in chunks)
+
+
+def test_bm25_ranks_matching_chunk_first() -> None:
+    index = BM25Index(chunk_paper(PAPER, chunk_chars=80))
+    best = index.top_k("How does dormancy work?", 1)[0]
+    assert "Dormancy" in index.chunks[best]
+    assert index.top_k("unrelated words", 10) == list(range(len(index.chunks)))
+
+
+def test_index_registry_reuses_index() -> None:
+    first = get_paper_index("arxiv:test", PAPER, 80)
+    assert get_paper_index("arxiv:test", PAPER, 80) is first
+    assert get_paper_index("arxiv:test", PAPER, 200) is not first
+
+
+def test_postings_scores_match_dense_bm25() -> None:
+    chunks = chunk_paper(PAPER * 3, chunk_chars=80)
+    index = BM25Index(chunks)
+    tokens = [tokenize(chunk) for chunk in chunks]
+    avg_len = sum(map(len, tokens)) / len(tokens)
+    query = "how does dormancy replace weak protozoa in darkness"
+    for row, chunk_tokens in enumerate(tokens):
+        expected = 0.0
+        for term in set(tokenize(query)):
+            tf = chunk_tokens.count(term)
+            if not tf:
+                continue
+            df = sum(term in other for other in tokens)
+            idf = math.log1p((len(chunks) - df + 0.5) / (df + 0.5))
+            expected += idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * len(chunk_tokens) / avg_len))
+        assert index.scores(query)[row] == pytest.approx(expected, rel=1e-5)
+    # Postings hold one weight per (term, chunk) pair, not chunks times vocabulary.
+    assert len(index.weights) == sum(len(set(chunk_tokens)) for chunk_tokens in tokens)
+
+
+def test_index_registry_rebuilds_when_the_text_changes() -> None:
+    first = get_paper_index("arxiv:changed", PAPER, 80, digest="sha256:v1")
+    assert get_paper_index("arxiv:changed", lambda: pytest.fail("must not read"), 80, digest="sha256:v1") is first
+    updated = get_paper_index("arxiv:changed", PAPER + "\n# Appendix\nProofs.\n", 80, digest="sha256:v2")
+    assert updated is not first and "Proofs" in updated.chunks[-1]
+    # Without a digest the text itself tells versions apart.
+    assert get_paper_index("arxiv:changed", PAPER, 80) is not get_paper_index("arxiv:changed", PAPER + "x", 80)
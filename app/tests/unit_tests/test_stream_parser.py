@@ -0,0 +1,78 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+from agent import agents
+from agent.blob_store import BlobStore
+from agent.stream_parser import (
+    JsonItemParser,
+    XmlItemParser,
+    parse_json_items,
+    parse_xml_items,
+)
+
+QUESTIONS = [{"title": f"t{i}", "prompt": f"Why {{{i}}}?", "category": "c"} for i in range(3)]
+
+
+def chunks(text: str, size: int = 7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_json_items_are_emitted_as_soon_as_they_close() -> None:
+    parser = JsonItemParser()
+    emitted = [parser.feed(chunk) for chunk in chunks("```json\n" + json.dumps(QUESTIONS) + "\n```")]
+    assert [item for batch in emitted for item in batch] == QUESTIONS
+    # The first question is out long before the array is complete.
+    assert emitted.index([QUESTIONS[0]]) < len(emitted) / 2
+    assert parser.close() == [] and parser.errors == 0
+
+
+def test_json_recovery() -> None:
+    text = 'Here you go:\n[{title: "a", prompt: "A?", category: "c",}, {"title": "b", "prompt": "B, cut'
+    assert parse_json_items(text) == [
+        {"title": "a", "prompt": "A?", "category": "c"},
+        {"title": "b", "prompt": "B, cut"},
+    ]
+    parser = JsonItemParser()
+    assert parser.feed('[{"prompt": "ok"}, {"prompt": oops}]') == [{"prompt": "ok"}]
+    assert parser.errors == 1
+
+
+def test_xml_items_stream_and_recover() -> None:
+    parser = XmlItemParser("Question")
+    emitted = [parser.feed(chunk) for chunk in chunks("<Questions><Question>One?</Question><Question>Two?</Question></Questions>")]
+    assert [item for batch in emitted for item in batch] == ["One?", "Two?"]
+    assert emitted.index(["One?"]) < len(emitted) - 1
+    assert parse_xml_items("<Questions><Question>One?<Question>Two?</Question><Question>Three", "Question") == ["One?", "Two?", "Three"]
+    assert parse_xml_items("<Questions>", "Question") == []
+
+
+@pytest.mark.parametrize("fake_llm", [{
+    "chunk_size": 7,
+    "questions": "```json\n" + json.dumps(QUESTIONS) + "\n```",
+    "responses": "<Responses>" + "".join(
+        f"<ResponseItem><Question>Q{i}</Question><Response>A{i}</Response></ResponseItem>" for i in range(3)
+    ) + "</Responses>",
+}], indirect=True)
+def test_nodes_stream_items_before_the_response_is_complete(fake_llm, monkeypatch, tmp_path) -> None:
+    from agent.graph import workflow
+
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: "paper")
+    events = []
+    config = {"configurable": {"n_loops": 2, "teacher_context": "full"}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for mode, chunk in workflow.compile().stream(
+            {"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config, stream_mode=["custom", "updates"]
+        ):
+            events.append((mode, chunk))
+
+    items = [chunk for mode, chunk in events if mode == "custom"]
+    assert [(item["item"], item["index"]) for item in items] == [("question", i) for i in range(3)] + [("response", i) for i in range(3)]
+    assert items[0]["value"]["prompt"] == "Why {0}?"
+    assert items[3]["value"] == "<Question>Q0</Question><Response>A0</Response>"
+    student_update = next(i for i, (mode, chunk) in enumerate(events) if mode == "updates" and "student" in chunk)
+    assert all(mode == "custom" for mode, _ in events[student_update - 3:student_update])
+    assert events[student_update][1]["student"]["questions_list"] == QUESTIONS
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import re
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent import agents
+from agent.agents import merge_teacher_answers, teacher_sends
+from agent.blob_store import BlobStore
+
+QUESTIONS = "<Questions>\n" + "\n".join(f"<Question>Q{i}?</Question>" for i in range(6)) + "\n</Questions>"
+
+
+def test_teacher_sends_splits_questions_in_order() -> None:
+    state = {"messages": [HumanMessage(content=QUESTIONS, name="Student")], "teacher_chain": "ref"}
+    sends = teacher_sends(state, {"configurable": {"teacher_concurrency": 4}})
+    assert [send.arg["teacher_questions"] for send in sends] == [["Q0?", "Q1?"], ["Q2?", "Q3?"], ["Q4?"], ["Q5?"]]
+    assert all(send.node == "teacher_answer" and "messages" not in send.arg for send in sends)
+    assert len(teacher_sends(state, {"configurable": {"teacher_concurrency": 10}})) == 6
+
+
+def test_merge_keeps_question_order_and_wraps_plain_answers() -> None:
+    merged = merge_teacher_answers([
+        {"batch": 1, "questions": ["Q1?"], "content": "plain answer"},
+        {"batch": 0, "questions": ["Q0?"], "content": "<Responses><ResponseItem><Question>Q0?</Question><Response>A0</Response></ResponseItem></Responses>"},
+    ])
+    assert merged.startswith("<Responses>") and merged.endswith("</Responses>")
+    assert merged.index("Q0?") < merged.index("Q1?")
+    assert "<Response>plain answer</Response>" in merged
+
+
+def test_fanout_answers_questions_in_parallel(fake_llm, monkeypatch, tmp_path) -> None:
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def respond(prompt_value):
+        text = prompt_value.to_string()
+        if "Generate 6 questions" in text:
+            return fake_llm.reply(prompt_value)
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        questions = re.findall(r"<Question>(Q\d\?)</Question>", text.split("#Questions#")[1])
+        items = "".join(f"<ResponseItem><Question>{q}</Question><Response>A</Response></ResponseItem>" for q in questions)
+        return AIMessage(content=f"<Responses>{items}</Responses>")
+
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: "paper")
+    fake_llm.use(respond)
+    from agent.graph import workflow
+
+    config = {"configurable": {"teacher_fanout": True, "n_loops": 2, "teacher_context": "full"}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = workflow.compile().invoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+
+    teacher = [message for message in result["messages"] if message.name == "Teacher"]
+    assert len(teacher) == 1
+    assert re.findall(r"<Question>(.*?)</Question>", teacher[0].content) == [f"Q{i}?" for i in range(6)]
+    assert peak[0] > 1
+    assert result["teacher_answers"] == []
+
+
+def test_failed_branch_is_reported_in_the_merged_answer(fake_llm, monkeypatch, tmp_path) -> None:
+    def respond(prompt_value):
+        text = prompt_value.to_string()
+        if "Generate 6 questions" in text:
+            return fake_llm.reply(prompt_value)
+        questions = re.findall(r"<Question>(Q\d\?)</Question>", text.split("#Questions#")[1])
+        if "Q2?" in questions:
+            raise RuntimeError("quota exceeded")
+        items = "".join(f"<ResponseItem><Question>{q}</Question><Response>A</Response></ResponseItem>" for q in questions)
+        return AIMessage(content=f"<Responses>{items}</Responses>")
+
+    monkeypatch.setattr(agents, "get_blob_store", lambda: BlobStore(str(tmp_path)))
+    monkeypatch.setattr(agents, "extract_pdf_from_url", lambda url: "paper")
+    fake_llm.use(respond)
+    from agent.graph import workflow
+
+    config = {"configurable": {"teacher_fanout": True, "teacher_concurrency": 3, "n_loops": 2, "teacher_context": "full"}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = workflow.compile().invoke({"arxiv_paper_url": "https://arxiv.org/abs/2401.00001"}, config)
+
+    assert "error" not in result
+    teacher = [message for message in result["messages"] if message.name == "Teacher"]
+    assert re.findall(r"<Question>(.*?)</Question>", teacher[0].content) == ["Q0?", "Q1?", "Q2? Q3?", "Q4?", "Q5?"]
+    assert "<Response>Not answered: quota exceeded</Response>" in teacher[0].content
+    assert teacher[0].content.count("<Response>A</Response>") == 4
+
+
+def test_merge_fails_the_turn_only_when_every_branch_failed() -> None:
+    answers = [{"batch": 0, "questions": ["Q0?"], "error": "e0"}, {"batch": 1, "questions": ["Q1?"], "error": "e1"}]
+    assert agents.teacher_merge_node({"teacher_answers": answers}, {}) == {"error": "e0; e1", "teacher_answers": None}
+    update = agents.teacher_merge_node({"teacher_answers": answers[:1] + [{"batch": 1, "questions": ["Q1?"], "content": "A1"}]}, {})
+    assert "error" not in update and update["current_turn"] == 1
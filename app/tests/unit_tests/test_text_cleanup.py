@@ -0,0 +1,34 @@
+from agent.pdf import PDF_TEXT
+from agent.text_cleanup import clean_pages, clean_paper_text, split_on_page_breaks
+
+
+def test_running_headers_are_removed_from_fixture() -> None:
+    text, stats = clean_paper_text(PDF_TEXT)
+    assert "X. Wang et al." not in text
+    assert "Knowledge-Based Systems 295 (2024) 111737" not in text
+    assert "Artificial Protozoa Optimizer (APO)" in text
+    assert text.count("Table ") == PDF_TEXT.count("Table ")
+    assert stats["chars_removed"] >= 0.15 * len(PDF_TEXT)
+    assert stats["tokens_removed"] > 0
+
+
+def test_page_numbers_only_removed_at_page_edges() -> None:
+    pages = []
+    for i in range(4):
+        body = "\n".join(f"paragraph {i}.{n}" for n in range(10))
+        pages.append(f"Journal of Things\n{body}\n42\n{body}\n{i + 1}")
+    text, stats = clean_pages(pages)
+    assert "Journal of Things" not in text
+    assert text.count("\n42\n") == 4
+    assert stats["furniture_lines"] == 8
+
+
+def test_fenced_code_is_untouched() -> None:
+    pages = ["Header line here\n```\n    x  =  1\n```", "Header line here\nother"]
+    text, _ = clean_pages(pages)
+    assert "    x  =  1" in text
+
+
+def test_split_on_page_breaks() -> None:
+    pages = split_on_page_breaks("first page\n-----\nsecond page\n\f\nthird page")
+    assert [page.strip() for page in pages] == ["first page", "second page", "third page"]
@@ -0,0 +1,51 @@
+import pymupdf
+import PyPDF2
+
+from agent import tools
+from agent.tools import iter_pdf_pages, parse_pdf_from_url
+
+
+def _write_pdf(path, pages: int, lines: int = 0) -> None:
+    doc = pymupdf.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 40), f"page {page_num} text")
+        for line in range(lines):
+            page.insert_text((40, 60 + 16 * line), f"line {line} of page {page_num}, " + "lorem ipsum dolor " * 4, fontsize=8)
+    doc.save(str(path))
+
+
+def test_iter_pdf_pages_yields_every_page_with_small_window(tmp_path) -> None:
+    pdf_path = tmp_path / "paper.pdf"
+    _write_pdf(pdf_path, 5)
+    with open(pdf_path, "rb") as f:
+        pages = list(iter_pdf_pages(f, page_window=2))
+    assert [page.strip() for page in pages] == [f"page {i} text" for i in range(5)]
+
+
+def test_iter_pdf_pages_does_not_retain_parsed_pages(monkeypatch, tmp_path) -> None:
+    readers = []
+
+    class Reader(PyPDF2.PdfReader):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            readers.append(self)
+
+    monkeypatch.setattr(tools.PyPDF2, "PdfReader", Reader)
+    pdf_path = tmp_path / "paper.pdf"
+    _write_pdf(pdf_path, 60, lines=10)
+    resolved = []
+    with open(pdf_path, "rb") as f:
+        for _ in iter_pdf_pages(f, page_window=2):
+            resolved.append(len(readers[0].resolved_objects))
+    # Parsed objects stay within a window instead of accumulating per page,
+    assert max(resolved) <= 3 * max(resolved[:4])
+    # and no page keeps its content streams and resources.
+    assert all(len(page) == 0 for page in readers[0].flattened_pages)
+
+
+def test_parse_pdf_from_file_path(tmp_path) -> None:
+    pdf_path = tmp_path / "paper.pdf"
+    _write_pdf(pdf_path, 3)
+    text = parse_pdf_from_url.invoke({"pdf_url": "", "file_path": str(pdf_path)})
+    assert "page 0 text" in text and "page 2 text" in text